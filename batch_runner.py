@@ -0,0 +1,171 @@
+# encoding: utf-8
+"""
+@file: batch_runner.py
+@time: 2026/10/18 18:10
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from gurobipy import *
+from power_network import PN
+from trans_network import TN
+from vehicle import VEHICLE
+from mrsp import MRSPTemplate
+from rop import ROP
+from pdrppccdt import PDRPPCCDT
+from solver import SOLVERS
+from matrix_model import FORMULATIONS
+from instrumentation import Recorder
+
+# loaded once by init_worker in every worker process
+worker = {}
+
+
+def read_scenarios(path):
+    """
+    One damage scenario per line, either a JSON list or comma separated item indices. Blank lines and lines
+    starting with # are skipped.
+    """
+    scenarios = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.startswith('['):
+                scenarios.append([int(i) for i in json.loads(line)])
+            else:
+                scenarios.append([int(i) for i in line.split(',') if i.strip()])
+    return scenarios
+
+
+def split_threads(workers, threads=None):
+    """
+    Gurobi threads per worker, so that workers * threads does not exceed the cores of the machine.
+    """
+    if threads is not None:
+        return threads
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+def telemetry_path(telemetry, name):
+    return None if telemetry is None else os.path.join(telemetry, name + ".json")
+
+
+def init_worker(data_dir, w_num, base_num, threads, fast, solver, formulation, telemetry=None):
+    start = time.perf_counter()
+    worker['telemetry'] = telemetry
+    recorder = Recorder(telemetry_path(telemetry, "load_" + str(os.getpid())), enabled=telemetry is not None)
+    with recorder.stage("load"):
+        worker['pn'] = PN(data_dir)
+        worker['tn'] = TN(w_num, base_num, data_dir)
+        worker['vehicle'] = VEHICLE()
+        worker['fast'] = fast
+        worker['solver'] = solver
+        worker['formulation'] = formulation
+
+        env = Env(empty=True)
+        env.setParam('OutputFlag', 0)
+        env.setParam('Threads', threads)
+        env.start()
+        worker['env'] = env
+        # MRSP is built once per worker, every scenario only changes its bounds
+        worker['mrsp'] = MRSPTemplate(worker['pn'], env, solver, formulation, recorder)
+    worker['load_time'] = time.perf_counter() - start
+
+
+def run_scenario(scenario):
+    index, damaged_node = scenario
+    pn = worker['pn']
+    env = worker['env']
+    result = {'scenario': index, 'damaged_node': damaged_node, 'pid': os.getpid(),
+              'load_time': worker['load_time'], 'time': {}}
+    telemetry = worker['telemetry']
+    recorder = None
+    if telemetry is not None:
+        recorder = Recorder(telemetry_path(telemetry, "scenario_" + str(index)))
+        worker['mrsp'].recorder = recorder
+        result['telemetry'] = recorder.path
+    try:
+        start = time.perf_counter()
+        stage1 = worker['mrsp'].solve(damaged_node)
+        result['time']['mrsp'] = time.perf_counter() - start
+        result['max_flow'] = stage1.max_flow
+        result['repair'] = stage1.repair
+        if len(stage1.repair) == 0:
+            result['order'] = []
+            return result
+
+        start = time.perf_counter()
+        stage2 = ROP(pn, stage1.repair, damaged_node, fast=worker['fast'], max_flow=stage1.max_flow, env=env,
+                     start=stage1.solution, solver=worker['solver'], formulation=worker['formulation'],
+                     recorder=recorder)
+        result['time']['rop'] = time.perf_counter() - start
+        result['rop_obj'] = stage2.solution.obj_val
+        result['order'] = stage2.order
+
+        start = time.perf_counter()
+        stage3 = PDRPPCCDT(pn, worker['tn'], stage2.order, worker['vehicle'], env=env, solver=worker['solver'],
+                           recorder=recorder)
+        result['time']['pdrppccdt'] = time.perf_counter() - start
+        result['pdrppccdt_obj'] = stage3.solution.obj_val
+        result['edt'] = stage3.solution.edt.tolist()
+    except Exception as e:
+        result['error'] = repr(e)
+    return result
+
+
+def run_batch(scenarios, workers=None, threads=None, data_dir='data', w_num=20, base_num=2, fast=False,
+              output=None, solver='gurobi', formulation='indicator', telemetry=None):
+    """
+    Run MRSP -> ROP -> PDRPPCCDT for every damage scenario in a process pool. Every worker loads PN and TN
+    once. Results come back in scenario order and are also appended to output as JSON lines. With telemetry,
+    a directory, the stages of every scenario are recorded to scenario_<index>.json there and the data load of
+    every worker to load_<pid>.json, see instrumentation.py.
+    """
+    if telemetry is not None and not os.path.isdir(telemetry):
+        os.makedirs(telemetry)
+    workers = workers or os.cpu_count() or 1
+    threads = split_threads(workers, threads)
+    results = []
+    out = open(output, 'a') if output else None
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(data_dir, w_num, base_num, threads, fast, solver,
+                                           formulation, telemetry)) as pool:
+            for result in pool.map(run_scenario, enumerate(scenarios)):
+                results.append(result)
+                if out:
+                    out.write(json.dumps(result) + "\n")
+                    out.flush()
+    finally:
+        if out:
+            out.close()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the restoration pipeline for many damage scenarios.")
+    parser.add_argument('scenarios', help="file with one damage scenario per line")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes, default: all cores")
+    parser.add_argument('--threads', type=int, default=None, help="Gurobi threads per worker")
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--w-num', type=int, default=20)
+    parser.add_argument('--base-num', type=int, default=2)
+    parser.add_argument('--fast', action='store_true', help="matrix build path for ROP")
+    parser.add_argument('--output', default='batch_results.jsonl')
+    parser.add_argument('--solver', default='gurobi', choices=SOLVERS)
+    parser.add_argument('--formulation', default='indicator', choices=FORMULATIONS)
+    parser.add_argument('--telemetry', default=None, help="directory for the JSON telemetry of every scenario")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    batch = run_batch(read_scenarios(args.scenarios), args.workers, args.threads, args.data_dir, args.w_num,
+                      args.base_num, args.fast, args.output, args.solver, args.formulation,
+                      args.telemetry)
+    failed = [result for result in batch if 'error' in result]
+    print("%d scenarios, %d failed, %.1f s" % (len(batch), len(failed), time.perf_counter() - start))
+else:
+    print("batch_runner is implemented into another module.")
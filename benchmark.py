@@ -0,0 +1,161 @@
+# encoding: utf-8
+"""
+@file: benchmark.py
+@time: 2026/10/18 14:05
+"""
+import sys
+import time
+import numpy as np
+from power_network import PN
+from rop import ROP
+from rolling_rop import RollingROP
+from mrsp import MRSP
+from max_flow_calculation import MaxFlow, get_max_flow
+from solver import SOLVERS, get_runtime, get_node_count
+from matrix_model import FORMULATIONS
+
+
+class ROPBuild(ROP):
+    """
+    ROP that stops once the model is built, so that only model construction is timed.
+    """
+
+    def optimize(self):
+        self.model.update()
+
+
+def repair_set(pn, size):
+    """
+    size items spread evenly over the bus/gen/load/branch ordering.
+    """
+    return np.unique(np.linspace(0, pn.item_num - 1, min(size, pn.item_num)).astype(np.int64)).tolist()
+
+
+def rop_build_time(pn, sizes):
+    """
+    Build time of ROP with every item of the repair set damaged, for both build paths.
+    """
+    rows = []
+    for size in sizes:
+        repair = repair_set(pn, size)
+        row = {'repair': len(repair)}
+        for fast in [False, True]:
+            start = time.perf_counter()
+            # the served load does not change the build, skip MaxFlow
+            rop = ROPBuild(pn, repair, repair, fast=fast, max_flow=0.0)
+            row['fast' if fast else 'loop'] = time.perf_counter() - start
+            row['vars'] = rop.model.NumVars
+            row['constrs'] = rop.model.NumConstrs + rop.model.NumGenConstrs
+        rows.append(row)
+    return rows
+
+
+def rolling_loss(pn, sizes, window=5, overlap=1):
+    """
+    Solve time of the monolithic ROP and of RollingROP, and the objective loss of the rolling horizon.
+    """
+    rows = []
+    for size in sizes:
+        repair = repair_set(pn, size)
+        max_flow = get_max_flow(pn, repair, fast=True)
+        start = time.perf_counter()
+        rop = ROP(pn, repair, repair, fast=True, max_flow=max_flow)
+        row = {'repair': len(repair), 'monolithic': time.perf_counter() - start}
+        rolling = RollingROP(pn, repair, repair, window, overlap, fast=True, max_flow=max_flow)
+        row['rolling'] = rolling.run_time
+        row['loss %'] = 100 * rolling.loss(rop)
+        rows.append(row)
+    return rows
+
+
+def solver_times(pn, sizes, solvers=SOLVERS):
+    """
+    Build and solve time of MaxFlow, MRSP and ROP for every solver backend. Build time is the wall time less the
+    solve time reported by the backend, so the read-back of the model for HiGHS counts as build time.
+    """
+    rows = []
+    for size in sizes:
+        repair = repair_set(pn, size)
+        for solver in solvers:
+            row = {'repair': len(repair), 'solver': solver}
+            start = time.perf_counter()
+            max_flow = MaxFlow(pn, repair, fast=True, solver=solver)
+            row['max flow'] = max_flow.solution.obj_val
+            wall = time.perf_counter() - start
+            row['mf solve'] = get_runtime(max_flow.model)
+            row['mf build'] = wall - row['mf solve']
+
+            start = time.perf_counter()
+            mrsp = MRSP(pn, repair, max_flow=row['max flow'], fast=True, solver=solver)
+            wall = time.perf_counter() - start
+            row['mrsp solve'] = get_runtime(mrsp.model)
+            row['mrsp build'] = wall - row['mrsp solve']
+
+            start = time.perf_counter()
+            rop = ROP(pn, mrsp.repair, repair, fast=True, max_flow=row['max flow'], solver=solver)
+            wall = time.perf_counter() - start
+            row['rop solve'] = get_runtime(rop.model)
+            row['rop build'] = wall - row['rop solve']
+            row['rop obj'] = rop.solution.obj_val
+            rows.append(row)
+    return rows
+
+
+def formulation_times(pn, sizes, formulations=FORMULATIONS, solver=None):
+    """
+    Branch-and-bound nodes and solve time of MaxFlow, MRSP and ROP for every formulation of the AND and
+    indicator constraints, both build paths.
+    """
+    rows = []
+    for size in sizes:
+        repair = repair_set(pn, size)
+        for formulation in formulations:
+            for fast in [False, True]:
+                row = {'repair': len(repair), 'formulation': formulation, 'fast': fast}
+                max_flow = MaxFlow(pn, repair, fast=fast, solver=solver, formulation=formulation)
+                row['max flow'] = max_flow.solution.obj_val
+                row['mf nodes'] = int(get_node_count(max_flow.model))
+                row['mf solve'] = get_runtime(max_flow.model)
+                mrsp = MRSP(pn, repair, max_flow=row['max flow'], fast=fast, solver=solver, formulation=formulation)
+                row['mrsp nodes'] = int(get_node_count(mrsp.model))
+                row['mrsp solve'] = get_runtime(mrsp.model)
+                rop = ROP(pn, mrsp.repair, repair, fast=fast, max_flow=row['max flow'], solver=solver,
+                          formulation=formulation)
+                row['rop nodes'] = int(get_node_count(rop.model))
+                row['rop solve'] = get_runtime(rop.model)
+                row['rop obj'] = rop.solution.obj_val
+                rows.append(row)
+    return rows
+
+
+def display_table(rows, columns):
+    print(" ".join("%12s" % column for column in columns))
+    for row in rows:
+        print(" ".join("%12.4f" % row[column] if isinstance(row[column], float) else "%12s" % row[column]
+                       for column in columns))
+
+
+if __name__ == "__main__":
+    pn = PN()
+    if sys.argv[1:2] == ['rolling']:
+        sizes = [int(x) for x in sys.argv[2:]] or [5, 10, 20]
+        table = rolling_loss(pn, sizes)
+        print("ROP solve time [s] and rolling horizon loss against repair set size:")
+        display_table(table, ['repair', 'monolithic', 'rolling', 'loss %'])
+    elif sys.argv[1:2] == ['formulations']:
+        sizes = [int(x) for x in sys.argv[2:]] or [5, 10]
+        print("Nodes and solve time [s] of the indicator and big-M formulations against damage set size:")
+        display_table(formulation_times(pn, sizes), ['repair', 'formulation', 'fast', 'mf nodes', 'mf solve',
+                                                     'mrsp nodes', 'mrsp solve', 'rop nodes', 'rop solve',
+                                                     'rop obj'])
+    elif sys.argv[1:2] == ['solvers']:
+        sizes = [int(x) for x in sys.argv[2:]] or [5, 10]
+        print("Build and solve time [s] of every solver backend against damage set size:")
+        display_table(solver_times(pn, sizes), ['repair', 'solver', 'mf build', 'mf solve', 'mrsp build',
+                                                'mrsp solve', 'rop build', 'rop solve', 'rop obj'])
+    else:
+        sizes = [int(x) for x in sys.argv[1:]] or [5, 10, 20, 40, 80]
+        print("ROP build time [s] against repair set size:")
+        display_table(rop_build_time(pn, sizes), ['repair', 'vars', 'constrs', 'loop', 'fast'])
+else:
+    print("benchmark is implemented into another module.")
@@ -0,0 +1,224 @@
+# encoding: utf-8
+"""
+@file: benchmark_suite.py
+@time: 2026/10/19 10:30
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from gurobipy import *
+from case_generator import SyntheticCase, CASE_SIZES
+from vehicle import VEHICLE
+from max_flow_calculation import MaxFlow
+from mrsp import MRSP
+from rop import ROP
+from pdrppccdt import PDRPPCCDT
+from solver import SOLVERS, get_runtime
+from matrix_model import FORMULATIONS
+
+STAGES = ['max_flow', 'mrsp', 'rop', 'pdrppccdt']
+# report fields compared against a baseline
+METRICS = ['build', 'solve', 'peak_rss_mb']
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def model_size(model):
+    model.update()
+    return {'vars': model.NumVars, 'constrs': model.NumConstrs, 'gen_constrs': model.NumGenConstrs,
+            'nonzeros': model.NumNZs}
+
+
+def run_stage(stages, name, build):
+    """
+    Build and solve one stage, and record its times, the peak memory of the process so far and the model size.
+    Build time is the wall time less the solve time reported by the solver. Errors are recorded, not raised.
+    """
+    start = time.perf_counter()
+    try:
+        stage = build()
+    except Exception as e:
+        stages[name] = {'error': type(e).__name__ + ": " + str(e), 'wall': time.perf_counter() - start,
+                        'peak_rss_mb': peak_rss_mb()}
+        return None
+    wall = time.perf_counter() - start
+    solve = get_runtime(stage.model)
+    stages[name] = {'build': wall - solve, 'solve': solve, 'peak_rss_mb': peak_rss_mb(),
+                    'obj': stage.solution.obj_val}
+    stages[name].update(model_size(stage.model))
+    return stage
+
+
+def run_case(config):
+    """
+    Generate one synthetic case and run the stages on it. Runs in a fresh process, so peak_rss_mb of a stage
+    is the peak of the generator and every stage up to it.
+    """
+    result = {'bus_num': config['bus_num'], 'damage_ratio': config['damage_ratio'], 'seed': config['seed'],
+              'stages': {}}
+    stages = result['stages']
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        case = SyntheticCase(config['bus_num'], seed=config['seed'], base_num=config['base_num'],
+                             depot_num=config['depot_num'], travel_path=os.path.join(directory, 'travel_time.npy'))
+        damaged = case.damage(config['damage_ratio'])
+        pn, tn = case.pn, case.tn
+        result.update({'generate': time.perf_counter() - start, 'items': pn.item_num, 'branches': pn.branch_num,
+                       'damaged': len(damaged), 'peak_rss_mb': peak_rss_mb()})
+
+        env = Env(empty=True)
+        env.setParam('OutputFlag', 0)
+        env.setParam('Threads', config['threads'])
+        if config['time_limit'] is not None:
+            env.setParam('TimeLimit', config['time_limit'])
+        env.start()
+        options = {'fast': config['fast'], 'env': env, 'solver': config['solver'],
+                   'formulation': config['formulation']}
+
+        wanted = config['stages']
+        max_flow = mrsp = rop = None
+        if 'max_flow' in wanted:
+            max_flow = run_stage(stages, 'max_flow', lambda: MaxFlow(pn, damaged, **options))
+        if 'mrsp' in wanted and max_flow is not None:
+            mrsp = run_stage(stages, 'mrsp', lambda: MRSP(pn, damaged, max_flow=max_flow.solution.obj_val,
+                                                          **options))
+        if 'rop' in wanted and mrsp is not None:
+            if len(mrsp.repair) > config['max_repair']:
+                stages['rop'] = {'skipped': "%d repairs, more than max_repair" % len(mrsp.repair)}
+            else:
+                rop = run_stage(stages, 'rop', lambda: ROP(pn, mrsp.repair, damaged, max_flow=mrsp.max_flow,
+                                                           start=mrsp.solution, **options))
+        if 'pdrppccdt' in wanted and rop is not None:
+            # TN has service times for buses, gens and loads only
+            order = [i for i in rop.order if i < pn.branch_offset]
+            if len(order) == 0:
+                stages['pdrppccdt'] = {'skipped': "no bus, gen or load to repair"}
+            else:
+                run_stage(stages, 'pdrppccdt', lambda: PDRPPCCDT(pn, tn, order, VEHICLE(), env=env,
+                                                                 solver=config['solver']))
+        env.dispose()
+    return result
+
+
+def run_suite(sizes=CASE_SIZES, damage_ratios=(0.05,), seed=0, base_num=2, depot_num=None, solver='gurobi',
+              formulation='indicator', fast=True, time_limit=600, threads=None, max_repair=40, stages=STAGES,
+              output=None):
+    """
+    Run every size and damage ratio in its own process, one after another, and return the report. The report
+    is also written to output as JSON.
+    """
+    configs = [{'bus_num': bus_num, 'damage_ratio': ratio, 'seed': seed, 'base_num': base_num,
+                'depot_num': depot_num, 'solver': solver, 'formulation': formulation, 'fast': fast,
+                'time_limit': time_limit, 'threads': threads or os.cpu_count() or 1, 'max_repair': max_repair,
+                'stages': list(stages)}
+               for bus_num, ratio in itertools.product(sizes, damage_ratios)]
+    report = {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+              'gurobi': ".".join(str(x) for x in gurobi.version()), 'platform': platform.platform(),
+              'config': dict(configs[0], bus_num=list(sizes), damage_ratio=list(damage_ratios)) if configs else {},
+              'cases': []}
+    for config in configs:
+        # a fresh interpreter per case, so that peak memory starts from the imports only
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+            try:
+                result = pool.submit(run_case, config).result()
+            except Exception as e:
+                # the worker itself died, e.g. out of memory
+                result = {'bus_num': config['bus_num'], 'damage_ratio': config['damage_ratio'],
+                          'seed': config['seed'], 'error': type(e).__name__ + ": " + str(e), 'stages': {}}
+        report['cases'].append(result)
+        if output:
+            write_report(output, report)
+    return report
+
+
+def write_report(path, report):
+    tmp_path = path + "." + str(os.getpid()) + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(report, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def compare(report, baseline, tolerance=0.25, floor=0.05):
+    """
+    Stage metrics of report that grew by more than tolerance over the same case in baseline. Times below floor
+    seconds are noise and never count.
+    """
+    previous = {(case['bus_num'], case['damage_ratio'], case['seed']): case for case in baseline['cases']}
+    regressions = []
+    for case in report['cases']:
+        old_case = previous.get((case['bus_num'], case['damage_ratio'], case['seed']))
+        if old_case is None:
+            continue
+        for stage, new in case['stages'].items():
+            old = old_case['stages'].get(stage, {})
+            if 'error' in new and 'error' not in old and old:
+                regressions.append((case['bus_num'], case['damage_ratio'], stage, 'error', None, new['error']))
+            for metric in METRICS:
+                if metric not in new or metric not in old:
+                    continue
+                if metric != 'peak_rss_mb' and new[metric] < floor:
+                    continue
+                if new[metric] > old[metric] * (1 + tolerance):
+                    regressions.append((case['bus_num'], case['damage_ratio'], stage, metric, old[metric],
+                                        new[metric]))
+    return regressions
+
+
+def display_report(report):
+    columns = ['build', 'solve', 'peak_rss_mb', 'vars', 'constrs', 'gen_constrs']
+    print("%8s %7s %6s %10s " % ('buses', 'damage', 'items', 'stage') + " ".join("%12s" % c for c in columns))
+    for case in report['cases']:
+        if 'error' in case:
+            print("%8d %7.3f %6s %10s %s" % (case['bus_num'], case['damage_ratio'], '', '', case['error']))
+        for stage, row in case['stages'].items():
+            head = "%8d %7.3f %6d %10s " % (case['bus_num'], case['damage_ratio'], case['items'], stage)
+            if 'error' in row or 'skipped' in row:
+                print(head + row.get('error', row.get('skipped')))
+            else:
+                print(head + " ".join("%12.4f" % row[c] if isinstance(row[c], float) else "%12s" % row[c]
+                                      for c in columns))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build and solve every stage on synthetic cases of growing size.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=CASE_SIZES, help="bus numbers")
+    parser.add_argument('--damage-ratio', type=float, nargs='+', default=[0.05],
+                        help="share of the items that are damaged")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--base-num', type=int, default=2, help="crew bases")
+    parser.add_argument('--depot-num', type=int, default=None, help="stockpile depots, bus_num // 50 by default")
+    parser.add_argument('--solver', default='gurobi', choices=SOLVERS)
+    parser.add_argument('--formulation', default='indicator', choices=FORMULATIONS)
+    parser.add_argument('--classic', action='store_true', help="loop build path instead of the matrix one")
+    parser.add_argument('--time-limit', type=float, default=600, help="seconds per solve")
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument('--max-repair', type=int, default=40, help="skip ROP and routing above this many repairs")
+    parser.add_argument('--stages', nargs='+', default=STAGES, choices=STAGES)
+    parser.add_argument('--output', default='benchmark_report.json')
+    parser.add_argument('--baseline', default=None, help="earlier report to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    suite = run_suite(args.sizes, args.damage_ratio, args.seed, args.base_num, args.depot_num, args.solver,
+                      args.formulation, not args.classic, args.time_limit, args.threads, args.max_repair,
+                      args.stages, args.output)
+    display_report(suite)
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = compare(suite, json.load(f), args.tolerance)
+        for bus_num, ratio, stage, metric, old, new in found:
+            print("regression: %d buses, damage %.3f, %s %s: %s -> %s" % (bus_num, ratio, stage, metric, old, new))
+        if found:
+            raise SystemExit(1)
+else:
+    print("benchmark_suite is implemented into another module.")
@@ -0,0 +1,262 @@
+# encoding: utf-8
+"""
+@file: case_generator.py
+@time: 2026/10/19 9:10
+"""
+import os
+import sys
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import minimum_spanning_tree
+from scipy.sparse.linalg import spsolve
+from scipy.spatial import Delaunay, cKDTree
+from scipy.spatial.distance import cdist
+from data_cache import save_cache
+from power_network import PN, PN_CACHE
+from trans_network import TN, TN_CACHE, TRAVEL_TIME_CACHE
+
+# bus sizes of the benchmark suite, after the IEEE 30, 118 and 300 bus cases and larger synthetic grids
+CASE_SIZES = [30, 118, 300, 1000, 3000]
+
+# km between neighbouring buses, crew speed in km per minute
+BUS_SPACING = 10.0
+CREW_SPEED = 40.0 / 60
+
+# PDRPPCCDT picks up 150 units at every stockpile, so every delivery drops the same amount
+DEMAND = 150
+# service time range in minutes of a bus, gen and load repair, TN has no table for branches
+SERVICE_TIME = {'bus': (60, 120), 'gen': (90, 180), 'load': (30, 60)}
+
+
+class SyntheticCase:
+    """
+    A synthetic power network of bus_num buses with its transport network, in the tables PN and TN read.
+    Buses are spread uniformly over a square with BUS_SPACING km between neighbours. Branches are the minimum
+    spanning tree of the Delaunay triangulation plus the shortest remaining Delaunay edges up to
+    branch_ratio * bus_num, with reactance proportional to length. Generators and loads sit at gen_ratio and
+    load_ratio of the buses, the generator capacity exceeds the total demand by reserve. Every branch points
+    along its flow in the DC power flow of the undamaged network and is rated at least 1.2 times that flow, so
+    the undamaged network serves all demand.
+    The repair site (W-) of a bus, gen or load is its bus, of a branch its midpoint. Spare parts of every item
+    are stockpiled (W+) at the nearest of depot_num depots, and crews start and end at base_num bases.
+    Travel times in minutes form the 2 * (item_num + base_num) matrix TN expects. With travel_path the matrix
+    is written there block by block and memory mapped, which keeps the 3000 bus case out of memory.
+    write(data_dir) saves the case in the compiled files PN and TN load, so PN(data_dir) and
+    TN(item_num, base_num, data_dir) read it back like a network compiled from workbooks.
+    """
+
+    def __init__(self, bus_num, seed=0, base_num=2, depot_num=None, gen_ratio=0.2, load_ratio=0.6,
+                 branch_ratio=1.4, reserve=1.3, travel_path=None):
+        if bus_num < 3:
+            raise ValueError("a synthetic case needs at least 3 buses")
+        self.bus_num = bus_num
+        self.seed = seed
+        self.base_num = base_num
+        self.depot_num = depot_num or max(1, bus_num // 50)
+        self.gen_ratio = gen_ratio
+        self.load_ratio = load_ratio
+        self.branch_ratio = branch_ratio
+        self.reserve = reserve
+        self.travel_path = travel_path
+        self.rng = np.random.default_rng(seed)
+
+        # km coordinates of the buses and of the repair site of every item
+        self.bus_xy = None
+        self.item_xy = None
+
+        self.pn = None
+        self.tn = None
+
+        self.initialization()
+
+    def initialization(self):
+        self.set_power_network()
+        self.set_trans_network()
+
+    def set_power_network(self):
+        n = self.bus_num
+        rng = self.rng
+        self.bus_xy = rng.uniform(0, BUS_SPACING * np.sqrt(n), (n, 2))
+
+        """
+        Branches
+        """
+        edges = self.delaunay_edges()
+        length = np.hypot(*(self.bus_xy[edges[:, 0]] - self.bus_xy[edges[:, 1]]).T)
+        tree = minimum_spanning_tree(sp.csr_matrix((length, (edges[:, 0], edges[:, 1])), shape=(n, n))).tocoo()
+        in_tree = set(zip(tree.row.tolist(), tree.col.tolist()))
+        chosen = np.array([(i, j) in in_tree or (j, i) in in_tree for i, j in edges.tolist()])
+        extra = max(0, int(round(self.branch_ratio * n)) - int(chosen.sum()))
+        rest = np.flatnonzero(~chosen)
+        chosen[rest[np.argsort(length[rest])[:extra]]] = True
+        edges, length = edges[chosen], length[chosen]
+        x = np.maximum(length, 1.0) * rng.uniform(0.003, 0.005, len(edges))
+
+        """
+        Loads and generators
+        """
+        load_bus = np.sort(rng.choice(n, max(1, int(round(self.load_ratio * n))), replace=False))
+        pd = np.round(rng.lognormal(np.log(40), 0.6, len(load_bus)), 1)
+        load = np.column_stack([np.arange(1, len(load_bus) + 1), load_bus + 1, pd])
+
+        gen_bus = np.sort(rng.choice(n, max(1, int(round(self.gen_ratio * n))), replace=False))
+        pmax = rng.choice([50, 100, 200, 400], len(gen_bus)).astype(np.float64)
+        pmax = np.round(pmax * self.reserve * pd.sum() / pmax.sum(), 1)
+        gen = np.zeros((len(gen_bus), 21))
+        gen[:, 0] = gen_bus + 1
+        gen[:, 3] = pmax / 2
+        gen[:, 4] = -pmax / 2
+        gen[:, 5] = 1
+        gen[:, 6] = 100
+        gen[:, 7] = 1
+        gen[:, 8] = pmax
+        gen_cost = np.zeros((len(gen_bus), 7))
+        gen_cost[:, 0] = 2
+        gen_cost[:, 3] = 3
+        gen_cost[:, 4] = np.round(rng.uniform(0.01, 0.05, len(gen_bus)), 4)
+        gen_cost[:, 5] = np.round(rng.uniform(10, 40, len(gen_bus)), 2)
+
+        """
+        Direction and rating of the branches from the base case
+        """
+        injection = (np.bincount(gen_bus, pmax * pd.sum() / pmax.sum(), minlength=n)
+                     - np.bincount(load_bus, pd, minlength=n))
+        theta = self.dc_power_flow(edges, 100 / x, injection)
+        # the models keep pl >= 0 with pl = b * 100 * (theta_to - theta_from), so power flows from to to from
+        flip = theta[edges[:, 0]] > theta[edges[:, 1]]
+        edges[flip] = edges[flip][:, ::-1]
+        base_flow = 100 / x * (theta[edges[:, 1]] - theta[edges[:, 0]])
+        branch = np.zeros((len(edges), 11))
+        branch[:, 0:2] = edges + 1
+        branch[:, 2] = x / 10
+        branch[:, 3] = x
+        branch[:, 4] = 1 / x
+        branch[:, 5] = np.maximum(rng.choice([200, 300, 500, 800], len(edges)),
+                                  50 * np.ceil(1.2 * base_flow / 50))
+        branch[:, 6] = branch[:, 5]
+        branch[:, 7] = branch[:, 5]
+        branch[:, 10] = 1
+
+        bus = np.zeros((n, 13))
+        bus[:, 0] = np.arange(1, n + 1)
+        bus[:, 1] = 1
+        bus[gen_bus, 1] = 2
+        bus[gen_bus[np.argmax(pmax)], 1] = 3
+        bus[:, 2] = np.bincount(load_bus, pd, minlength=n)
+        bus[:, 6] = 1
+        bus[:, 7] = 1
+        bus[:, 9] = 230
+        bus[:, 10] = 1
+        bus[:, 11] = 1.06
+        bus[:, 12] = 0.94
+
+        self.pn = PN.from_arrays(bus, branch, gen, load, gen_cost)
+        pn = self.pn
+        self.item_xy = np.concatenate([self.bus_xy, self.bus_xy[pn.gen_bus], self.bus_xy[pn.load_bus],
+                                       (self.bus_xy[pn.branch_from] + self.bus_xy[pn.branch_to]) / 2])
+
+    @staticmethod
+    def dc_power_flow(edges, weight, injection):
+        """
+        Bus angles of the DC power flow with the given injections, bus 0 as slack.
+        """
+        n = len(injection)
+        i, j = edges[:, 0], edges[:, 1]
+        laplacian = sp.csr_matrix((np.concatenate([weight, weight, -weight, -weight]),
+                                   (np.concatenate([i, j, i, j]), np.concatenate([i, j, j, i]))), shape=(n, n))
+        theta = np.zeros(n)
+        theta[1:] = spsolve(laplacian[1:, 1:].tocsc(), injection[1:])
+        return theta
+
+    def delaunay_edges(self):
+        """
+        Undirected edges of the Delaunay triangulation of the buses, each once with i < j.
+        """
+        simplices = Delaunay(self.bus_xy).simplices
+        edges = np.concatenate([simplices[:, [0, 1]], simplices[:, [1, 2]], simplices[:, [0, 2]]])
+        return np.unique(np.sort(edges, axis=1), axis=0)
+
+    def set_trans_network(self):
+        pn = self.pn
+        rng = self.rng
+        w_num = pn.item_num
+        size = BUS_SPACING * np.sqrt(self.bus_num)
+        depot_xy = rng.uniform(0, size, (self.depot_num, 2))
+        base_xy = rng.uniform(0, size, (self.base_num, 2))
+        # W- sites, W+ depots, H+ and H- bases, in the node order of PDRPPCCDT
+        depot = cKDTree(depot_xy).query(self.item_xy)[1]
+        node_xy = np.concatenate([self.item_xy, depot_xy[depot], base_xy, base_xy])
+        travel_time = self.get_travel_time(node_xy)
+
+        def cost(num, kind):
+            table = np.zeros((num, 3))
+            table[:, 0] = np.arange(num)
+            table[:, 1] = DEMAND
+            table[:, 2] = rng.integers(SERVICE_TIME[kind][0], SERVICE_TIME[kind][1] + 1, num)
+            return table
+
+        coupling = np.column_stack([np.arange(w_num), np.arange(w_num)])
+        self.tn = TN.from_arrays(w_num, self.base_num, travel_time, coupling, cost(pn.bus_num, 'bus'),
+                                 cost(pn.gen_num, 'gen'), cost(pn.load_num, 'load'))
+
+    def get_travel_time(self, node_xy, block=256):
+        n = len(node_xy)
+        if self.travel_path is None:
+            travel_time = np.empty((n, n), dtype=np.float32)
+        else:
+            travel_time = np.lib.format.open_memmap(self.travel_path, mode='w+', dtype=np.float32, shape=(n, n))
+        for start in range(0, n, block):
+            minutes = cdist(node_xy[start:start + block], node_xy)
+            minutes /= CREW_SPEED
+            travel_time[start:start + block] = np.rint(minutes, out=minutes)
+        if self.travel_path is None:
+            return travel_time
+        travel_time.flush()
+        del travel_time
+        return np.load(self.travel_path, mmap_mode='r')
+
+    def damage(self, ratio, seed=None, clustered=True):
+        """
+        Damaged items for a disaster that hits ratio of all items. Clustered damage takes the items closest to
+        a random epicentre, as a storm or an earthquake would, otherwise items are drawn uniformly.
+        """
+        rng = np.random.default_rng(self.seed if seed is None else seed)
+        num = max(1, int(round(ratio * self.pn.item_num)))
+        if not clustered:
+            return np.sort(rng.choice(self.pn.item_num, num, replace=False)).tolist()
+        centre = self.item_xy[rng.integers(self.pn.item_num)]
+        distance = np.hypot(*(self.item_xy - centre).T)
+        return np.sort(np.argsort(distance, kind='stable')[:num]).tolist()
+
+    def write(self, data_dir):
+        """
+        Save the case as data_dir/pn_cache.npz, tn_cache.npz and travel_time.npy. There are no workbooks, so the
+        caches carry no source hashes and stay valid until workbooks are put into data_dir.
+        """
+        pn, tn = self.pn, self.tn
+        os.makedirs(data_dir, exist_ok=True)
+        save_cache(os.path.join(data_dir, PN_CACHE), [], {'bus': pn.bus, 'branch': pn.branch, 'gen': pn.gen,
+                                                          'load': pn.load, 'gen_cost': pn.gen_cost})
+        travel_time_path = os.path.join(data_dir, TRAVEL_TIME_CACHE)
+        if self.travel_path is None or os.path.abspath(self.travel_path) != os.path.abspath(travel_time_path):
+            tmp_path = travel_time_path + "." + str(os.getpid()) + ".tmp"
+            with open(tmp_path, 'wb') as f:
+                np.save(f, tn.travel_time)
+            os.replace(tmp_path, travel_time_path)
+        # written last, as compile_tn does, so a fresh tn_cache.npz always belongs to a complete travel time file
+        save_cache(os.path.join(data_dir, TN_CACHE), [], {'coupling': tn.coupling, 'bus_cost': tn.bus_cost,
+                                                          'gen_cost': tn.gen_cost, 'load_cost': tn.load_cost})
+
+    def display_size(self):
+        pn = self.pn
+        print("buses: %d, gens: %d, loads: %d, branches: %d, items: %d, TN nodes: %d" % (
+            pn.bus_num, pn.gen_num, pn.load_num, pn.branch_num, pn.item_num, len(self.tn.travel_time)))
+
+
+if __name__ == "__main__":
+    sizes = [int(x) for x in sys.argv[1:]] or CASE_SIZES
+    for bus_num in sizes:
+        case = SyntheticCase(bus_num)
+        case.display_size()
+else:
+    print("case_generator is implemented into another module.")
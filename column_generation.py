@@ -0,0 +1,328 @@
+# encoding: utf-8
+"""
+@file: column_generation.py
+@time: 2026/10/19 21:10
+"""
+import math
+import time
+import numpy as np
+import scipy.sparse as sp
+from scipy.optimize import linprog, milp, LinearConstraint, Bounds
+from power_network import PN
+from trans_network import TN
+from mrsp import MRSP
+from rop import ROP
+from vehicle import VEHICLE
+from routing_heuristic import RoutingHeuristic
+
+
+class RouteColumnGeneration:
+    """
+    Stage 3 as set partitioning over routes, solved by price-and-branch.
+
+    Master: every item is picked up and delivered by exactly one route, and every base sends out exactly one
+    route. The cost of a route is the sum of the completion times of its deliveries without waiting. The LP is
+    solved with HiGHS through scipy. Its duals price new routes.
+
+    Pricing: an elementary shortest path with resource constraints (ESPPRC), solved by labeling from every
+    base. A label holds time, load, the items on board and the last delivery. Routes deliver in repair order,
+    keep the load within the capacity and have at most one node m < VEHICLE.num, H+ and H- included. Pricing
+    first keeps the label_limit cheapest labels of every length. Once that finds nothing,
+    it runs without the limit, and converged is set when that also finds nothing.
+
+    Integer plan: set partitioning over all generated routes, solved as a MILP. The plan is scheduled with the
+    waits that the repair order (13) needs across routes, then improved with the moves of RoutingHeuristic. The
+    RoutingHeuristic solution also seeds the columns and is kept if it is better.
+
+    The master is the route model of RoutingHeuristic, where the pickup and delivery of an item share a route.
+    PDRPPCCDT only links them through ve (11) and edt (12), and ve does not tell routes apart when there are more
+    bases than VEHICLE.num, so it may have solutions outside this model. Waiting across routes is left out of
+    the master, so lower_bound is a lower bound on the route model, not a proven bound on PDRPPCCDT: the LP
+    optimum once converged, before that the best Lagrangian bound of exact pricing, or -inf. routes and solution
+    match RoutingHeuristic.
+    """
+
+    def __init__(self, pn, tn, order, vehicle, time_limit=None, max_iterations=200, columns_per_round=20,
+                 label_limit=50):
+        self.pn = pn
+        self.tn = tn
+        self.order = order
+        self.vehicle = vehicle
+        self.time_limit = time_limit
+        self.max_iterations = max_iterations
+        # columns_per_round: most routes added per base and pricing round
+        self.columns_per_round = columns_per_round
+        self.label_limit = label_limit
+
+        self.w_num = len(self.order)
+        self.h_num = self.tn.base_num
+
+        self.heuristic = None
+        # columns: (base, stops, cost) of every generated route
+        self.columns = []
+        self.known = set()
+        self.duals = None
+        self.lower_bound = -math.inf
+        self.converged = False
+        self.iterations = 0
+
+        self.routes = []
+        self.solution = None
+        self.run_time = 0
+        self.deadline = None
+
+        self.initialization()
+
+    def initialization(self):
+        start = time.perf_counter()
+        if self.time_limit is not None:
+            self.deadline = start + self.time_limit
+        self.heuristic = RoutingHeuristic(self.pn, self.tn, self.order, self.vehicle, self.time_limit)
+        # the improvement of the integer plan shares the time budget of the whole run
+        self.heuristic.deadline = self.deadline
+        self.set_columns()
+        self.price()
+        self.set_plan()
+        self.run_time = time.perf_counter() - start
+
+    def timed_out(self):
+        return self.deadline is not None and time.perf_counter() > self.deadline
+
+    def route_cost(self, k, stops):
+        """
+        Sum of the completion times of the deliveries of the route from base k, without waiting.
+        """
+        t, s = self.heuristic.travel_time, self.heuristic.service_time
+        total = 0.0
+        clock = 0.0
+        previous = 2 * self.w_num + k
+        for i in stops:
+            clock += t[previous, i] + s[i]
+            if i < self.w_num:
+                total += clock
+            previous = i
+        return total
+
+    def add_column(self, k, stops):
+        key = (k, tuple(stops))
+        if key in self.known:
+            return False
+        self.known.add(key)
+        self.columns.append((k, list(stops), self.route_cost(k, stops)))
+        return True
+
+    def set_columns(self):
+        """
+        The routes of RoutingHeuristic, and one route per base and item that only serves that item. With fewer
+        items than bases a base may stay idle, which is an empty route.
+        """
+        for k, path in enumerate(self.heuristic.routes):
+            if len(path) > 2:
+                self.add_column(k, path[1:-1])
+        for k in range(self.h_num):
+            for i in range(self.w_num):
+                stops = [[] for b in range(self.h_num)]
+                stops[k] = [i + self.w_num, i]
+                if self.heuristic.schedule(stops, complete=False) is not None:
+                    self.add_column(k, stops[k])
+            if not self.heuristic.all_bases:
+                self.add_column(k, [])
+
+    def master_matrix(self):
+        rows, cols = [], []
+        for c, (k, stops, cost) in enumerate(self.columns):
+            for i in stops:
+                if i < self.w_num:
+                    rows.append(i)
+                    cols.append(c)
+            rows.append(self.w_num + k)
+            cols.append(c)
+        shape = (self.w_num + self.h_num, len(self.columns))
+        matrix = sp.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=shape)
+        cost = np.array([cost for k, stops, cost in self.columns])
+        return matrix, cost
+
+    def solve_master(self):
+        matrix, cost = self.master_matrix()
+        result = linprog(cost, A_eq=matrix, b_eq=np.ones(matrix.shape[0]), bounds=(0, None), method='highs')
+        if result.status != 0:
+            raise ValueError("the route master has no solution: " + result.message)
+        self.duals = result.eqlin.marginals
+        return result.fun
+
+    def price(self):
+        """
+        Column generation: solve the master LP, add the routes of negative reduced cost, repeat. Every round of
+        exact pricing gives the Lagrangian bound, the LP value plus the least reduced cost of every base, so
+        lower_bound holds even when max_iterations or time_limit stops the loop.
+        """
+        exact = self.label_limit is None
+        while self.iterations < self.max_iterations and not self.timed_out():
+            self.iterations += 1
+            value = self.solve_master()
+            added = 0
+            bound = value
+            for k in range(self.h_num):
+                columns = self.pricing(k, None if exact else self.label_limit)
+                bound += min([0.0] + [reduced for reduced, stops in columns[:1]])
+                for reduced, stops in columns:
+                    added += self.add_column(k, stops)
+            if self.timed_out():
+                break
+            if exact:
+                self.lower_bound = max(self.lower_bound, bound)
+            if added == 0:
+                if exact:
+                    self.lower_bound = value
+                    self.converged = True
+                    return
+                exact = True
+            elif exact and self.label_limit is not None:
+                exact = False
+
+    def pricing(self, k, label_limit=None):
+        """
+        Reduced costs and stops of the routes from base k with the most negative reduced costs, by labeling. A
+        label is (reduced cost, time, load, on board, last delivery, vehicle node used, stops), with the items on
+        board as a bit mask. Deliveries follow the repair order, so only items after the last delivery are picked
+        up, and the first item on board is the only one to deliver. Routes therefore stay elementary without a
+        mask of the items picked up so far.
+        """
+        w_num = self.w_num
+        heuristic = self.heuristic
+        t, s, d = heuristic.travel_time, heuristic.service_time, heuristic.demand
+        capacity = self.vehicle.capacity
+        pi = self.duals[:w_num]
+        mu = self.duals[w_num + k]
+        h_plus = 2 * w_num + k
+        # dominance may compare loads only when a delivery never drops more than its pickup loaded
+        monotone = bool(np.all(d[:w_num] <= d[w_num:2 * w_num]))
+        # H+ k and H- k may already take the one node of fixed vehicle
+        base_nodes = len(heuristic.vehicle_nodes(k, []))
+        if base_nodes > 1:
+            return []
+
+        found = []
+        labels = [(0.0, 0.0, 0.0, 0, -1, base_nodes == 1, ())]
+        # nondominated labels of every node
+        front = {}
+        while labels:
+            extended = []
+            for cost, clock, load, board, last, used, stops in labels:
+                if self.timed_out():
+                    break
+                node = stops[-1] if stops else h_plus
+                if stops and board == 0:
+                    reduced = cost - mu
+                    if reduced < -1e-6:
+                        found.append((reduced, stops))
+                first = (board & -board).bit_length() - 1
+                for j in range(last + 1, w_num):
+                    # pickup of item j
+                    if not board >> j & 1:
+                        v = j + w_num
+                        if load + d[v] <= capacity and not (used and v < self.vehicle.num):
+                            arrive = clock + t[node, v] + s[v]
+                            extended.append((cost, arrive, load + d[v], board | 1 << j, last,
+                                             used or v < self.vehicle.num, stops + (v,)))
+                    # delivery of item j
+                    elif j == first and load - d[j] >= 0 and \
+                            not (used and j < self.vehicle.num):
+                        arrive = clock + t[node, j] + s[j]
+                        extended.append((cost + arrive - pi[j], arrive, load - d[j], board & ~(1 << j), j,
+                                         used or j < self.vehicle.num, stops + (j,)))
+            labels = []
+            if self.timed_out():
+                break
+            for label in sorted(extended):
+                if self.timed_out():
+                    break
+                if self.dominated(front, label, monotone):
+                    continue
+                labels.append(label)
+                if label_limit is not None and len(labels) >= label_limit:
+                    break
+        found.sort()
+        return [(reduced, list(stops)) for reduced, stops in found[:self.columns_per_round]]
+
+    @staticmethod
+    def dominated(front, label, monotone):
+        """
+        Whether a label at the same node with the same items on board is at least as good in cost, time, load,
+        last delivery and vehicle node. Otherwise the label joins front.
+        """
+        cost, clock, load, board, last, used, stops = label
+        key = (stops[-1], board)
+        for other in front.get(key, []):
+            if other[0] <= cost + 1e-9 and other[1] <= clock + 1e-9 and other[4] <= last and other[5] <= used \
+                    and (other[2] <= load if monotone else other[2] == load):
+                return True
+        front.setdefault(key, []).append(label)
+        return False
+
+    def set_plan(self):
+        """
+        Integer plan over the generated routes, scheduled with waits and improved, or the heuristic plan if that
+        is better.
+        """
+        heuristic = self.heuristic
+        self.solution, self.routes = heuristic.solution, heuristic.routes
+        if self.timed_out():
+            return
+        matrix, cost = self.master_matrix()
+        options = {}
+        if self.deadline is not None:
+            options['time_limit'] = max(0.0, self.deadline - time.perf_counter())
+        result = milp(cost, integrality=np.ones(len(cost)), bounds=Bounds(0, 1),
+                      constraints=LinearConstraint(matrix, 1, 1), options=options)
+        best = self.solution, self.routes
+        if result.x is not None:
+            stops = [[] for k in range(self.h_num)]
+            for c in np.flatnonzero(result.x > 0.5):
+                k, route, value = self.columns[c]
+                stops[k] = list(route)
+            if heuristic.schedule(stops) is not None:
+                solution, routes = heuristic.get_solution(heuristic.improve(stops))
+                if solution.obj_val < best[0].obj_val:
+                    best = solution, routes
+        self.solution, self.routes = best
+
+    def gap(self):
+        """
+        Relative gap of the plan to lower_bound, so a gap within the route model.
+        """
+        if self.lower_bound <= 0:
+            return 0.0 if self.solution.obj_val == 0 else math.inf
+        return (self.solution.obj_val - self.lower_bound) / self.lower_bound
+
+    def display_routes(self):
+        print("routes:")
+        for route in self.routes:
+            print(route)
+
+    def display_edt(self):
+        edt = self.solution.edt.tolist()
+        print("edt:")
+        print(edt)
+
+    def display_bound(self):
+        print("obj: %.4f  route model lower bound: %.4f%s  gap: %.2f%%  columns: %d  iterations: %d" % (
+            self.solution.obj_val, self.lower_bound, "" if self.converged else " (not converged)",
+            100 * self.gap(), len(self.columns), self.iterations))
+
+
+if __name__ == "__main__":
+    pn = PN()
+    tn = TN(20, 2)
+    d_node = [1, 2, 3, 4, 13, 14, 15, 17]
+    stage1 = MRSP(pn, d_node)
+    stage2 = ROP(pn, stage1.repair, d_node, max_flow=stage1.max_flow)
+    stage2.display_o()
+
+    stage3 = RouteColumnGeneration(pn, tn, stage2.order, VEHICLE(), time_limit=600)
+    stage3.display_routes()
+    stage3.display_edt()
+    stage3.display_bound()
+    print("column generation: %.3f s" % stage3.run_time)
+else:
+    print("column_generation is implemented into another module.")
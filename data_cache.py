@@ -0,0 +1,77 @@
+# encoding: utf-8
+"""
+@file: data_cache.py
+@time: 2026/10/18 9:12
+"""
+import hashlib
+import os
+import xlrd
+import numpy as np
+
+# bump whenever the layout of the compiled files changes
+CACHE_VERSION = 1
+
+
+def file_hash(path):
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def source_hashes(paths):
+    return np.array([file_hash(path) for path in paths])
+
+
+def read_sheet(path, index=0):
+    """
+    Read one sheet of a workbook into a list of rows.
+    """
+    workbook = xlrd.open_workbook(path, on_demand=True)
+    table = workbook.sheet_by_index(index)
+    rows = []
+    for i in range(table.nrows):
+        rows.append(table.row_values(i))
+    workbook.release_resources()
+    return rows
+
+
+def rows_to_array(rows, dtype=np.float64):
+    if len(rows) == 0:
+        return np.zeros((0, 0), dtype=dtype)
+    # empty cells come back from xlrd as ''
+    return np.array([[np.nan if v == '' else v for v in row] for row in rows], dtype=dtype)
+
+
+def load_cache(cache_path, paths):
+    """
+    Return the arrays stored in cache_path, or None when the file is missing, was written by another
+    CACHE_VERSION, or was compiled from different source files. A cache saved without source files, such as
+    a generated case, stays valid until source files appear next to it.
+    """
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with np.load(cache_path, allow_pickle=False) as data:
+            if int(data['__version__']) != CACHE_VERSION:
+                return None
+            if len(data['__sources__']) == 0:
+                if any(os.path.exists(path) for path in paths):
+                    return None
+            elif list(data['__sources__']) != list(source_hashes(paths)):
+                return None
+            return {key: data[key] for key in data.files if not key.startswith('__')}
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def save_cache(cache_path, paths, arrays):
+    """
+    Write arrays to cache_path together with the version and the hashes of the source files. The file is
+    written under a temporary name and moved into place, so concurrent readers never see half a file.
+    """
+    tmp_path = cache_path + "." + str(os.getpid()) + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, __version__=np.array(CACHE_VERSION), __sources__=source_hashes(paths), **arrays)
+    os.replace(tmp_path, cache_path)
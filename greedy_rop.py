@@ -0,0 +1,179 @@
+# encoding: utf-8
+"""
+@file: greedy_rop.py
+@time: 2026/10/18 19:20
+"""
+import heapq
+import math
+import sys
+import time
+import numpy as np
+from gurobipy import *
+from power_network import PN
+from mrsp import MRSP
+from rop import ROP, heuristic_order
+from matrix_model import balance_matrices, angle_matrix, energized
+from solution import Solution
+
+
+class FlowLP:
+    """
+    MaxFlow with y fixed: z follows from y, so the model is the LP of Constraint (7) - (11) in Model 1 with the
+    indicators replaced by bounds. An item with z = 0 gets upper bound 0 on its flow, and the DC row of a branch
+    with z = 0 is freed by a slack that is fixed to 0 while the branch is energized. Only bounds change between
+    solves, so every solve starts from the previous basis.
+    """
+
+    def __init__(self, pn, env=None):
+        self.pn = pn
+        self.model = Model("FlowLP", env=env)
+        self.model.Params.OutputFlag = 0
+        self.model.Params.Method = 1
+
+        self.pl = self.model.addMVar(pn.branch_num, lb=0, ub=pn.branch_rate)
+        self.pv_gen = self.model.addMVar(pn.gen_num, lb=0, ub=pn.gen_pmax)
+        self.pv_load = self.model.addMVar(pn.load_num, lb=0, ub=pn.load_pd)
+        self.theta = self.model.addMVar(pn.bus_num, lb=-2 * math.pi, ub=2 * math.pi)
+        self.model.setObjective(self.pv_load.sum(), GRB.MAXIMIZE)
+
+        gen, load, branch = balance_matrices(pn)
+        self.model.addConstr(gen @ self.pv_gen - load @ self.pv_load + branch @ self.pl == 0)
+
+        self.dc_index = np.flatnonzero(pn.branch_b > 0)
+        self.slack = self.model.addMVar(len(self.dc_index), lb=0, ub=0)
+        if len(self.dc_index) > 0:
+            self.model.addConstr(self.pl[self.dc_index] - angle_matrix(pn, self.dc_index) @ self.theta
+                                 + self.slack == 0)
+
+    def solve(self, z):
+        """
+        Served load for the given z.
+        """
+        on = np.asarray(z) > 0.5
+        pn = self.pn
+        self.pv_gen.ub = np.where(on[pn.gen_offset:pn.load_offset], pn.gen_pmax, 0)
+        self.pv_load.ub = np.where(on[pn.load_offset:pn.branch_offset], pn.load_pd, 0)
+        self.pl.ub = np.where(on[pn.branch_offset:], pn.branch_rate, 0)
+        free = ~on[pn.branch_offset + self.dc_index]
+        self.slack.lb = np.where(free, -GRB.INFINITY, 0)
+        self.slack.ub = np.where(free, GRB.INFINITY, 0)
+        self.model.optimize()
+        return self.model.objVal
+
+
+class GreedyROP:
+    """
+    Repair order without the MILP of Model 3: every period repairs the item of repair that restores the most
+    load, each candidate evaluated with FlowLP. Candidates that energize nothing new keep the current load and
+    are not solved. By default every candidate is solved in every period. lazy=True re-evaluates gains lazily
+    instead: a candidate is solved again only while its gain from an earlier period is still the largest in the
+    queue, so most periods solve a handful of LPs instead of one per remaining item. DC flow is not monotone in
+    the repaired set, so a stale gain is only an estimate and the lazy order is approximate, not greedy. Ties
+    go to the earlier item of heuristic_order. order and display_o match ROP, so stage 3 takes the result unchanged.
+    """
+
+    def __init__(self, pn, repair, damaged_node, max_flow=None, env=None, lazy=False):
+        self.pn = pn
+        self.damaged_node = damaged_node
+        self.repair = repair
+        # load served once every repair is done, the last period of the greedy order when not given
+        self.max_flow = max_flow
+        self.lazy = lazy
+        self.order = []
+        self.solution = None
+        self.run_time = 0
+
+        self.item_num = self.pn.item_num
+        self.r_num = len(self.repair)
+        self.lp = FlowLP(self.pn, env)
+        self.lp_count = 0
+
+        self.initialization()
+
+    def initialization(self):
+        start = time.perf_counter()
+        self.optimize()
+        self.run_time = time.perf_counter() - start
+
+    def optimize(self):
+        y = np.ones(self.item_num)
+        y[list(self.damaged_node)] = 0
+        z = energized(self.pn, y)
+        served = self.lp.solve(z)
+        self.lp_count += 1
+
+        # (-gain, rank, index, period the gain was computed in, served load after the repair)
+        queue = [(-math.inf, rank, index, -1, 0.0)
+                 for rank, index in enumerate(heuristic_order(self.pn, self.repair))]
+        heapq.heapify(queue)
+        flow = []
+        while queue:
+            gain, rank, index, period, value = heapq.heappop(queue)
+            if period < len(flow):
+                y[index] = 1
+                candidate = energized(self.pn, y)
+                y[index] = 0
+                if np.array_equal(candidate, z):
+                    value = served
+                else:
+                    value = self.lp.solve(candidate)
+                    self.lp_count += 1
+                heapq.heappush(queue, (-round(value - served, 6), rank, index, len(flow), value))
+                continue
+            y[index] = 1
+            z = energized(self.pn, y)
+            served = value
+            self.order.append(index)
+            flow.append(served)
+            if not self.lazy:
+                queue = [(-math.inf, rank, index, -1, 0.0) for _, rank, index, _, _ in queue]
+                heapq.heapify(queue)
+
+        if self.max_flow is None:
+            self.max_flow = flow[-1] if flow else served
+        self.solution = self.get_solution(np.array(flow))
+
+    def get_solution(self, flow):
+        solution = Solution(self.r_num * self.max_flow - flow.sum())
+        solution.flow = flow
+        solution.o = np.ones((self.item_num, self.r_num))
+        solution.o[list(self.damaged_node)] = 0
+        for k, index in enumerate(self.order):
+            solution.o[index, k:] = 1
+        return solution
+
+    def gap(self, rop):
+        """
+        Relative gap of the greedy objective against the objective of a solved ROP.
+        """
+        if rop.solution.obj_val == 0:
+            return 0.0 if self.solution.obj_val == 0 else math.inf
+        return (self.solution.obj_val - rop.solution.obj_val) / rop.solution.obj_val
+
+    def display_o(self):
+        o_value = [self.solution.o[i].tolist() for i in self.repair]
+        print("o value:")
+        print(o_value)
+        print("order:")
+        print(self.order)
+
+    def display_gap(self, rop):
+        print("greedy obj: %.4f  milp obj: %.4f  gap: %.2f%%" % (self.solution.obj_val, rop.solution.obj_val,
+                                                                  100 * self.gap(rop)))
+
+
+if __name__ == "__main__":
+    pn = PN()
+    d_node = [int(x) for x in sys.argv[1:]] or [1, 2, 3, 4, 13, 14, 15]
+    stage1 = MRSP(pn, d_node)
+    greedy = GreedyROP(pn, stage1.repair, d_node, max_flow=stage1.max_flow)
+    greedy.display_o()
+    print("greedy: %.3f s, %d LPs" % (greedy.run_time, greedy.lp_count))
+
+    start = time.perf_counter()
+    stage2 = ROP(pn, stage1.repair, d_node, max_flow=stage1.max_flow, start=stage1.solution,
+                 start_order=greedy.order)
+    print("milp: %.3f s" % (time.perf_counter() - start))
+    greedy.display_gap(stage2)
+else:
+    print("greedy_rop is implemented into another module.")
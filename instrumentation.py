@@ -0,0 +1,184 @@
+# encoding: utf-8
+"""
+@file: instrumentation.py
+@time: 2026/10/19 14:20
+"""
+import json
+import math
+import os
+import time
+from contextlib import contextmanager
+from gurobipy import *
+from solver import get_obj_val, get_obj_bound, get_runtime, get_node_count
+
+
+def get_recorder(recorder=None):
+    """
+    The recorder itself, or one that records nothing.
+    """
+    return Recorder(enabled=False) if recorder is None else recorder
+
+
+def finite(value):
+    # JSON has no infinity, Gurobi reports 1e100 before the first incumbent
+    if value is None or not math.isfinite(value) or abs(value) >= GRB.INFINITY:
+        return None
+    return value
+
+
+def gap(incumbent, bound):
+    if incumbent is None or bound is None:
+        return None
+    return abs(incumbent - bound) / max(abs(incumbent), 1e-10)
+
+
+class Recorder:
+    """
+    Telemetry of the stages of one run. Every stage (MaxFlow, MRSP, ROP, PDRPPCCDT, or a data load) is one
+    record with its wall time, the build time, variables, constraints and general constraints of every
+    constraint family, the model size, and every solve with its status, objective, bound, gap, nodes and the
+    trajectory of incumbent and bound over time. A stage opened inside another, such as the MaxFlow of an
+    MRSP, is a record of its own with parent set. Records are written to path as JSON after every top level
+    stage. A disabled recorder does nothing, so stages take recorder=None at no cost.
+
+    Constraint families are timed by marks: mark(model, name) closes the family before it and opens name, so
+    a builder only needs one call at the top of every family.
+    """
+
+    def __init__(self, path=None, enabled=True):
+        self.path = path
+        self.enabled = enabled
+        self.stages = []
+        self.stack = []
+
+    @contextmanager
+    def stage(self, name, model=None):
+        if not self.enabled:
+            yield None
+            return
+        record = {'stage': name, 'parent': self.stack[-1]['stage'] if self.stack else None,
+                  'start': time.time(), 'families': [], 'solves': []}
+        self.stages.append(record)
+        self.stack.append({'stage': name, 'record': record, 'model': model, 'family': None})
+        start = time.perf_counter()
+        try:
+            yield record
+        except Exception as e:
+            record['error'] = type(e).__name__ + ": " + str(e)
+            raise
+        finally:
+            frame = self.stack.pop()
+            self.close_family(frame)
+            record['wall'] = time.perf_counter() - start
+            if model is not None:
+                record['size'] = self.model_size(model)
+            if not self.stack:
+                self.write()
+
+    def mark(self, model, name):
+        """
+        Close the constraint family being built and open name.
+        """
+        if not self.enabled or not self.stack:
+            return
+        frame = self.stack[-1]
+        self.close_family(frame)
+        model.update()
+        frame['family'] = {'family': name, 'start': time.perf_counter(), 'vars': model.NumVars,
+                           'constrs': model.NumConstrs, 'gen_constrs': model.NumGenConstrs}
+
+    def close_family(self, frame):
+        family = frame['family']
+        if family is None:
+            return
+        frame['family'] = None
+        model = frame['model']
+        model.update()
+        frame['record']['families'].append({'family': family['family'],
+                                            'time': time.perf_counter() - family['start'],
+                                            'vars': model.NumVars - family['vars'],
+                                            'constrs': model.NumConstrs - family['constrs'],
+                                            'gen_constrs': model.NumGenConstrs - family['gen_constrs']})
+
+    def end_build(self):
+        """
+        Close the last constraint family before the solve.
+        """
+        if self.enabled and self.stack:
+            self.close_family(self.stack[-1])
+
+    def callback(self, callback=None):
+        """
+        Callback that records the solve trajectory and then calls callback, or callback itself when the
+        recorder is disabled.
+        """
+        if not self.enabled or not self.stack:
+            return callback
+        # the solve is not part of the last constraint family
+        self.end_build()
+        record = self.stack[-1]['record']
+        trajectory = []
+        record['solves'].append({'trajectory': trajectory})
+
+        def record_progress(model, where):
+            if where == GRB.Callback.MIP:
+                point = [model.cbGet(GRB.Callback.RUNTIME), finite(model.cbGet(GRB.Callback.MIP_OBJBST)),
+                         finite(model.cbGet(GRB.Callback.MIP_OBJBND))]
+                if not trajectory or trajectory[-1][1:3] != point[1:3]:
+                    trajectory.append(point + [gap(point[1], point[2])])
+            if callback is not None:
+                callback(model, where)
+
+        return record_progress
+
+    def solved(self, model):
+        """
+        Record the result of the last solve of model.
+        """
+        if not self.enabled or not self.stack:
+            return
+        solves = self.stack[-1]['record']['solves']
+        if not solves or 'status' in solves[-1]:
+            solves.append({'trajectory': []})
+        solve = solves[-1]
+        solve['status'] = model._status if getattr(model, '_solver', None) == 'highs' else model.Status
+        solve['runtime'] = get_runtime(model)
+        for key, get in [('obj', get_obj_val), ('bound', get_obj_bound), ('nodes', get_node_count)]:
+            try:
+                solve[key] = finite(get(model))
+            except (AttributeError, GurobiError):
+                solve[key] = None
+        solve['gap'] = gap(solve['obj'], solve['bound'])
+        # the final incumbent and bound, which the callback misses when the solver has none
+        trajectory = solve['trajectory']
+        if solve['obj'] is not None and (not trajectory or trajectory[-1][1:3] != [solve['obj'], solve['bound']]):
+            trajectory.append([solve['runtime'], solve['obj'], solve['bound'], solve['gap']])
+
+    @staticmethod
+    def model_size(model):
+        model.update()
+        return {'vars': model.NumVars, 'int_vars': model.NumIntVars, 'constrs': model.NumConstrs,
+                'gen_constrs': model.NumGenConstrs, 'nonzeros': model.NumNZs}
+
+    def write(self):
+        if not self.path:
+            return
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        tmp_path = self.path + "." + str(os.getpid()) + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'stages': self.stages}, f, indent=1)
+        os.replace(tmp_path, self.path)
+
+    def display(self):
+        for record in self.stages:
+            print("%s: %.3f s%s" % (record['stage'], record.get('wall', 0),
+                                    "" if record['parent'] is None else " in " + record['parent']))
+            for family in record['families']:
+                print("    %-40s %8.4f s %8d vars %8d constrs %8d gen constrs" % (
+                    family['family'], family['time'], family['vars'], family['constrs'], family['gen_constrs']))
+            for solve in record['solves']:
+                print("    solve: status %s, obj %s, bound %s, %.3f s, %s trajectory points" % (
+                    solve.get('status'), solve.get('obj'), solve.get('bound'), solve.get('runtime', 0),
+                    len(solve['trajectory'])))
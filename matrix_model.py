@@ -0,0 +1,239 @@
+# encoding: utf-8
+"""
+@file: matrix_model.py
+@time: 2026/10/18 11:20
+"""
+import math
+import numpy as np
+import scipy.sparse as sp
+from gurobipy import *
+from instrumentation import get_recorder
+
+# indicator: AND and indicator general constraints, bigm: the same logic as linear rows
+FORMULATIONS = ['indicator', 'bigm']
+
+
+def balance_matrices(pn):
+    """
+    Sparse bus x gen, bus x load and bus x branch matrices of the nodal balance (Constraint 7 in Model 1).
+    A branch adds its flow to the from bus and takes it from the to bus.
+    """
+    gen = sp.csr_matrix((np.ones(pn.gen_num), (pn.gen_bus, np.arange(pn.gen_num))), shape=(pn.bus_num, pn.gen_num))
+    load = sp.csr_matrix((np.ones(pn.load_num), (pn.load_bus, np.arange(pn.load_num))),
+                         shape=(pn.bus_num, pn.load_num))
+    branch = sp.csr_matrix((np.concatenate([np.ones(pn.branch_num), -np.ones(pn.branch_num)]),
+                            (np.concatenate([pn.branch_from, pn.branch_to]),
+                             np.concatenate([np.arange(pn.branch_num), np.arange(pn.branch_num)]))),
+                           shape=(pn.bus_num, pn.branch_num))
+    return gen, load, branch
+
+
+def angle_matrix(pn, branch_index):
+    """
+    Rows b * 100 * (theta_to - theta_from) of the DC flow equation for the given branches.
+    """
+    n = len(branch_index)
+    value = pn.branch_b[branch_index] * 100
+    return sp.csr_matrix((np.concatenate([value, -value]),
+                          (np.concatenate([np.arange(n), np.arange(n)]),
+                           np.concatenate([pn.branch_to[branch_index], pn.branch_from[branch_index]]))),
+                         shape=(n, pn.bus_num))
+
+
+def add_flow_variables(model, pn, names=False, r_num=None):
+    """
+    Add y, z, pl, pv_gen, pv_load and theta of Model 1 as MVars. With r_num every block gets a second
+    dimension with one column per period, as in Model 3.
+    """
+    def shape(n):
+        return n if r_num is None else (n, r_num)
+
+    def column(value):
+        return value if r_num is None else np.repeat(value[:, None], r_num, axis=1)
+
+    y = model.addMVar(shape(pn.item_num), vtype=GRB.BINARY, name="y" if names else "")
+    z = model.addMVar(shape(pn.item_num), vtype=GRB.BINARY, name="z" if names else "")
+    pl = model.addMVar(shape(pn.branch_num), lb=0, ub=column(pn.branch_rate), vtype=GRB.CONTINUOUS,
+                       name="pl" if names else "")
+    pv_gen = model.addMVar(shape(pn.gen_num), lb=0, ub=column(pn.gen_pmax), vtype=GRB.CONTINUOUS,
+                           name="pv_gen" if names else "")
+    pv_load = model.addMVar(shape(pn.load_num), lb=0, ub=column(pn.load_pd), vtype=GRB.CONTINUOUS,
+                            name="pv_load" if names else "")
+    theta = model.addMVar(shape(pn.bus_num), lb=-2 * math.pi, ub=2 * math.pi, vtype=GRB.CONTINUOUS,
+                          name="theta" if names else "")
+    return y, z, pl, pv_gen, pv_load, theta
+
+
+def fix_undamaged(y, pn, damaged_node):
+    """
+    Constraint (3) in Model 2 as bounds: every item that is not damaged has y = 1. Returns the bounds, which
+    Gurobi only reports from y.lb after the next model update.
+    """
+    lb = np.ones(y.shape)
+    lb[list(damaged_node)] = 0
+    y.lb = lb
+    return lb
+
+
+def energized(pn, y):
+    """
+    z for the given y as Constraint (4) - (6) in Model 1 define it. y has one row per item and may have one
+    column per period.
+    """
+    y = np.asarray(y) > 0.5
+    z = y.copy()
+    z[pn.gen_offset:pn.load_offset] &= y[pn.gen_bus]
+    z[pn.load_offset:pn.branch_offset] &= y[pn.load_bus]
+    z[pn.branch_offset:] &= y[pn.branch_from] & y[pn.branch_to]
+    return z.astype(float)
+
+
+def use_big_m(formulation):
+    if formulation not in FORMULATIONS:
+        raise ValueError("unknown formulation " + str(formulation) + ", expected one of " + ", ".join(FORMULATIONS))
+    return formulation == 'bigm'
+
+
+def dc_big_m(pn, branch_index):
+    """
+    M of the DC flow equation of the given branches. With the branch off its flow is 0 by Constraint (9), so
+    pl - b * 100 * (theta_to - theta_from) is bounded by b * 100 times the 4 pi range of the angle difference.
+    """
+    return pn.branch_b[branch_index] * 100 * 4 * math.pi
+
+
+def add_and(model, res, inputs, formulation='indicator', name=""):
+    """
+    res = AND(inputs) for single variables, as a general constraint or as res <= x and
+    res >= sum(inputs) - (len(inputs) - 1).
+    """
+    if not use_big_m(formulation):
+        return model.addGenConstrAnd(res, inputs, name=name)
+    for x in inputs:
+        model.addConstr(res <= x, name=name)
+    model.addConstr(res >= quicksum(inputs) - (len(inputs) - 1), name=name)
+
+
+def add_off(model, z, var, ub, formulation='indicator', name=""):
+    """
+    var = 0 when z = 0 for a variable with lower bound 0, as an indicator or as var <= ub * z.
+    """
+    if not use_big_m(formulation):
+        return model.addGenConstrIndicator(z, False, var == 0, name=name)
+    model.addConstr(var <= ub * z, name=name)
+
+
+def add_dc(model, z, pl, angle, m, formulation='indicator', name=""):
+    """
+    pl = angle when z = 1, as an indicator or as -m (1 - z) <= pl - angle <= m (1 - z).
+    """
+    if not use_big_m(formulation):
+        return model.addGenConstrIndicator(z, True, pl == angle, name=name)
+    model.addConstr(pl - angle <= m * (1 - z), name=name)
+    model.addConstr(pl - angle >= -m * (1 - z), name=name)
+
+
+def add_flow_constraints(model, pn, y, z, pl, pv_gen, pv_load, theta, names=False, formulation='indicator',
+                         recorder=None):
+    """
+    Constraint (4) - (11) in Model 1, or (8) - (14) in Model 3 when the blocks have a period dimension. Linear
+    rows are added as sparse matrix constraints, so the periods of Model 3 form one block diagonal system. With
+    formulation='indicator' the AND constraints need one call per item and period, with 'bigm' every family is
+    a matrix constraint. recorder times every family.
+    """
+    big_m = use_big_m(formulation)
+    recorder = get_recorder(recorder)
+    """
+    Constraint (4) in Model 1
+    """
+    recorder.mark(model, "Constraint (4) in Model 1")
+    model.addConstr(y[:pn.bus_num] == z[:pn.bus_num], name="Constraint 4" if names else "")
+
+    """
+    Constraint (5) and (6) in Model 1
+    """
+    recorder.mark(model, "Constraint (5) and (6) in Model 1")
+    if big_m:
+        add_and_rows(model, pn, y, z, names)
+    else:
+        y_list = y.reshape(pn.item_num, -1).tolist()
+        z_list = z.reshape(pn.item_num, -1).tolist()
+        gen_bus = pn.gen_bus.tolist()
+        load_bus = pn.load_bus.tolist()
+        branch_from = pn.branch_from.tolist()
+        branch_to = pn.branch_to.tolist()
+        for k in range(len(y_list[0]) if pn.item_num > 0 else 0):
+            period = " " + str(k) if y.ndim == 2 else ""
+            for i in range(pn.gen_num):
+                index = pn.gen_offset + i
+                model.addGenConstrAnd(z_list[index][k], [y_list[index][k], y_list[gen_bus[i]][k]],
+                                      name="Constraint 5 gen " + str(i) + period if names else "")
+            for i in range(pn.load_num):
+                index = pn.load_offset + i
+                model.addGenConstrAnd(z_list[index][k], [y_list[index][k], y_list[load_bus[i]][k]],
+                                      name="Constraint 5 load " + str(i) + period if names else "")
+            for i in range(pn.branch_num):
+                index = pn.branch_offset + i
+                model.addGenConstrAnd(z_list[index][k],
+                                      [y_list[index][k], y_list[branch_from[i]][k], y_list[branch_to[i]][k]],
+                                      name="Constraint 6 " + str(i) + period if names else "")
+
+    """
+    Constraint (7) in Model 1
+    """
+    recorder.mark(model, "Constraint (7) in Model 1")
+    gen, load, branch = balance_matrices(pn)
+    model.addConstr(gen @ pv_gen - load @ pv_load + branch @ pl == 0, name="Constraint 7" if names else "")
+
+    """
+    Constraint (8) and (9) in Model 1
+    """
+    recorder.mark(model, "Constraint (8) and (9) in Model 1")
+    column = (lambda value: value) if z.ndim == 1 else (lambda value: value[:, None])
+    if pn.gen_num > 0 and big_m:
+        model.addConstr(pv_gen <= column(pn.gen_pmax) * z[pn.gen_offset:pn.load_offset],
+                        name="Constraint 8 gen" if names else "")
+    elif pn.gen_num > 0:
+        model.addGenConstrIndicator(z[pn.gen_offset:pn.load_offset], False, pv_gen, GRB.EQUAL, 0.0,
+                                    name="Constraint 8 gen" if names else "")
+    if pn.load_num > 0 and big_m:
+        model.addConstr(pv_load <= column(pn.load_pd) * z[pn.load_offset:pn.branch_offset],
+                        name="Constraint 8 load" if names else "")
+    elif pn.load_num > 0:
+        model.addGenConstrIndicator(z[pn.load_offset:pn.branch_offset], False, pv_load, GRB.EQUAL, 0.0,
+                                    name="Constraint 8 load" if names else "")
+    if pn.branch_num > 0 and big_m:
+        model.addConstr(pl <= column(pn.branch_rate) * z[pn.branch_offset:], name="Constraint 9" if names else "")
+    elif pn.branch_num > 0:
+        model.addGenConstrIndicator(z[pn.branch_offset:], False, pl, GRB.EQUAL, 0.0,
+                                    name="Constraint 9" if names else "")
+
+    """
+    Constraint (10) and (11) in Model 1
+    """
+    recorder.mark(model, "Constraint (10) and (11) in Model 1")
+    index = np.flatnonzero(pn.branch_b > 0)
+    if len(index) > 0 and big_m:
+        off = column(dc_big_m(pn, index)) * (1 - z[pn.branch_offset + index])
+        model.addConstr(pl[index] - angle_matrix(pn, index) @ theta <= off, name="Constraint 10" if names else "")
+        model.addConstr(pl[index] - angle_matrix(pn, index) @ theta >= -off, name="Constraint 11" if names else "")
+    elif len(index) > 0:
+        model.addGenConstrIndicator(z[pn.branch_offset + index], True, pl[index] - angle_matrix(pn, index) @ theta,
+                                    GRB.EQUAL, 0.0, name="Constraint 10" if names else "")
+
+
+def add_and_rows(model, pn, y, z, names=False):
+    """
+    Constraint (5) and (6) in Model 1 as linear rows: z of an item is at most the y of the item and of each bus
+    it is attached to, and at least their sum less one less than their number.
+    """
+    for offset, end, buses, name in [(pn.gen_offset, pn.load_offset, [pn.gen_bus], "Constraint 5 gen"),
+                                     (pn.load_offset, pn.branch_offset, [pn.load_bus], "Constraint 5 load"),
+                                     (pn.branch_offset, pn.item_num, [pn.branch_from, pn.branch_to],
+                                      "Constraint 6")]:
+        if end == offset:
+            continue
+        inputs = [y[offset:end]] + [y[bus] for bus in buses]
+        for x in inputs:
+            model.addConstr(z[offset:end] <= x, name=name if names else "")
+        model.addConstr(z[offset:end] >= sum(inputs[1:], inputs[0]) - len(buses), name=name if names else "")
@@ -5,16 +5,96 @@
 @time: 2019/3/21 23:07
 '''
 
-from power_network import PN
+from power_network import PN, DamageOverlay
+import hashlib
+import json
 import math
+import os
+import numpy as np
 from gurobipy import *
+from matrix_model import add_flow_variables, add_flow_constraints, fix_undamaged, add_and, add_off, add_dc, dc_big_m
+from solution import Solution, get_values
+from solver import get_solver, get_obj_val
+from instrumentation import get_recorder
+
+MAX_FLOW_CACHE = 'max_flow'
+
+# max flow by network hash and damage set, shared by every stage of the process
+max_flow_cache = {}
+
+
+def max_flow_key(pn, damaged_node):
+    return pn.get_hash() + ":" + ",".join(str(i) for i in sorted(set(int(i) for i in damaged_node)))
+
+
+def get_max_flow(pn, damaged_node, cache_dir=None, fast=False, env=None, solver=None, formulation='indicator',
+                 recorder=None, solve=None):
+    """
+    Maximum load that can be served once every damaged item may be repaired, i.e. the objective of MaxFlow.
+    Results are cached in memory and on disk in cache_dir (data/max_flow by default), one small file per
+    network hash and damage set, so a miss costs one read and one write and parallel workers never overwrite
+    each other. On a miss MaxFlow is built and solved, or solve() is called when given, as MRSPTemplate does
+    to solve the max flow in its own model.
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join(pn.data_dir or 'data', MAX_FLOW_CACHE)
+    key = max_flow_key(pn, damaged_node)
+    if key in max_flow_cache:
+        return max_flow_cache[key]
+
+    path = max_flow_path(cache_dir, pn, key)
+    value = read_max_flow(path, key)
+    if value is None:
+        if solve is None:
+            value = MaxFlow(pn, damaged_node, fast=fast, env=env, solver=solver, formulation=formulation,
+                            recorder=recorder).solution.obj_val
+        else:
+            value = solve()
+        write_max_flow(path, key, value)
+    max_flow_cache[key] = value
+    return value
+
+
+def max_flow_path(cache_dir, pn, key):
+    # damage sets can be longer than a file name, so the file is named by their hash and holds the full key
+    return os.path.join(cache_dir, pn.get_hash(), hashlib.sha1(key.encode()).hexdigest() + ".json")
+
+
+def read_max_flow(path, key):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path) as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(entry, dict) or entry.get('key') != key:
+        return None
+    return entry.get('max_flow')
+
+
+def write_max_flow(path, key, value):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = path + "." + str(os.getpid()) + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'key': key, 'max_flow': value}, f)
+    os.replace(tmp_path, path)
 
 
 class MaxFlow():
 
-    def __init__(self, pn, damaged_node):
+    def __init__(self, pn, damaged_node, fast=False, names=False, env=None, solver=None, formulation='indicator',
+                 recorder=None):
         self.pn = pn
         self.damaged_node = damaged_node
+        # damage: DamageOverlay of damaged_node, set by set_damaged_node, the PN itself is never written
+        self.damage = None
+        # fast: build the model from MVars and sparse matrices, names: keep variable and constraint names there
+        self.fast = fast
+        self.names = names
+        # formulation: 'indicator' or 'bigm', how the AND and indicator constraints are written, see matrix_model.py
+        self.formulation = formulation
 
         self.y = []
         self.z = []
@@ -23,11 +103,17 @@ class MaxFlow():
         self.pv_load = []
         self.theta = []
 
-        self.model = Model("MaxFlow")
-        self.node_num = self.pn.bus_num + self.pn.gen_num + self.pn.load_num
-        self.y_num = self.node_num + self.pn.branch_num
+        # env carries solver parameters such as Threads
+        self.model = Model("MaxFlow", env=env)
+        # solver: 'gurobi' or 'highs', see solver.py
+        self.solver = get_solver(solver)
+        # recorder: build and solve telemetry, see instrumentation.py
+        self.recorder = get_recorder(recorder)
+        self.node_num = self.pn.node_num
+        self.y_num = self.pn.item_num
         self.z_num = self.y_num
 
+        self.solution = None
         self.y_value = []
         self.repair = []
         self.not_repair = []
@@ -35,41 +121,49 @@ class MaxFlow():
         self.initialization()
 
     def initialization(self):
-        # self.set_damaged_node()
-        self.set_variables()
-        self.set_obj()
-        self.set_constraints()
-        self.optimize()
+        self.set_damaged_node()
+        with self.recorder.stage("MaxFlow", self.model):
+            if self.fast:
+                self.build_matrix_model()
+            else:
+                self.recorder.mark(self.model, "variables")
+                self.set_variables()
+                self.recorder.mark(self.model, "objective")
+                self.set_obj()
+                self.set_constraints()
+            self.optimize()
+
+    def build_matrix_model(self):
+        """
+        The model of set_variables, set_obj and set_constraints, built from MVars and sparse matrices.
+        """
+        self.recorder.mark(self.model, "variables")
+        self.y, self.z, self.pl, self.pv_gen, self.pv_load, self.theta = add_flow_variables(self.model, self.pn,
+                                                                                            self.names)
+        self.model.setObjective(self.pv_load.sum(), GRB.MAXIMIZE)
+
+        self.recorder.mark(self.model, "Constraint (3) in Model 2")
+        fix_undamaged(self.y, self.pn, self.damaged_node)
+        add_flow_constraints(self.model, self.pn, self.y, self.z, self.pl, self.pv_gen, self.pv_load, self.theta,
+                             self.names, self.formulation, self.recorder)
 
     def set_variables(self):
         self.y = self.model.addVars(1, self.y_num, vtype=GRB.BINARY, name="y")
         self.z = self.model.addVars(1, self.z_num, vtype=GRB.BINARY, name="z")
 
-        for i in range(self.pn.branch_num):
-            var_name = "pl[" + str(i) + "]"
-            x = self.model.addVar(lb=0, ub=self.pn.branch[i][5], vtype=GRB.CONTINUOUS, name=var_name)
-            self.pl.append(x)
-        # self.pl = self.model.addVars(1, self.pn.branch_num, lb=-GRB.INFINITY,  ub=GRB.INFINITY, vtype=GRB.CONTINUOUS,
-        #                              name="pl")
-
-        for i in range(len(self.pn.gen)):
-            var_name = "pv_gen[" + str(i) + "]"
-            # x = self.model.addVar(lb=self.pn.gen[i][9], ub=self.pn.gen[i][8], vtype=GRB.CONTINUOUS, name=var_name)
-            x = self.model.addVar(lb=0, ub=self.pn.gen[i][8], vtype=GRB.CONTINUOUS, name=var_name)
-            self.pv_gen.append(x)
-
-        for i in range(len(self.pn.load)):
-            var_name = "pv_load[" + str(i) + "]"
-            x = self.model.addVar(lb=0, ub=self.pn.load[i][2], vtype=GRB.CONTINUOUS, name=var_name)
-            self.pv_load.append(x)
+        self.pl = self.model.addVars(self.pn.branch_num, lb=0, ub=self.pn.branch_rate.tolist(), vtype=GRB.CONTINUOUS,
+                                     name="pl")
+        # lb=self.pn.gen[i][9]
+        self.pv_gen = self.model.addVars(self.pn.gen_num, lb=0, ub=self.pn.gen_pmax.tolist(), vtype=GRB.CONTINUOUS,
+                                         name="pv_gen")
+        self.pv_load = self.model.addVars(self.pn.load_num, lb=0, ub=self.pn.load_pd.tolist(), vtype=GRB.CONTINUOUS,
+                                          name="pv_load")
 
         self.theta = self.model.addVars(1, self.pn.bus_num, lb=-2 * math.pi, ub=2 * math.pi, vtype=GRB.CONTINUOUS,
                                         name="theta")
 
     def set_obj(self):
-        obj = LinExpr()
-        for i in range(self.pn.load_num):
-            obj += self.pv_load[i]
+        obj = quicksum(self.pv_load.values())
         self.model.setObjective(obj, GRB.MAXIMIZE)
 
     def set_constraints(self):
@@ -85,14 +179,16 @@ class MaxFlow():
         """
         Constraint (3) in Model 2
         """
+        self.recorder.mark(self.model, "Constraint (3) in Model 2")
         for i in range(self.y_num):
-            if i not in list(self.damaged_node):
+            if not self.damage.mask[i]:
                 con_name = "Constraint 3" + str(i)
                 self.model.addConstr(self.y[0, i] == 1, name=con_name)
 
         """
         Constraint (4) in Model 1
         """
+        self.recorder.mark(self.model, "Constraint (4) in Model 1")
         for i in range(self.pn.bus_num):
             con_name = "Constraint 4" + str(i)
             self.model.addConstr(self.y[0, i] == self.z[0, i], name=con_name)
@@ -100,50 +196,45 @@ class MaxFlow():
         """
         Constraint (5) in Model 1
         """
+        self.recorder.mark(self.model, "Constraint (5) in Model 1")
         # y order: bus gen load line
+        gen_bus = self.pn.gen_bus.tolist()
         for i in range(self.pn.gen_num):
-            bus_num = self.pn.gen[i][0] - 1
+            index = self.pn.gen_offset + i
             con_name = "Constraint 5 gen" + str(i)
-            self.model.addGenConstrAnd(self.z[0, i + self.pn.bus_num],
-                                       [self.y[0, i + self.pn.bus_num], self.y[0, bus_num]], name=con_name)
+            add_and(self.model, self.z[0, index], [self.y[0, index], self.y[0, gen_bus[i]]], self.formulation,
+                    name=con_name)
 
+        load_bus = self.pn.load_bus.tolist()
         for i in range(self.pn.load_num):
-            bus_num = self.pn.load[i][1] - 1
+            index = self.pn.load_offset + i
             con_name = "Constraint 5 load " + str(i)
-            self.model.addGenConstrAnd(self.z[0, i + self.pn.bus_num + self.pn.gen_num],
-                                       [self.y[0, i + self.pn.bus_num + self.pn.gen_num], self.y[0, bus_num]],
-                                       name=con_name)
+            add_and(self.model, self.z[0, index], [self.y[0, index], self.y[0, load_bus[i]]], self.formulation,
+                    name=con_name)
 
         """
         Constraint (6) in Model 1
         """
+        self.recorder.mark(self.model, "Constraint (6) in Model 1")
+        branch_from = self.pn.branch_from.tolist()
+        branch_to = self.pn.branch_to.tolist()
         for i in range(self.pn.branch_num):
-            bus_from = self.pn.branch[i][0] - 1
-            bus_to = self.pn.branch[i][1] - 1
+            index = self.pn.branch_offset + i
             con_name = "Constraint 6 " + str(i)
-            self.model.addGenConstrAnd(self.z[0, i + self.pn.bus_num + self.pn.gen_num + self.pn.load_num],
-                                       [self.y[0, i + self.pn.bus_num + self.pn.gen_num + self.pn.load_num],
-                                        self.y[0, bus_from], self.y[0, bus_to]], name=con_name)
+            add_and(self.model, self.z[0, index],
+                    [self.y[0, index], self.y[0, branch_from[i]], self.y[0, branch_to[i]]], self.formulation,
+                    name=con_name)
 
         """
         Constraint (7) in Model 1
         """
+        self.recorder.mark(self.model, "Constraint (7) in Model 1")
+        incidence = self.pn.incidence
         for i in range(self.pn.bus_num):
-            load_set = []
-            for j in range(len(self.pn.load)):
-                if self.pn.load[j][1] - 1 == i:
-                    load_set.append(j)
-            gen_set = []
-            for j in range(len(self.pn.gen)):
-                if self.pn.gen[j][0] - 1 == i:
-                    gen_set.append(j)
-            li_set = []
-            lo_set = []
-            for j in range(len(self.pn.branch)):
-                if self.pn.branch[j][0] - 1 == i:
-                    li_set.append(j)
-                if self.pn.branch[j][1] - 1 == i:
-                    lo_set.append(j)
+            load_set = incidence.loads(i).tolist()
+            gen_set = incidence.gens(i).tolist()
+            li_set = incidence.branches_from(i).tolist()
+            lo_set = incidence.branches_to(i).tolist()
 
             expr = LinExpr()
             for index in load_set:
@@ -161,46 +252,47 @@ class MaxFlow():
         """
         Constraint 8 in Model (1)
         """
+        self.recorder.mark(self.model, "Constraint (8) in Model 1")
         for i in range(self.pn.gen_num):
             con_name = "Constraint 8 gen " + str(i)
-            self.model.addGenConstrIndicator(self.z[0, i + self.pn.bus_num], False,
-                                             self.pv_gen[i] == 0, name=con_name)
+            add_off(self.model, self.z[0, self.pn.gen_offset + i], self.pv_gen[i], self.pn.gen_pmax[i],
+                    self.formulation, name=con_name)
         for i in range(self.pn.load_num):
             con_name = "Constraint 8 gen " + str(i)
-            self.model.addGenConstrIndicator(self.z[0, i + self.pn.bus_num + self.pn.gen_num],
-                                             False, self.pv_load[i] == 0, name=con_name)
+            add_off(self.model, self.z[0, self.pn.load_offset + i], self.pv_load[i], self.pn.load_pd[i],
+                    self.formulation, name=con_name)
 
         """
         Constraint 9 in Model (1)
         """
+        self.recorder.mark(self.model, "Constraint (9) in Model 1")
         for i in range(self.pn.branch_num):
             con_name = "Constraint 9 " + str(i)
-            self.model.addGenConstrIndicator(self.z[0, i + self.pn.bus_num + self.pn.gen_num + self.pn.load_num],
-                                             False, self.pl[i] == 0, name=con_name)
+            add_off(self.model, self.z[0, self.pn.branch_offset + i], self.pl[i], self.pn.branch_rate[i],
+                    self.formulation, name=con_name)
 
         """
         Constraint 10 and 11 in Model (1)
         """
-        for i in range(self.pn.branch_num):
-            if self.pn.branch[i][4] > 0:
-                con_name = "Constraint 10 " + str(i)
-                to_bus = self.pn.branch[i][1] - 1
-                from_bus = self.pn.branch[i][0] - 1
-                self.model.addGenConstrIndicator(self.z[0, i + self.pn.bus_num + self.pn.gen_num + self.pn.load_num],
-                                                 True, self.pl[i] == self.pn.branch[i][4] * 100 *
-                                                 (self.theta[0, to_bus] - self.theta[0, from_bus]), name=con_name)
+        self.recorder.mark(self.model, "Constraint (10) and (11) in Model 1")
+        branch_b = self.pn.branch_b.tolist()
+        big_m = dc_big_m(self.pn, np.arange(self.pn.branch_num)).tolist()
+        for i in np.flatnonzero(self.pn.branch_b > 0).tolist():
+            con_name = "Constraint 10 " + str(i)
+            add_dc(self.model, self.z[0, self.pn.branch_offset + i], self.pl[i],
+                   branch_b[i] * 100 * (self.theta[0, branch_to[i]] - self.theta[0, branch_from[i]]), big_m[i],
+                   self.formulation, name=con_name)
 
     def optimize(self):
-        self.model.optimize()
+        self.solver.optimize(self.model, self.recorder.callback())
+        self.recorder.solved(self.model)
         # for v in self.model.getVars():
         #     print(v.varName, v.x)
-        for i in range(self.y_num):
-            var_name = "y[0," + str(i) + "]"
-            var = self.model.getVarByName(var_name)
-            self.y_value.append(var.x)
+        self.solution = self.get_solution()
+        self.y_value = self.solution.y.tolist()
         # print(self.y_value)
         for i in range(len(self.y_value)):
-            if self.y_value[i] >= (1 - 0.00000005) and i in self.damaged_node:
+            if self.y_value[i] >= (1 - 0.00000005) and self.damage.mask[i]:
                 self.repair.append(i)
             else:
                 self.not_repair.append(i)
@@ -208,9 +300,18 @@ class MaxFlow():
         # print(self.not_repair)
         # print('Obj:', self.model.objVal)
 
-    # def set_damaged_node(self):
-    #     for node in self.damaged_node:
-    #         self.pn.branch[node][10] = 0
+    def set_damaged_node(self):
+        self.damage = DamageOverlay(self.pn, self.damaged_node)
+
+    def get_solution(self):
+        solution = Solution(get_obj_val(self.model))
+        solution.y = get_values(self.model, self.y, self.y_num)
+        solution.z = get_values(self.model, self.z, self.z_num)
+        solution.pl = get_values(self.model, self.pl, self.pn.branch_num)
+        solution.pv_gen = get_values(self.model, self.pv_gen, self.pn.gen_num)
+        solution.pv_load = get_values(self.model, self.pv_load, self.pn.load_num)
+        solution.theta = get_values(self.model, self.theta, self.pn.bus_num)
+        return solution
 
     def display_repair(self):
         print("Minimum Restoration Set:")
@@ -4,17 +4,38 @@
 @file: power_flow_calculation_gurobi.py
 @time: 2019/3/12 20:32
 """
-from power_network import PN
+from power_network import PN, DamageOverlay
+from max_flow_calculation import get_max_flow
 import math
+import numpy as np
 from gurobipy import *
+from matrix_model import add_flow_variables, add_flow_constraints, fix_undamaged, energized, add_and, add_off, \
+    add_dc, dc_big_m
+from solution import Solution, get_values, set_values
+from prescreen import Prescreen
+from solver import get_solver, get_obj_val
+from instrumentation import get_recorder
 
 
 class MRSP:
 
-    def __init__(self, pn, damaged_node):
+    def __init__(self, pn, damaged_node, fast=False, names=False, max_flow=None, env=None, screen=False,
+                 solver=None, formulation='indicator', recorder=None):
         self.pn = pn
         # self.damaged_line = damaged_line
         self.damaged_node = damaged_node
+        # damage: DamageOverlay of damaged_node, set by set_damaged_node, the PN itself is never written
+        self.damage = None
+        # fast: build the model from MVars and sparse matrices, names: keep variable and constraint names there
+        self.fast = fast
+        self.names = names
+        # formulation: 'indicator' or 'bigm', how the AND and indicator constraints are written, see matrix_model.py
+        self.formulation = formulation
+        # load to be served, computed by MaxFlow when not given
+        self.max_flow = max_flow
+        # screen: fix the y of irrelevant and forced damaged items found by Prescreen before solving
+        self.use_screen = screen
+        self.screen = None
 
         self.y = []
         self.z = []
@@ -23,11 +44,18 @@ class MRSP:
         self.pv_load = []
         self.theta = []
 
-        self.model = Model("MRSP")
-        self.node_num = self.pn.bus_num + self.pn.gen_num + self.pn.load_num
-        self.y_num = self.node_num + self.pn.branch_num
+        # env carries solver parameters such as Threads
+        self.env = env
+        self.model = Model("MRSP", env=env)
+        # solver: 'gurobi' or 'highs', see solver.py
+        self.solver = get_solver(solver)
+        # recorder: build and solve telemetry, see instrumentation.py
+        self.recorder = get_recorder(recorder)
+        self.node_num = self.pn.node_num
+        self.y_num = self.pn.item_num
         self.z_num = self.y_num
 
+        self.solution = None
         self.y_value = []
         self.repair = []
         self.not_repair = []
@@ -35,64 +63,91 @@ class MRSP:
         self.initialization()
 
     def initialization(self):
-        self.set_damaged_node()
-        self.set_variables()
-        self.set_obj()
-        self.set_constraints()
-        self.optimize()
+        with self.recorder.stage("MRSP", self.model):
+            if self.max_flow is None:
+                self.max_flow = get_max_flow(self.pn, self.damaged_node, fast=self.fast, env=self.env,
+                                             solver=self.solver, formulation=self.formulation,
+                                             recorder=self.recorder)
+            self.set_damaged_node()
+            if self.fast:
+                self.build_matrix_model()
+            else:
+                self.recorder.mark(self.model, "variables")
+                self.set_variables()
+                self.recorder.mark(self.model, "objective")
+                self.set_obj()
+                self.set_constraints()
+            if self.use_screen:
+                self.recorder.mark(self.model, "screen")
+                self.set_screen()
+            self.optimize()
+
+    def set_screen(self):
+        self.screen = Prescreen(self.pn, self.damaged_node, self.max_flow)
+        lb, ub = self.screen.y_bounds(self.y_num)
+        set_values(self.model, self.y, 'LB', lb)
+        set_values(self.model, self.y, 'UB', ub)
+
+    def build_matrix_model(self):
+        """
+        The model of set_variables, set_obj and set_constraints, built from MVars and sparse matrices.
+        """
+        self.recorder.mark(self.model, "variables")
+        self.y, self.z, self.pl, self.pv_gen, self.pv_load, self.theta = add_flow_variables(self.model, self.pn,
+                                                                                            self.names)
+        self.model.setObjective(self.y.sum(), GRB.MINIMIZE)
+
+        """
+        Constraint (2) in Model 2
+        """
+        self.recorder.mark(self.model, "Constraint (2) in Model 2")
+        self.model.addConstr(self.pv_load.sum() == self.max_flow, name="Constraint 2" if self.names else "")
+
+        self.recorder.mark(self.model, "Constraint (3) in Model 2")
+        fix_undamaged(self.y, self.pn, self.damaged_node)
+        add_flow_constraints(self.model, self.pn, self.y, self.z, self.pl, self.pv_gen, self.pv_load, self.theta,
+                             self.names, self.formulation, self.recorder)
 
     def set_variables(self):
         self.y = self.model.addVars(1, self.y_num, vtype=GRB.BINARY, name="y")
         self.z = self.model.addVars(1, self.z_num, vtype=GRB.BINARY, name="z")
 
-        for i in range(self.pn.branch_num):
-            var_name = "pl[" + str(i) + "]"
-            x = self.model.addVar(lb=0, ub=self.pn.branch[i][5], vtype=GRB.CONTINUOUS, name=var_name)
-            self.pl.append(x)
-        # self.pl = self.model.addVars(1, self.pn.branch_num, lb=-GRB.INFINITY,  ub=GRB.INFINITY, vtype=GRB.CONTINUOUS,
-        #                              name="pl")
-
-        for i in range(len(self.pn.gen)):
-            var_name = "pv_gen[" + str(i) + "]"
-            # x = self.model.addVar(lb=self.pn.gen[i][9], ub=self.pn.gen[i][8], vtype=GRB.CONTINUOUS, name=var_name)
-            x = self.model.addVar(lb=0, ub=self.pn.gen[i][8], vtype=GRB.CONTINUOUS, name=var_name)
-            self.pv_gen.append(x)
-
-        for i in range(len(self.pn.load)):
-            var_name = "pv_load[" + str(i) + "]"
-            x = self.model.addVar(lb=0, ub=self.pn.load[i][2], vtype=GRB.CONTINUOUS, name=var_name)
-            self.pv_load.append(x)
+        self.pl = self.model.addVars(self.pn.branch_num, lb=0, ub=self.pn.branch_rate.tolist(), vtype=GRB.CONTINUOUS,
+                                     name="pl")
+        # lb=self.pn.gen[i][9]
+        self.pv_gen = self.model.addVars(self.pn.gen_num, lb=0, ub=self.pn.gen_pmax.tolist(), vtype=GRB.CONTINUOUS,
+                                         name="pv_gen")
+        self.pv_load = self.model.addVars(self.pn.load_num, lb=0, ub=self.pn.load_pd.tolist(), vtype=GRB.CONTINUOUS,
+                                          name="pv_load")
 
         self.theta = self.model.addVars(1, self.pn.bus_num, lb=-2 * math.pi, ub=2 * math.pi, vtype=GRB.CONTINUOUS,
                                         name="theta")
 
     def set_obj(self):
-        obj = LinExpr()
-        for i in range(self.y_num):
-            obj += self.y[0, i]
+        obj = quicksum(self.y.values())
         self.model.setObjective(obj, GRB.MINIMIZE)
 
     def set_constraints(self):
         """
         Constraint (2) in Model 2
         """
-        max_flow = 1965.527380937
-        constr2 = LinExpr()
-        for i in range(self.pn.load_num):
-            constr2 += self.pv_load[i]
-        self.model.addConstr(constr2 == max_flow, name="Constraint 2")
+        self.recorder.mark(self.model, "Constraint (2) in Model 2")
+        constr2 = quicksum(self.pv_load.values())
+        self.model.addConstr(constr2 == self.max_flow, name="Constraint 2")
 
         """
         Constraint (3) in Model 2
         """
+        self.recorder.mark(self.model, "Constraint (3) in Model 2")
         for i in range(self.y_num):
-            if i not in list(self.damaged_node):
+            if not self.damage.mask[i]:
                 con_name = "Constraint 3" + str(i)
                 self.model.addConstr(self.y[0, i] == 1, name=con_name)
 
         """
         Constraint (4) in Model 1
         """
+        self.recorder.mark(self.model, "Constraint (4) in Model 1")
         for i in range(self.pn.bus_num):
             con_name = "Constraint 4" + str(i)
             self.model.addConstr(self.y[0, i] == self.z[0, i], name=con_name)
@@ -100,50 +155,45 @@ class MRSP:
         """
         Constraint (5) in Model 1
         """
+        self.recorder.mark(self.model, "Constraint (5) in Model 1")
         # y order: bus gen load line
+        gen_bus = self.pn.gen_bus.tolist()
         for i in range(self.pn.gen_num):
-            bus_num = self.pn.gen[i][0] - 1
+            index = self.pn.gen_offset + i
             con_name = "Constraint 5 gen" + str(i)
-            self.model.addGenConstrAnd(self.z[0, i + self.pn.bus_num],
-                                       [self.y[0, i + self.pn.bus_num], self.y[0, bus_num]], name=con_name)
+            add_and(self.model, self.z[0, index], [self.y[0, index], self.y[0, gen_bus[i]]], self.formulation,
+                    name=con_name)
 
+        load_bus = self.pn.load_bus.tolist()
         for i in range(self.pn.load_num):
-            bus_num = self.pn.load[i][1] - 1
+            index = self.pn.load_offset + i
             con_name = "Constraint 5 load " + str(i)
-            self.model.addGenConstrAnd(self.z[0, i + self.pn.bus_num + self.pn.gen_num],
-                                       [self.y[0, i + self.pn.bus_num + self.pn.gen_num], self.y[0, bus_num]],
-                                       name=con_name)
+            add_and(self.model, self.z[0, index], [self.y[0, index], self.y[0, load_bus[i]]], self.formulation,
+                    name=con_name)
 
         """
         Constraint (6) in Model 1
         """
+        self.recorder.mark(self.model, "Constraint (6) in Model 1")
+        branch_from = self.pn.branch_from.tolist()
+        branch_to = self.pn.branch_to.tolist()
         for i in range(self.pn.branch_num):
-            bus_from = self.pn.branch[i][0]
-            bus_to = self.pn.branch[i][1]
+            index = self.pn.branch_offset + i
             con_name = "Constraint 6 " + str(i)
-            self.model.addGenConstrAnd(self.z[0, i + self.pn.bus_num + self.pn.gen_num + self.pn.load_num],
-                                       [self.y[0, i + self.pn.bus_num + self.pn.gen_num + self.pn.load_num],
-                                        self.y[0, bus_from], self.y[0, bus_to]], name=con_name)
+            add_and(self.model, self.z[0, index],
+                    [self.y[0, index], self.y[0, branch_from[i]], self.y[0, branch_to[i]]], self.formulation,
+                    name=con_name)
 
         """
         Constraint (7) in Model 1
         """
+        self.recorder.mark(self.model, "Constraint (7) in Model 1")
+        incidence = self.pn.incidence
         for i in range(self.pn.bus_num):
-            load_set = []
-            for j in range(len(self.pn.load)):
-                if self.pn.load[j][1] - 1 == i:
-                    load_set.append(j)
-            gen_set = []
-            for j in range(len(self.pn.gen)):
-                if self.pn.gen[j][0] - 1 == i:
-                    gen_set.append(j)
-            li_set = []
-            lo_set = []
-            for j in range(len(self.pn.branch)):
-                if self.pn.branch[j][0] == i:
-                    li_set.append(j)
-                if self.pn.branch[j][1] == i:
-                    lo_set.append(j)
+            load_set = incidence.loads(i).tolist()
+            gen_set = incidence.gens(i).tolist()
+            li_set = incidence.branches_from(i).tolist()
+            lo_set = incidence.branches_to(i).tolist()
 
             expr = LinExpr()
             for index in load_set:
@@ -161,47 +211,48 @@ class MRSP:
         """
         Constraint 8 in Model (1)
         """
+        self.recorder.mark(self.model, "Constraint (8) in Model 1")
         for i in range(self.pn.gen_num):
             con_name = "Constraint 8 gen " + str(i)
-            self.model.addGenConstrIndicator(self.z[0, i + self.pn.bus_num], False,
-                                             self.pv_gen[i] == 0, name=con_name)
+            add_off(self.model, self.z[0, self.pn.gen_offset + i], self.pv_gen[i], self.pn.gen_pmax[i],
+                    self.formulation, name=con_name)
 
         for i in range(self.pn.load_num):
             con_name = "Constraint 8 gen " + str(i)
-            self.model.addGenConstrIndicator(self.z[0, i + self.pn.bus_num + self.pn.gen_num],
-                                             False, self.pv_load[i] == 0, name=con_name)
+            add_off(self.model, self.z[0, self.pn.load_offset + i], self.pv_load[i], self.pn.load_pd[i],
+                    self.formulation, name=con_name)
 
         """
         Constraint 9 in Model (1)
         """
+        self.recorder.mark(self.model, "Constraint (9) in Model 1")
         for i in range(self.pn.branch_num):
             con_name = "Constraint 9 " + str(i)
-            self.model.addGenConstrIndicator(self.z[0, i + self.pn.bus_num + self.pn.gen_num + self.pn.load_num],
-                                             False, self.pl[i] == 0, name=con_name)
+            add_off(self.model, self.z[0, self.pn.branch_offset + i], self.pl[i], self.pn.branch_rate[i],
+                    self.formulation, name=con_name)
 
         """
         Constraint 10 and 11 in Model (1)
         """
-        for i in range(self.pn.branch_num):
-            if self.pn.branch[i][4] > 0:
-                con_name = "Constraint 10 " + str(i)
-                to_bus = self.pn.branch[i][1]
-                from_bus = self.pn.branch[i][0]
-                self.model.addGenConstrIndicator(self.z[0, i + self.pn.bus_num + self.pn.gen_num + self.pn.load_num],
-                                                 True, self.pl[i] == self.pn.branch[i][4] * 100 *
-                                                 (self.theta[0, to_bus] - self.theta[0, from_bus]), name=con_name)
+        self.recorder.mark(self.model, "Constraint (10) and (11) in Model 1")
+        branch_b = self.pn.branch_b.tolist()
+        big_m = dc_big_m(self.pn, np.arange(self.pn.branch_num)).tolist()
+        for i in np.flatnonzero(self.pn.branch_b > 0).tolist():
+            con_name = "Constraint 10 " + str(i)
+            add_dc(self.model, self.z[0, self.pn.branch_offset + i], self.pl[i],
+                   branch_b[i] * 100 * (self.theta[0, branch_to[i]] - self.theta[0, branch_from[i]]), big_m[i],
+                   self.formulation, name=con_name)
 
     def optimize(self):
-        self.model.optimize()
+        self.solver.optimize(self.model, self.recorder.callback())
+        self.recorder.solved(self.model)
         # for v in self.model.getVars():
         #     print(v.varName, v.x)
-        for i in range(self.y_num):
-            var_name = "y[0," + str(i) + "]"
-            var = self.model.getVarByName(var_name)
-            self.y_value.append(var.x)
+        self.solution = self.get_solution()
+        self.y_value = self.solution.y.tolist()
         # print(self.y_value)
         for i in range(len(self.y_value)):
-            if self.y_value[i] >= (1 - 0.00000005) and i in self.damaged_node:
+            if self.y_value[i] >= (1 - 0.00000005) and self.damage.mask[i]:
                 self.repair.append(i)
             else:
                 self.not_repair.append(i)
@@ -210,8 +261,17 @@ class MRSP:
         # print('Obj:', self.model.objVal)
 
     def set_damaged_node(self):
-        for node in self.damaged_node:
-            self.pn.branch[node][10] = 0
+        self.damage = DamageOverlay(self.pn, self.damaged_node)
+
+    def get_solution(self):
+        solution = Solution(get_obj_val(self.model))
+        solution.y = get_values(self.model, self.y, self.y_num)
+        solution.z = get_values(self.model, self.z, self.z_num)
+        solution.pl = get_values(self.model, self.pl, self.pn.branch_num)
+        solution.pv_gen = get_values(self.model, self.pv_gen, self.pn.gen_num)
+        solution.pv_load = get_values(self.model, self.pv_load, self.pn.load_num)
+        solution.theta = get_values(self.model, self.theta, self.pn.bus_num)
+        return solution
 
     def display_repair(self):
         print("Minimum Restoration Set:")
@@ -220,51 +280,131 @@ class MRSP:
         print(self.repair)
 
     def display_z(self):
-        z_value = []
-        for i in range(self.z_num):
-            var_name = "z[0," + str(i) + "]"
-            var = self.model.getVarByName(var_name)
-            z_value.append(var.x)
+        z_value = self.solution.z.tolist()
         print("z value:")
         print(z_value)
 
     def display_y(self):
-        y_value = []
-        for i in range(self.z_num):
-            var_name = "y[0," + str(i) + "]"
-            var = self.model.getVarByName(var_name)
-            y_value.append(var.x)
+        y_value = self.solution.y.tolist()
         print("y value:")
         print(y_value)
 
     def display_pv_load(self):
-        pv_load_value = []
-        for i in range(self.pn.load_num):
-            var_name = "pv_load[" + str(i) + "]"
-            var = self.model.getVarByName(var_name)
-            pv_load_value.append(var.x)
+        pv_load_value = self.solution.pv_load.tolist()
         print("stage 1 pv load:")
         print(pv_load_value)
 
     def display_pv_gen(self):
-        pv_gen_value = []
-        for i in range(self.pn.gen_num):
-            var_name = "pv_gen[" + str(i) + "]"
-            var = self.model.getVarByName(var_name)
-            pv_gen_value.append(var.x)
+        pv_gen_value = self.solution.pv_gen.tolist()
         print("stage 1 pv gen:")
         print(pv_gen_value)
 
     def display_pl(self):
-        pl_value = []
-        for i in range(self.pn.branch_num):
-            var_name = "pl[" + str(i) + "]"
-            var = self.model.getVarByName(var_name)
-            pl_value.append(var.x)
+        pl_value = self.solution.pl.tolist()
         print("stage 1 pl:")
         print(pl_value)
 
 
+class MRSPTemplate:
+    """
+    MRSP built once per network for a sweep over damage scenarios. Only Constraint (3) in Model 2 depends on the
+    scenario, so solve(damaged_node) changes the lower bounds of y and the right hand side of Constraint (2) and
+    re-optimizes the same model. MaxFlow is the same model with Constraint (2) relaxed and load as objective, so
+    the max flow of a new scenario is solved in place as well. The previous solution, lifted to the new bounds,
+    is passed as MIP start. After solve the template has repair, not_repair, max_flow and solution like MRSP.
+    The build and every solve are stages of recorder.
+    """
+
+    def __init__(self, pn, env=None, solver=None, formulation='indicator', recorder=None):
+        self.pn = pn
+        self.damaged_node = []
+        self.damage = None
+        self.max_flow = None
+        # lower bounds of y for the current scenario, kept as self.y.lb is stale until the model is updated
+        self.y_lb = None
+
+        self.model = Model("MRSP", env=env)
+        self.solver = get_solver(solver)
+        self.recorder = get_recorder(recorder)
+        self.y_num = self.pn.item_num
+        with self.recorder.stage("MRSPTemplate", self.model):
+            self.recorder.mark(self.model, "variables")
+            self.y, self.z, self.pl, self.pv_gen, self.pv_load, self.theta = add_flow_variables(self.model,
+                                                                                                self.pn)
+            """
+            Constraint (2) in Model 2
+            """
+            self.recorder.mark(self.model, "Constraint (2) in Model 2")
+            self.constr2 = self.model.addLConstr(LinExpr([1.0] * self.pn.load_num, self.pv_load.tolist()),
+                                                 GRB.EQUAL, 0.0)
+            add_flow_constraints(self.model, self.pn, self.y, self.z, self.pl, self.pv_gen, self.pv_load,
+                                 self.theta, formulation=formulation, recorder=self.recorder)
+            self.recorder.end_build()
+
+        self.solution = None
+        self.repair = []
+        self.not_repair = []
+
+    def solve(self, damaged_node, max_flow=None):
+        with self.recorder.stage("MRSPTemplate solve", self.model):
+            self.damaged_node = damaged_node
+            self.damage = DamageOverlay(self.pn, damaged_node)
+            self.y_lb = fix_undamaged(self.y, self.pn, damaged_node)
+            self.max_flow = self.get_max_flow() if max_flow is None else max_flow
+
+            self.model.setObjective(self.y.sum(), GRB.MINIMIZE)
+            self.constr2.Sense = GRB.EQUAL
+            self.constr2.RHS = self.max_flow
+            self.set_start()
+            self.solver.optimize(self.model, self.recorder.callback())
+            self.recorder.solved(self.model)
+
+        self.solution = self.get_solution()
+        self.repair = [i for i in range(self.y_num)
+                       if self.solution.y[i] >= (1 - 0.00000005) and self.damage.mask[i]]
+        repair = set(self.repair)
+        self.not_repair = [i for i in range(self.y_num) if i not in repair]
+        return self
+
+    def get_max_flow(self):
+        # through the memory and disk caches of get_max_flow, a miss is solved in this model
+        return get_max_flow(self.pn, self.damaged_node, solve=self.solve_max_flow)
+
+    def solve_max_flow(self):
+        self.model.setObjective(self.pv_load.sum(), GRB.MAXIMIZE)
+        self.constr2.Sense = GRB.GREATER_EQUAL
+        self.constr2.RHS = 0.0
+        self.set_start()
+        self.solver.optimize(self.model, self.recorder.callback())
+        self.recorder.solved(self.model)
+        self.solution = self.get_solution()
+        return self.solution.obj_val
+
+    def set_start(self):
+        """
+        The last solution with every undamaged item switched on, or nothing before the first solve.
+        """
+        if self.solution is None:
+            return
+        y = np.maximum(self.solution.y.round(), self.y_lb)
+        set_values(self.model, self.y, 'Start', y)
+        set_values(self.model, self.z, 'Start', energized(self.pn, y))
+
+    def get_solution(self):
+        solution = Solution(get_obj_val(self.model))
+        solution.y = get_values(self.model, self.y, self.y_num)
+        solution.z = get_values(self.model, self.z, self.y_num)
+        solution.pl = get_values(self.model, self.pl, self.pn.branch_num)
+        solution.pv_gen = get_values(self.model, self.pv_gen, self.pn.gen_num)
+        solution.pv_load = get_values(self.model, self.pv_load, self.pn.load_num)
+        solution.theta = get_values(self.model, self.theta, self.pn.bus_num)
+        return solution
+
+    def display_repair(self):
+        print("Minimum Restoration Set:")
+        print(self.repair)
+
+
 if __name__ == "__main__":
     pn = PN()
     # d_line = [0, 1]
@@ -276,4 +416,4 @@ if __name__ == "__main__":
     # print(opf.pn.load_num)
 else:
     print("power_network is implemented into another module.")
-    
\ No newline at end of file
+    
\ No newline at end of file
@@ -0,0 +1,306 @@
+# encoding: utf-8
+"""
+@file: network_reduction.py
+@time: 2026/10/18 22:30
+"""
+import numpy as np
+from power_network import PN
+from matrix_model import energized
+from solution import Solution
+
+
+class ReducedPN:
+    """
+    PN with undamaged radial trees and series chains collapsed, for MaxFlow, MRSP and ROP on large networks
+    where few items are damaged. Damaged items are never eliminated, so damaged_node and repair sets map one to
+    one between base and reduced network.
+
+    Power on a branch flows from its to bus into its from bus (pl >= 0 enters the balance of the from bus).
+    - leaf: an undamaged bus with one undamaged branch and only loads (or only generators) moves them to its
+      neighbour as one load with Pd = min(sum Pd, rating) (one generator with Pmax = min(sum Pmax, rating)).
+      If the branch points the wrong way they can never be served and are dropped.
+    - series: an undamaged bus without loads or generators between two undamaged branches that carry power
+      through it becomes one branch with rating min(R1, R2) and b = 1 / (1 / b1 + 1 / b2), or b = 0 (no DC
+      row) when either branch has none.
+    The angle of an eliminated bus is recovered from the DC equation of its branch but is no longer limited to
+    [-2 pi, 2 pi], so the reduced model is a relaxation when those limits would bind.
+    """
+
+    def __init__(self, pn, damaged_node):
+        self.base = pn
+        self.damaged_node = []
+        self.pn = None
+        # reduced item index of every base item, -1 when eliminated, and the base item of every reduced item,
+        # -1 for the equivalent loads, generators and branches
+        self.item_index = None
+        self.original_index = None
+        self.ops = []
+
+        self.base_damaged = set(int(i) for i in damaged_node)
+        self.initialization()
+
+    def initialization(self):
+        self.set_work()
+        self.reduce()
+        self.build()
+        self.damaged_node = [int(self.item_index[i]) for i in sorted(self.base_damaged)]
+
+    def set_work(self):
+        pn = self.base
+        self.gen_bus = pn.gen_bus.tolist()
+        self.gen_pmax = pn.gen_pmax.tolist()
+        self.gen_src = list(range(pn.gen_num))
+        self.load_bus = pn.load_bus.tolist()
+        self.load_pd = pn.load_pd.tolist()
+        self.load_src = list(range(pn.load_num))
+        self.branch_from = pn.branch_from.tolist()
+        self.branch_to = pn.branch_to.tolist()
+        self.branch_b = pn.branch_b.tolist()
+        self.branch_rate = pn.branch_rate.tolist()
+        self.branch_src = list(range(pn.branch_num))
+
+        self.bus_alive = [True] * pn.bus_num
+        self.gen_alive = [True] * pn.gen_num
+        self.load_alive = [True] * pn.load_num
+        self.branch_alive = [True] * pn.branch_num
+
+        self.bus_gens = [set(pn.incidence.gens(i).tolist()) for i in range(pn.bus_num)]
+        self.bus_loads = [set(pn.incidence.loads(i).tolist()) for i in range(pn.bus_num)]
+        self.bus_branches = [set(pn.incidence.branches_from(i).tolist()) | set(pn.incidence.branches_to(i).tolist())
+                             for i in range(pn.bus_num)]
+
+    def damaged(self, kind, index):
+        offset = {'bus': 0, 'gen': self.base.gen_offset, 'load': self.base.load_offset,
+                  'branch': self.base.branch_offset}[kind]
+        size = {'bus': self.base.bus_num, 'gen': self.base.gen_num, 'load': self.base.load_num,
+                'branch': self.base.branch_num}[kind]
+        return index < size and offset + index in self.base_damaged
+
+    def reduce(self):
+        queue = list(range(self.base.bus_num))
+        while queue:
+            u = queue.pop()
+            if not self.bus_alive[u] or self.damaged('bus', u):
+                continue
+            if any(self.damaged('gen', g) for g in self.bus_gens[u]) or \
+                    any(self.damaged('load', d) for d in self.bus_loads[u]):
+                continue
+            changed = self.collapse_leaf(u)
+            if changed is None:
+                changed = self.collapse_series(u)
+            if changed is not None:
+                queue.extend(changed)
+
+    def collapse_leaf(self, u):
+        gens, loads = self.bus_gens[u], self.bus_loads[u]
+        if len(self.bus_branches[u]) == 0:
+            if gens or loads:
+                return None
+            self.bus_alive[u] = False
+            self.ops.append(('isolated', u))
+            return []
+        if len(self.bus_branches[u]) != 1 or (gens and loads):
+            return None
+        e = next(iter(self.bus_branches[u]))
+        v = self.branch_to[e] if self.branch_from[e] == u else self.branch_from[e]
+        if v == u or self.damaged('branch', e):
+            return None
+
+        kind, members, new = None, [], None
+        if loads:
+            kind, members = 'load', sorted(loads)
+            if self.branch_from[e] == u:
+                new = self.add_load(v, min(sum(self.load_pd[d] for d in members), self.branch_rate[e]),
+                                    self.load_src[members[0]])
+            for d in members:
+                self.load_alive[d] = False
+        elif gens:
+            kind, members = 'gen', sorted(gens)
+            if self.branch_to[e] == u:
+                new = self.add_gen(v, min(sum(self.gen_pmax[g] for g in members), self.branch_rate[e]),
+                                  self.gen_src[members[0]])
+            for g in members:
+                self.gen_alive[g] = False
+
+        self.bus_alive[u] = False
+        self.branch_alive[e] = False
+        self.bus_branches[v].discard(e)
+        self.ops.append(('leaf', u, e, v, kind, members, new))
+        return [v]
+
+    def collapse_series(self, m):
+        if self.bus_gens[m] or self.bus_loads[m] or len(self.bus_branches[m]) != 2:
+            return None
+        p = [e for e in self.bus_branches[m] if self.branch_from[e] == m]
+        q = [e for e in self.bus_branches[m] if self.branch_to[e] == m]
+        if len(p) != 1 or len(q) != 1:
+            return None
+        p, q = p[0], q[0]
+        src, dst = self.branch_to[p], self.branch_from[q]
+        if src == dst or self.damaged('branch', p) or self.damaged('branch', q):
+            return None
+
+        bp, bq = self.branch_b[p], self.branch_b[q]
+        b = 1 / (1 / bp + 1 / bq) if bp > 0 and bq > 0 else 0.0
+        new = self.add_branch(dst, src, b, min(self.branch_rate[p], self.branch_rate[q]), self.branch_src[p])
+
+        self.bus_alive[m] = False
+        for e in [p, q]:
+            self.branch_alive[e] = False
+        self.bus_branches[src].discard(p)
+        self.bus_branches[dst].discard(q)
+        self.ops.append(('series', m, p, q, new))
+        return [src, dst]
+
+    def add_load(self, bus, pd, src):
+        self.load_bus.append(bus)
+        self.load_pd.append(pd)
+        self.load_src.append(src)
+        self.load_alive.append(True)
+        self.bus_loads[bus].add(len(self.load_bus) - 1)
+        return len(self.load_bus) - 1
+
+    def add_gen(self, bus, pmax, src):
+        self.gen_bus.append(bus)
+        self.gen_pmax.append(pmax)
+        self.gen_src.append(src)
+        self.gen_alive.append(True)
+        self.bus_gens[bus].add(len(self.gen_bus) - 1)
+        return len(self.gen_bus) - 1
+
+    def add_branch(self, from_bus, to_bus, b, rate, src):
+        self.branch_from.append(from_bus)
+        self.branch_to.append(to_bus)
+        self.branch_b.append(b)
+        self.branch_rate.append(rate)
+        self.branch_src.append(src)
+        self.branch_alive.append(True)
+        self.bus_branches[from_bus].add(len(self.branch_from) - 1)
+        self.bus_branches[to_bus].add(len(self.branch_from) - 1)
+        return len(self.branch_from) - 1
+
+    def build(self):
+        base = self.base
+        self.bus_keep = np.flatnonzero(self.bus_alive)
+        self.gen_keep = np.flatnonzero(self.gen_alive)
+        self.load_keep = np.flatnonzero(self.load_alive)
+        self.branch_keep = np.flatnonzero(self.branch_alive)
+        bus_id = np.zeros(base.bus_num, dtype=np.int64)
+        bus_id[self.bus_keep] = np.arange(1, len(self.bus_keep) + 1)
+
+        bus = base.bus[self.bus_keep].copy()
+        bus[:, 0] = np.arange(1, len(bus) + 1)
+
+        gen_src = np.array(self.gen_src, dtype=np.int64)[self.gen_keep]
+        gen = base.gen[gen_src].copy()
+        gen[:, 0] = bus_id[np.array(self.gen_bus, dtype=np.int64)[self.gen_keep]]
+        gen[:, 8] = np.array(self.gen_pmax)[self.gen_keep]
+        gen_cost = base.gen_cost[gen_src] if len(base.gen_cost) == base.gen_num else base.gen_cost
+
+        load = base.load[np.array(self.load_src, dtype=np.int64)[self.load_keep]].copy()
+        load[:, 0] = np.arange(1, len(load) + 1)
+        load[:, 1] = bus_id[np.array(self.load_bus, dtype=np.int64)[self.load_keep]]
+        load[:, 2] = np.array(self.load_pd)[self.load_keep]
+
+        branch = base.branch[np.array(self.branch_src, dtype=np.int64)[self.branch_keep]].copy()
+        branch[:, 0] = bus_id[np.array(self.branch_from, dtype=np.int64)[self.branch_keep]]
+        branch[:, 1] = bus_id[np.array(self.branch_to, dtype=np.int64)[self.branch_keep]]
+        branch[:, 4] = np.array(self.branch_b)[self.branch_keep]
+        branch[:, 5] = np.array(self.branch_rate)[self.branch_keep]
+
+        self.pn = PN.from_arrays(bus, branch, gen, load, gen_cost)
+
+        self.original_index = np.concatenate([
+            self.bus_keep,
+            self.original(self.gen_keep, base.gen_num, base.gen_offset),
+            self.original(self.load_keep, base.load_num, base.load_offset),
+            self.original(self.branch_keep, base.branch_num, base.branch_offset)])
+        self.item_index = np.full(base.item_num, -1, dtype=np.int64)
+        kept = self.original_index >= 0
+        self.item_index[self.original_index[kept]] = np.flatnonzero(kept)
+
+    @staticmethod
+    def original(keep, num, offset):
+        return np.where(keep < num, keep + offset, -1)
+
+    def map_items(self, items):
+        """
+        Base item index of reduced items such as MRSP.repair or ROP.order.
+        """
+        index = self.original_index[np.asarray(items, dtype=np.int64)]
+        if np.any(index < 0):
+            raise ValueError("equivalent items have no base index")
+        return index.tolist()
+
+    def map_solution(self, solution):
+        """
+        Solution of the reduced network in the items of the base network. Blocks with one column per period,
+        as in ROP, are mapped column by column.
+        """
+        base, pn = self.base, self.pn
+        columns = solution.pv_load.shape[1:]
+
+        def work(values, keep, num):
+            full = np.zeros((num,) + columns)
+            full[keep] = values
+            return full
+
+        mapped = Solution(solution.obj_val)
+        mapped.flow = solution.flow
+        for block in ['y', 'o']:
+            values = getattr(solution, block)
+            if values is None:
+                continue
+            full = np.ones((base.item_num,) + values.shape[1:])
+            kept = self.item_index >= 0
+            full[kept] = values[self.item_index[kept]]
+            setattr(mapped, block, full)
+        bus_on = mapped.y[:base.bus_num] > 0.5 if mapped.y is not None else np.ones((base.bus_num,) + columns) > 0
+
+        pl = work(solution.pl, self.branch_keep, len(self.branch_alive))
+        pv_gen = work(solution.pv_gen, self.gen_keep, len(self.gen_alive))
+        pv_load = work(solution.pv_load, self.load_keep, len(self.load_alive))
+        theta = work(solution.theta, self.bus_keep, base.bus_num)
+
+        for op in reversed(self.ops):
+            if op[0] == 'isolated':
+                theta[op[1]] = 0
+            elif op[0] == 'leaf':
+                u, e, v, kind, members, new = op[1:]
+                value = pv_load if kind == 'load' else pv_gen
+                cap = np.array(self.load_pd if kind == 'load' else self.gen_pmax)[members] if members else []
+                flow = value[new] if new is not None else np.zeros(columns)
+                for member, c in zip(members, cap):
+                    value[member] = flow * c / cap.sum() if cap.sum() > 0 else 0
+                pl[e] = flow
+                # u is the from bus of e when it had loads and the to bus when it had generators
+                b = self.branch_b[e]
+                if b > 0 and kind == 'load':
+                    theta[u] = theta[v] - flow / (100 * b)
+                elif b > 0 and kind == 'gen':
+                    theta[u] = theta[v] + flow / (100 * b)
+                else:
+                    theta[u] = theta[v]
+            elif op[0] == 'series':
+                m, p, q, new = op[1:]
+                pl[p] = pl[new]
+                pl[q] = pl[new]
+                # one of the two branches may be energized alone, take the angle from the DC row of that one
+                src, dst = self.branch_to[p], self.branch_from[q]
+                bp, bq = self.branch_b[p], self.branch_b[q]
+                from_p = theta[src] - pl[new] / (100 * bp) if bp > 0 else theta[src]
+                from_q = theta[dst] + pl[new] / (100 * bq) if bq > 0 else theta[dst]
+                theta[m] = np.where(bus_on[dst] & (bq > 0), from_q, from_p)
+
+        mapped.pl = pl[:base.branch_num]
+        mapped.pv_gen = pv_gen[:base.gen_num]
+        mapped.pv_load = pv_load[:base.load_num]
+        mapped.theta = theta
+        if mapped.y is not None:
+            mapped.z = energized(base, mapped.y)
+        return mapped
+
+    def display_size(self):
+        print("buses: %d -> %d, branches: %d -> %d, items: %d -> %d" % (
+            self.base.bus_num, self.pn.bus_num, self.base.branch_num, self.pn.branch_num, self.base.item_num,
+            self.pn.item_num))
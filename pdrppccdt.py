@@ -10,12 +10,64 @@ from mrsp import MRSP
 from rop import ROP
 from vehicle import VEHICLE
 from gurobipy import *
+from solution import Solution, get_values, set_values
+from solver import get_solver, get_obj_val
+from instrumentation import get_recorder
+import math
 import numpy as np
 
 
+def find_cycles(successor):
+    """
+    Cycles of the graph given by successor[i] = j, every node has at most one successor.
+    """
+    cycles = []
+    walk = {}
+    for start in successor:
+        if start in walk:
+            continue
+        path = []
+        node = start
+        while node is not None and node not in walk:
+            walk[node] = start
+            path.append(node)
+            node = successor.get(node)
+        if node is not None and walk[node] == start:
+            cycles.append(path[path.index(node):])
+    return cycles
+
+
+def get_node_data(pn, tn, order):
+    """
+    Travel time between, service time and demand of the 2 * (len(order) + base_num) nodes of PDRPPCCDT. Node i
+    is TN node tn_index[i]: W- of item order[i], W+ of the same item, then H+ and H- of the bases. A W- node
+    takes the service time and demand of its item from the bus, gen or load cost table, a W+ node 50 and 150.
+    """
+    w_num = len(order)
+    index = np.array(order, dtype=np.int64)
+    tn_index = np.concatenate([index, index + tn.w_num, 2 * tn.w_num + np.arange(2 * tn.base_num)])
+    travel_time = np.asarray(tn.travel_time)[np.ix_(tn_index, tn_index)].astype(np.float64)
+
+    service_time = np.zeros(len(tn_index))
+    demand = np.zeros(len(tn_index))
+    for i, item in enumerate(order):
+        if item < pn.gen_offset:
+            cost = tn.bus_cost[item]
+        elif item < pn.load_offset:
+            cost = tn.gen_cost[item - pn.gen_offset]
+        else:
+            cost = tn.load_cost[item - pn.load_offset]
+        service_time[i] = cost[2]
+        demand[i] = cost[1]
+    # assume the pickup time is 50
+    service_time[w_num:2 * w_num] = 50
+    demand[w_num:2 * w_num] = 150
+    return travel_time, service_time, demand
+
+
 class PDRPPCCDT:
 
-    def __init__(self, pn, tn, order, vehicle):
+    def __init__(self, pn, tn, order, vehicle, env=None, solver=None, recorder=None, start=None):
         self.pn = pn
         self.tn = tn
         self.order = order
@@ -26,26 +78,49 @@ class PDRPPCCDT:
 
         self.vehicle = vehicle
 
-        self.model = Model("PDRPPCCDT")
-        self.node_num = self.pn.bus_num + self.pn.gen_num + self.pn.load_num
-        self.item_num = self.node_num + self.pn.branch_num
+        # env carries solver parameters such as Threads
+        self.model = Model("PDRPPCCDT", env=env)
+        # solver: 'gurobi' or 'highs', see solver.py
+        self.solver = get_solver(solver)
+        # recorder: build and solve telemetry, see instrumentation.py
+        self.recorder = get_recorder(recorder)
+        self.node_num = self.pn.node_num
+        self.item_num = self.pn.item_num
         self.tn_node_num = 2 * (self.tn.base_num + self.tn.w_num)
 
+        # travel time between, service time and demand of the l_num nodes, read from TN once
+        self.travel_time = None
+        self.service_time = None
+        self.demand = None
+        # arcs (i, j) some feasible route can use, successors[i] are the j of the arcs leaving i
+        self.arcs = []
+        self.successors = []
+
         self.sigma_x = []
         self.ve = []
         self.load = []
         self.edt = []
-        self.t = []
-        self.s = []
-        self.d = []
+
+        self.solution = None
+        # warm start: a solution with sigma_x, ve, load and edt of the same nodes, such as the one of
+        # RoutingHeuristic, passed as MIP start
+        self.start = start
 
         self.initialization()
 
     def initialization(self):
-        self.set_variables()
-        self.set_obj()
-        self.set_constraints()
-        self.optimize()
+        with self.recorder.stage("PDRPPCCDT", self.model):
+            self.set_node_data()
+            self.set_arcs()
+            self.recorder.mark(self.model, "variables")
+            self.set_variables()
+            self.recorder.mark(self.model, "objective")
+            self.set_obj()
+            self.set_constraints()
+            if self.start is not None:
+                self.recorder.mark(self.model, "start")
+                self.set_start()
+            self.optimize()
 
     def set_variables(self):
         # variable order:
@@ -53,14 +128,56 @@ class PDRPPCCDT:
         # W+    stockpiled node
         # H+    base station start
         # H-    base station return
-        self.sigma_x = self.model.addVars(self.l_num, self.l_num, vtype=GRB.BINARY, name="sigma_x")
+        # sigma_x and t only exist on the feasible arcs
+        self.sigma_x = self.model.addVars(self.arcs, vtype=GRB.BINARY, name="sigma_x")
         self.ve = self.model.addVars(1, self.l_num, lb=0, ub=self.vehicle.num - 1, vtype=GRB.INTEGER, name="ve")
         self.load = self.model.addVars(1, self.l_num, lb=0, ub=self.vehicle.capacity,
                                        vtype=GRB.INTEGER, name="load")
-        self.edt = self.model.addVars(1, self.l_num, lb=0, ub=GRB.INFINITY, vtype=GRB.INTEGER, name="edt")
-        self.t = self.model.addVars(self.l_num, self.l_num, vtype=GRB.INTEGER, name="t", lb=0, ub=GRB.INFINITY)
-        self.s = self.model.addVars(1, self.l_num, vtype=GRB.INTEGER, name="s", lb=0, ub=GRB.INFINITY)
-        self.d = self.model.addVars(1, self.l_num, vtype=GRB.INTEGER, name="s", lb=0, ub=GRB.INFINITY)
+        # travel time t, service time s and demand d are data, folded into the constraints below
+        self.edt = self.model.addVars(1, self.l_num, lb=self.get_edt_lb(), ub=self.get_edt_ub(), vtype=GRB.INTEGER,
+                                      name="edt")
+
+    def set_node_data(self):
+        self.travel_time, self.service_time, self.demand = get_node_data(self.pn, self.tn, self.order)
+
+    def set_arcs(self):
+        """
+        Arcs that some feasible route can use, the rest of the l_num x l_num pairs get no variable:
+        - no loops, nothing leaves H-, H+ only goes to W- and W+
+        - no arc into H+, whose edt is 0, from a node that takes time to serve or leave
+        - H+ starts empty, so it never goes straight to a W- node with demand
+        - W- i and W- j in a row need d_i + d_j on board, W+ i and W+ j in a row load d_i + d_j, both at most the
+          vehicle capacity
+        - W- nodes are served in order (13) and W+ i before W- i (12), so no arc from W- i back to W- j with j < i
+          or to W+ j with j <= i
+        """
+        w_num, h_num = self.w_num, self.h_num
+        capacity = self.vehicle.capacity
+        t, s, d = self.travel_time, self.service_time, self.demand
+
+        def feasible(i, j):
+            if i == j:
+                return False
+            if 2 * w_num <= j < 2 * w_num + h_num:
+                return i < 2 * w_num and s[i] + t[i, j] <= 0
+            if i >= 2 * w_num:
+                return j < w_num and d[j] <= 0 or w_num <= j < 2 * w_num
+            if i < w_num:
+                if j < w_num:
+                    return d[i] + d[j] <= capacity and (j > i or s[j] + t[i, j] <= 0)
+                if j < 2 * w_num:
+                    return j - w_num > i or s[j] + t[i, j] <= 0
+                return True
+            if d[i] > capacity:
+                return False
+            if w_num <= j < 2 * w_num:
+                return d[i] + d[j] <= capacity
+            return True
+
+        self.arcs = tuplelist((i, j) for i in range(2 * w_num + h_num) for j in range(self.l_num) if feasible(i, j))
+        self.successors = [[] for i in range(self.l_num)]
+        for i, j in self.arcs:
+            self.successors[i].append(j)
 
     def set_obj(self):
         obj = LinExpr()
@@ -69,38 +186,36 @@ class PDRPPCCDT:
         self.model.setObjective(obj, GRB.MINIMIZE)
 
     def set_constraints(self):
-        self.set_t_variable_value()
-        self.set_s_d_variable_value()
+        # travel time, service time and demand, see set_node_data
+        t, s, d = self.travel_time, self.service_time, self.demand
 
         """
         Constraint for sigma_x
         """
+        self.recorder.mark(self.model, "Constraint for sigma_x")
+        # loops, arcs leaving H- and arcs from H+ to H+ or H- have no variable
         for i in range(self.l_num - self.h_num):
-            self.model.addConstr(self.sigma_x[i, i] == 0)
-            self.model.addConstr(quicksum(self.sigma_x[i, j] for j in range(self.l_num)) == 1)
+            self.model.addConstr(self.sigma_x.sum(i, '*') == 1)
 
         for i in range(self.w_num * 2):
-            self.model.addConstr(quicksum(self.sigma_x[j, i] for j in range(self.l_num)) == 1)
-        for i in range(self.w_num * 2, self.w_num * 2 + self.h_num):
-            self.model.addConstr(quicksum(self.sigma_x[i, j] for j in range(self.w_num * 2)) == 1)
-        for i in range(self.w_num * 2 + self.h_num, self.l_num):
-            for j in range(self.l_num):
-                self.model.addConstr(self.sigma_x[i, j] == 0)
+            self.model.addConstr(self.sigma_x.sum('*', i) == 1)
 
         """
         Vehicle of H+ node
         """
+        self.recorder.mark(self.model, "Vehicle of H+ node")
         for i in range(self.vehicle.num):
             self.model.addConstr(self.ve[0, i] == i)
 
         """
         Constraint (3) - (7)
         """
+        self.recorder.mark(self.model, "Constraint (3) - (7)")
         for i in range(self.h_num):
             index = i + 2 * self.w_num
 
             con_name = "Constraint 3 " + str(i)
-            for j in range(self.l_num):
+            for j in self.successors[index]:
                 con_name = con_name + " " + str(j)
                 self.model.addGenConstrIndicator(self.sigma_x[index, j], True,
                                                  self.ve[0, index] == self.ve[0, j], name=con_name)
@@ -110,7 +225,7 @@ class PDRPPCCDT:
             self.model.addConstr(self.load[0, index] == 0, name=con_name)
 
             con_name = "Constraint 5 " + str(i)
-            for j in range(self.l_num):
+            for j in self.successors[index]:
                 con_name = con_name + " " + str(j)
                 self.model.addGenConstrIndicator(self.sigma_x[index, j], True, self.load[0, j] == 0, name=con_name)
             # self.model.addConstr(self.load[0, self.sigma[0, index]] == 0, name=con_name)
@@ -119,41 +234,42 @@ class PDRPPCCDT:
             self.model.addConstr(self.edt[0, index] == 0, name=con_name)
 
             con_name = "Constraint 7 " + str(i)
-            for j in range(self.l_num):
+            for j in self.successors[index]:
                 con_name = con_name + " " + str(j)
                 self.model.addGenConstrIndicator(self.sigma_x[index, j], True,
-                                                 self.edt[0, j] >= self.t[index, j] + self.s[0, j], name=con_name)
+                                                 self.edt[0, j] >= float(t[index, j] + s[j]), name=con_name)
             # self.model.addConstr(self.edt[0, self.sigma[0, index]] == self.t[index, self.sigma[0, index]] +
             #                      self.s[0, self.sigma[0, index]], name=con_name)
 
         """
         Constraint (8) - (10)
         """
+        self.recorder.mark(self.model, "Constraint (8) - (10)")
         for i in range(2 * self.w_num):
             con_name = "Constraint 8 " + str(i)
-            for j in range(self.l_num):
+            for j in self.successors[i]:
                 con_name = con_name + " " + str(j)
                 self.model.addGenConstrIndicator(self.sigma_x[i, j], True,
                                                  self.ve[0, i] == self.ve[0, j], name=con_name)
             # self.model.addConstr(self.ve[0, i] == self.ve[0, self.sigma[0, i]], name=con_name)
 
             con_name = "Constraint 9 " + str(i)
-            for j in range(self.l_num):
+            for j in self.successors[i]:
                 con_name = con_name + " " + str(j)
                 if i < self.w_num:
                     self.model.addGenConstrIndicator(self.sigma_x[i, j], True,
-                                                     self.load[0, j] == self.load[0, i] - self.d[0, i], name=con_name)
+                                                     self.load[0, j] == self.load[0, i] - float(d[i]), name=con_name)
             # self.model.addConstr(self.load[0, self.sigma[0, i]] == self.load[0, i] - self.d[0, i], name=con_name)
                 else:
                     self.model.addGenConstrIndicator(self.sigma_x[i, j], True,
-                                                     self.load[0, j] == self.load[0, i] + self.d[0, i], name=con_name)
+                                                     self.load[0, j] == self.load[0, i] + float(d[i]), name=con_name)
             #     self.model.addConstr(self.load[0, self.sigma[0, i]] == self.load[0, i] + self.d[0, i], name=con_name)
 
             con_name = "Constraint 10 " + str(i)
-            for j in range(self.l_num):
+            for j in self.successors[i]:
                 con_name = con_name + " " + str(j)
                 self.model.addGenConstrIndicator(self.sigma_x[i, j], True,
-                                                 self.edt[0, j] >= self.s[0, j] + self.t[i, j] + self.edt[0, i],
+                                                 self.edt[0, j] >= float(s[j] + t[i, j]) + self.edt[0, i],
                                                  name=con_name)
             # self.model.addConstr(self.edt[0, self.sigma[0, i]] >= self.s[0, self.sigma[0, i]] +
             #                      self.t[i, self.sigma[0, i]] + self.edt[0, i], name=con_name)
@@ -161,6 +277,7 @@ class PDRPPCCDT:
         """
         Constraint (11) - (12)
         """
+        self.recorder.mark(self.model, "Constraint (11) - (12)")
         for i in range(self.w_num):
             con_name = "Constraint 11 " + str(i)
             self.model.addConstr(self.ve[0, i] == self.ve[0, i + self.w_num], name=con_name)
@@ -170,6 +287,7 @@ class PDRPPCCDT:
         """
         Constraint (13)
         """
+        self.recorder.mark(self.model, "Constraint (13)")
         for i in range(self.w_num - 1):
             con_name = "Constraint 13 " + str(i)
             self.model.addConstr(self.edt[0, i] <= self.edt[0, i + 1], name=con_name)
@@ -177,179 +295,136 @@ class PDRPPCCDT:
         self.sub_tour_elim()
 
     def sub_tour_elim(self):
-        set_all = self.__private__subset()
-        for s in set_all:
-            expr = LinExpr()
-            for i in s:
-                for j in s:
-                    expr += self.sigma_x[i, j]
-            self.model.addConstr(expr <= len(s) - 1)
-
-
-    def __private__subset(self):
-        set_all = []
-        for i in range(2 ** self.l_num):
-            combo = []
-            for j in range(self.l_num):
-                if (i >> j) % 2 == 1:
-                    combo.append(j)
-            if len(combo) > 1:
-                set_all.append(combo)
-        return set_all
+        """
+        Subtour elimination constraints are lazy: instead of one constraint for every subset of the l_num
+        nodes, the callback checks each new incumbent for cycles and cuts off only those.
+        """
+        self.model.Params.LazyConstraints = 1
+
+    def __private__sub_tour_callback(self, model, where):
+        if where != GRB.Callback.MIPSOL:
+            return
+        value = model.cbGetSolution(self.sigma_x)
+        successor = {}
+        for (i, j), x in value.items():
+            if x > 0.5:
+                successor[i] = j
+        for cycle in find_cycles(successor):
+            model.cbLazy(self.cycle_expr(cycle) <= len(cycle) - 1)
+
+    def set_start(self):
+        """
+        MIP start from self.start. Arcs of the start without a variable are left out.
+        """
+        sigma_x = np.asarray(self.start.sigma_x)
+        self.model.setAttr('Start', list(self.sigma_x.values()), [float(sigma_x[i, j]) for i, j in self.arcs])
+        set_values(self.model, self.ve, 'Start', self.start.ve)
+        set_values(self.model, self.load, 'Start', self.start.load)
+        set_values(self.model, self.edt, 'Start', self.start.edt)
+
+    def cycle_expr(self, cycle):
+        return quicksum(self.sigma_x[i, j] for i in cycle for j in cycle if (i, j) in self.sigma_x)
 
     def optimize(self):
-        self.model.optimize()
+        if self.solver.lazy:
+            self.solver.optimize(self.model, self.recorder.callback(self.__private__sub_tour_callback))
+            self.recorder.solved(self.model)
+        else:
+            self.optimize_cuts()
+        self.solution = self.get_solution()
+
+    def optimize_cuts(self):
+        """
+        Subtour elimination for solvers without callbacks: solve, add the constraints of the cycles found in the
+        solution and solve again until there are none.
+        """
+        while True:
+            self.solver.optimize(self.model, self.recorder.callback())
+            self.recorder.solved(self.model)
+            sigma_x = self.get_arc_values(self.sigma_x)
+            successor = {int(i): int(j) for i, j in np.argwhere(sigma_x > 0.5)}
+            cycles = find_cycles(successor)
+            if not cycles:
+                return
+            for cycle in cycles:
+                self.model.addConstr(self.cycle_expr(cycle) <= len(cycle) - 1)
+
+    def get_arc_values(self, var):
+        """
+        Values of a variable block over the arcs as an l_num x l_num array, 0 off the arcs.
+        """
+        value = np.zeros((self.l_num, self.l_num))
+        if len(self.arcs) > 0:
+            rows, cols = np.array(self.arcs, dtype=np.int64).T
+            value[rows, cols] = get_values(self.model, var, len(self.arcs))
+        return value
+
+    def get_solution(self):
+        solution = Solution(get_obj_val(self.model))
+        solution.sigma_x = self.get_arc_values(self.sigma_x)
+        solution.edt = get_values(self.model, self.edt, self.l_num)
+        solution.ve = get_values(self.model, self.ve, self.l_num)
+        solution.load = get_values(self.model, self.load, self.l_num)
+        solution.t = self.travel_time
+        solution.s = self.service_time
+        return solution
 
     def display_edt(self):
-        edt = []
-        for i in range(self.l_num):
-            var_name = "edt[0," + str(i) + "]"
-            var = self.model.getVarByName(var_name)
-            edt.append(var.x)
+        edt = self.solution.edt.tolist()
         print("edt:")
         print(edt)
 
     def display_t(self):
-        t_value = []
         print("t value:")
-        for i in range(self.l_num):
-            value = []
-            for j in range(self.l_num):
-                var_name = "t[" + str(i) + "," + str(j) + "]"
-                var = self.model.getVarByName(var_name)
-                value.append(var.x)
+        for value in self.solution.t.tolist():
             print(value)
-            t_value.append(value)
 
     def display_s(self):
-        s_value = []
+        s_value = self.solution.s.tolist()
         print("s value:")
-        for i in range(self.l_num):
-            var_name = "s[0," + str(i) + "]"
-            var = self.model.getVarByName(var_name)
-            s_value.append(var.x)
         print(s_value)
 
     def display_load(self):
-        load_value = []
+        load_value = self.solution.load.tolist()
         print("load value:")
-        for i in range(self.l_num):
-            var_name = "load[0," + str(i) + "]"
-            var = self.model.getVarByName(var_name)
-            load_value.append(var.x)
         print(load_value)
 
     def display_sigma(self):
-        sigma_value = []
+        # successor of every node, -1 for the H- nodes
+        sigma_value = np.where(self.solution.sigma_x.max(axis=1) > 0.5, self.solution.sigma_x.argmax(axis=1), -1)
         print("sigma value:")
-        for i in range(self.l_num):
-            var_name = "sigma[0," + str(i) + "]"
-            var = self.model.getVarByName(var_name)
-            sigma_value.append(var.x)
-        print(sigma_value)
+        print(sigma_value.tolist())
 
     def display_sigma_x(self):
-        sigma_x_value = []
         print("sigma x value:")
-        for i in range(self.l_num):
-            value = []
-            for j in range(self.l_num):
-                var_name = "sigma_x[" + str(i) + "," + str(j) + "]"
-                var = self.model.getVarByName(var_name)
-                value.append(var.x)
+        for value in self.solution.sigma_x.tolist():
             print(value)
-            sigma_x_value.append(value)
 
     def display_vehicle(self):
-        ve_value = []
+        ve_value = self.solution.ve.tolist()
         print("vehicle value:")
-        for i in range(self.l_num):
-            var_name = "ve[0," + str(i) + "]"
-            var = self.model.getVarByName(var_name)
-            ve_value.append(var.x)
         print(ve_value)
 
-    def set_t_variable_value(self):
+    def get_edt_lb(self):
         """
-        Constraint for t
+        Every W node is reached from one of its predecessors, so edt is at least its service time plus the
+        shortest arc into it.
         """
-        # W- - W-
-        for i in range(self.w_num):
-            i_index = self.order[i]
-            for j in range(self.w_num):
-                j_index = self.order[j]
-                self.model.addConstr(self.t[i, j] == self.tn.travel_time[i_index][j_index])
-
-        # W+ - W+
-        for i in range(self.w_num):
-            i_index = self.order[i] + self.tn.w_num
-            for j in range(self.w_num):
-                j_index = self.order[j] + self.tn.w_num
-                self.model.addConstr(self.t[i + self.w_num, j + self.w_num] == self.tn.travel_time[i_index][j_index])
-
-        # H+ - H+ and H- - H-
-        for i in range(self.h_num * 2):
-            i_index = self.tn.w_num * 2 + i
-            for j in range(self.h_num * 2):
-                j_index = self.tn.w_num * 2 + j
-                self.model.addConstr(self.t[i + self.w_num * 2, j + self.w_num * 2] ==
-                                     self.tn.travel_time[i_index][j_index])
-
-        # W- - W+
-        for i in range(self.w_num):
-            i_index = self.order[i]
-            for j in range(self.w_num):
-                j_index = self.order[j] + self.tn.w_num
-                self.model.addConstr(self.t[i, j + self.w_num] == self.tn.travel_time[i_index][j_index])
-                self.model.addConstr(self.t[j + self.w_num, i] == self.tn.travel_time[j_index][i_index])
-
-        for i in range(self.w_num):
-            i_index = self.order[i]
-            # W- - H+
-            for j in range(self.h_num):
-                j_index = self.tn.w_num * 2 + j
-                self.model.addConstr(self.t[i, j + self.w_num * 2] == self.tn.travel_time[i_index][j_index])
-                self.model.addConstr(self.t[j + self.w_num * 2, i] == self.tn.travel_time[j_index][i_index])
-            # W- - H-
-            for j in range(self.h_num):
-                j_index = self.tn.w_num * 2 + self.h_num + j
-                self.model.addConstr(self.t[i, j + self.w_num * 2 + self.h_num] ==
-                                     self.tn.travel_time[i_index][j_index])
-                self.model.addConstr(self.t[j + self.w_num * 2 + self.h_num, i] ==
-                                     self.tn.travel_time[j_index][i_index])
-
-        # W+ - H+ and W+ - H-
-        for i in range(self.w_num):
-            i_index = self.tn.w_num + self.order[i]
-            for j in range(2 * self.h_num):
-                j_index = self.tn.w_num * 2 + j
-                self.model.addConstr(self.t[self.w_num + i, self.w_num * 2 + j] ==
-                                     self.tn.travel_time[i_index][j_index])
-                self.model.addConstr(self.t[self.w_num * 2 + j, self.w_num + i] ==
-                                     self.tn.travel_time[j_index][i_index])
-
-    def set_s_d_variable_value(self):
-        for i in range(self.l_num):
-            if i < self.w_num:
-                i_index_power = self.order[i]
-                if i_index_power < self.pn.bus_num:
-                    service_time = self.tn.bus_cost[i_index_power][2]
-                    demand = self.tn.bus_cost[i_index_power][1]
-                elif i_index_power < self.pn.bus_num + self.pn.gen_num:
-                    service_time = self.tn.gen_cost[i_index_power - self.pn.bus_num][2]
-                    demand = self.tn.gen_cost[i_index_power - self.pn.bus_num][1]
-                else:
-                    service_time = self.tn.load_cost[i_index_power - self.pn.bus_num - self.pn.gen_num][2]
-                    demand = self.tn.load_cost[i_index_power - self.pn.bus_num - self.pn.gen_num][1]
-            elif i < 2 * self.w_num:
-                # assume the pickup time is 50
-                service_time = 50
-                demand = 150
-            else:
-                service_time = 0
-                demand = 0
-            self.model.addConstr(self.s[0, i] == service_time)
-            self.model.addConstr(self.d[0, i] == demand)
+        arrival = np.full(self.l_num, np.inf)
+        for i, j in self.arcs:
+            arrival[j] = min(arrival[j], self.travel_time[i, j])
+        lb = np.zeros(self.l_num)
+        w_node = slice(0, 2 * self.w_num)
+        lb[w_node] = np.where(np.isfinite(arrival[w_node]), arrival[w_node], 0) + self.service_time[w_node]
+        return lb.tolist()
+
+    def get_edt_ub(self):
+        # no node waits longer than every service and one longest trip per node, a finite bound on edt lets
+        # solvers without indicator constraints linearize them. edt is integer, so every arc rounds up to a
+        # whole minute and fractional times count as their ceiling
+        horizon = (self.l_num * math.ceil(float(np.max(self.travel_time)))
+                   + float(np.ceil(self.service_time).sum()))
+        return [horizon] * self.l_num
 
 
 if __name__ == "__main__":
@@ -362,7 +437,7 @@ if __name__ == "__main__":
 
     minimum_repair_set = stage1.repair
     # minimum_repair_set = [1, 14, 15]
-    stage2 = ROP(pn, minimum_repair_set, d_node)
+    stage2 = ROP(pn, minimum_repair_set, d_node, max_flow=stage1.max_flow)
 
     stage1.display_repair()
     stage2.display_o()
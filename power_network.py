@@ -4,13 +4,115 @@
 @file: data_access.py
 @time: 2019/3/3 19:03
 """
-import xlrd
+import hashlib
+import os
 import numpy as np
+from data_cache import load_cache, save_cache, read_sheet, rows_to_array
+
+# workbook name -> attribute of PN
+PN_SOURCES = [('bus', 'bus'), ('branch', 'branch'), ('gen', 'gen'), ('load', 'load'), ('gencost', 'gen_cost')]
+PN_CACHE = 'pn_cache.npz'
+
+
+def pn_source_paths(data_dir='data'):
+    return [os.path.join(data_dir, name + '.xlsx') for name, attr in PN_SOURCES]
+
+
+def compile_pn(data_dir='data'):
+    """
+    Parse the PN workbooks once and store them in data_dir/pn_cache.npz. PN loads the compiled file instead
+    of the workbooks as long as the hashes of the workbooks still match.
+    """
+    paths = pn_source_paths(data_dir)
+    arrays = {}
+    for (name, attr), path in zip(PN_SOURCES, paths):
+        arrays[attr] = rows_to_array(read_sheet(path))
+    save_cache(os.path.join(data_dir, PN_CACHE), paths, arrays)
+    return arrays
+
+
+def csr_index(keys, num):
+    """
+    Group the positions of keys by key value: the positions with key i are index[ptr[i]:ptr[i + 1]].
+    """
+    keys = np.asarray(keys, dtype=np.int64)
+    index = np.argsort(keys, kind='stable')
+    ptr = np.zeros(num + 1, dtype=np.int64)
+    ptr[1:] = np.cumsum(np.bincount(keys, minlength=num))
+    return ptr, index
+
+
+class BusIncidence:
+    """
+    The gens, loads and branch ends attached to every bus, stored CSR style.
+    """
+
+    def __init__(self, bus_num, gen_bus, load_bus, branch_from, branch_to):
+        self.gen_ptr, self.gen_index = csr_index(gen_bus, bus_num)
+        self.load_ptr, self.load_index = csr_index(load_bus, bus_num)
+        self.from_ptr, self.from_index = csr_index(branch_from, bus_num)
+        self.to_ptr, self.to_index = csr_index(branch_to, bus_num)
+
+    def gens(self, bus):
+        return self.gen_index[self.gen_ptr[bus]:self.gen_ptr[bus + 1]]
+
+    def loads(self, bus):
+        return self.load_index[self.load_ptr[bus]:self.load_ptr[bus + 1]]
+
+    def branches_from(self, bus):
+        return self.from_index[self.from_ptr[bus]:self.from_ptr[bus + 1]]
+
+    def branches_to(self, bus):
+        return self.to_index[self.to_ptr[bus]:self.to_ptr[bus + 1]]
+
+
+class DamageOverlay:
+    """
+    Damage of one scenario on top of a PN, which stays unchanged, so one loaded network serves any number of
+    scenarios, threads or forked workers. mask[i] is True for every damaged item in the bus, gen, load, branch
+    order. Status columns with the damaged rows switched off are copies made on request, the tables of the PN
+    are never written.
+    """
+
+    def __init__(self, pn, damaged_node):
+        self.pn = pn
+        self.damaged_node = sorted(set(int(i) for i in damaged_node))
+        if self.damaged_node and not 0 <= self.damaged_node[0] <= self.damaged_node[-1] < pn.item_num:
+            raise ValueError("damaged items must be in [0, " + str(pn.item_num) + ")")
+        self.mask = np.zeros(pn.item_num, dtype=bool)
+        self.mask[self.damaged_node] = True
+        self.mask.setflags(write=False)
+
+    def is_damaged(self, index):
+        return bool(self.mask[index])
+
+    def gen_status(self):
+        """
+        Column 7 of gen (MATPOWER GEN_STATUS) with the damaged generators out of service.
+        """
+        return self.__private__get_status(self.pn.gen, 7, self.pn.gen_offset, self.pn.load_offset)
+
+    def branch_status(self):
+        """
+        Column 10 of branch (MATPOWER BR_STATUS) with the damaged branches out of service.
+        """
+        return self.__private__get_status(self.pn.branch, 10, self.pn.branch_offset, self.pn.item_num)
+
+    def __private__get_status(self, table, column, start, end):
+        status = table[:, column].copy() if table.ndim == 2 and table.shape[1] > column else np.ones(end - start)
+        status[self.mask[start:end]] = 0
+        return status
 
 
 class PN:
+    """
+    Tables and index columns are read-only once set. Scenario damage is a DamageOverlay on top of the PN.
+    """
+
+    def __init__(self, data_dir='data', use_cache=True):
+        self.data_dir = data_dir
+        self.use_cache = use_cache
 
-    def __init__(self):
         self.bus = []
         self.branch = []
         self.gen = []
@@ -22,25 +124,60 @@ class PN:
         self.gen_num = 0
         self.load_num = 0
 
-        self.initialization()
+        # 0-based bus of every gen, load and branch end
+        self.gen_bus = None
+        self.load_bus = None
+        self.branch_from = None
+        self.branch_to = None
 
-    def initialization(self):
-        path = 'data/bus.xlsx'
-        self.__private__get_data_from_excel(path, self.bus)
+        # columns used by the models
+        self.gen_pmax = None
+        self.load_pd = None
+        self.branch_b = None
+        self.branch_rate = None
+
+        # items attached to every bus
+        self.incidence = None
 
-        path = 'data/branch.xlsx'
-        self.__private__get_data_from_excel(path, self.branch)
+        # item order of y and z: bus gen load branch
+        self.gen_offset = 0
+        self.load_offset = 0
+        self.branch_offset = 0
+        self.node_num = 0
+        self.item_num = 0
 
-        path = 'data/gen.xlsx'
-        self.__private__get_data_from_excel(path, self.gen)
+        self.initialization()
 
-        path = 'data/load.xlsx'
-        self.__private__get_data_from_excel(path, self.load)
+    @classmethod
+    def from_arrays(cls, bus, branch, gen, load, gen_cost):
+        """
+        Build a PN from tables that are already in memory instead of reading data_dir. The tables become
+        read-only, pass copies to keep writing them.
+        """
+        pn = cls.__new__(cls)
+        pn.data_dir = None
+        pn.use_cache = False
+        pn.set_data(bus, branch, gen, load, gen_cost)
+        return pn
 
-        path = 'data/gencost.xlsx'
-        self.__private__get_data_from_excel(path, self.gen_cost)
+    def initialization(self):
+        data = None
+        if self.use_cache:
+            data = load_cache(os.path.join(self.data_dir, PN_CACHE), pn_source_paths(self.data_dir))
+        if data is None:
+            data = compile_pn(self.data_dir)
+
+        self.set_data(data['bus'], data['branch'], data['gen'], data['load'], data['gen_cost'])
+
+    def set_data(self, bus, branch, gen, load, gen_cost):
+        self.bus = np.asarray(bus, dtype=np.float64)
+        self.branch = np.asarray(branch, dtype=np.float64)
+        self.gen = np.asarray(gen, dtype=np.float64)
+        self.load = np.asarray(load, dtype=np.float64)
+        self.gen_cost = np.asarray(gen_cost, dtype=np.float64)
 
         self.get_num()
+        self.get_index()
 
     def get_num(self):
         self.bus_num = len(self.bus)
@@ -48,12 +185,45 @@ class PN:
         self.gen_num = len(self.gen)
         self.load_num = len(self.load)
 
-    def __private__get_data_from_excel(self, path, list):
-        workbook = xlrd.open_workbook(path)
-        table = workbook.sheets()[0]
-        nrows = table.nrows
-        for i in range(nrows):
-            list.append(table.row_values(i))
+        self.gen_offset = self.bus_num
+        self.load_offset = self.bus_num + self.gen_num
+        self.branch_offset = self.bus_num + self.gen_num + self.load_num
+        self.node_num = self.branch_offset
+        self.item_num = self.node_num + self.branch_num
+
+    def get_index(self):
+        self.gen_bus = self.__private__get_column(self.gen, 0).astype(np.int64) - 1
+        self.load_bus = self.__private__get_column(self.load, 1).astype(np.int64) - 1
+        self.branch_from = self.__private__get_column(self.branch, 0).astype(np.int64) - 1
+        self.branch_to = self.__private__get_column(self.branch, 1).astype(np.int64) - 1
+
+        self.gen_pmax = self.__private__get_column(self.gen, 8)
+        self.load_pd = self.__private__get_column(self.load, 2)
+        self.branch_b = self.__private__get_column(self.branch, 4)
+        self.branch_rate = self.__private__get_column(self.branch, 5)
+
+        self.incidence = BusIncidence(self.bus_num, self.gen_bus, self.load_bus, self.branch_from, self.branch_to)
+
+        for array in [self.bus, self.branch, self.gen, self.load, self.gen_cost, self.gen_bus, self.load_bus,
+                      self.branch_from, self.branch_to, self.gen_pmax, self.load_pd, self.branch_b, self.branch_rate]:
+            array.setflags(write=False)
+
+    def get_hash(self):
+        """
+        Hash of the columns the models read, identifies the network in caches.
+        """
+        sha1 = hashlib.sha1()
+        sha1.update(str(self.bus_num).encode())
+        for column in [self.gen_bus, self.load_bus, self.branch_from, self.branch_to,
+                       self.gen_pmax, self.load_pd, self.branch_b, self.branch_rate]:
+            sha1.update(str(column.dtype).encode() + str(len(column)).encode())
+            sha1.update(np.ascontiguousarray(column).tobytes())
+        return sha1.hexdigest()
+
+    def __private__get_column(self, table, index):
+        if len(table) == 0:
+            return np.zeros(0)
+        return table[:, index]
 
 
 if __name__ == "__main__":
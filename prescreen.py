@@ -0,0 +1,97 @@
+# encoding: utf-8
+"""
+@file: prescreen.py
+@time: 2026/10/18 21:40
+"""
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+
+
+class Prescreen:
+    """
+    Topology screening of the damaged items before MRSP and ROP are built. Power only flows inside a connected
+    component of the buses, so sum over components of min(generation, demand) bounds the served load.
+    irrelevant: damaged items that can never carry load even with every damaged item repaired, i.e. items in a
+    component without generation or without demand, loads with Pd = 0, generators with Pmax = 0 and branches with
+    rating 0. Switching them on never helps, so MRSP and ROP keep them off.
+    forced: damaged items without which the bound drops below max_flow, so every repair set contains them. Only
+    computed when max_flow is given.
+    """
+
+    def __init__(self, pn, damaged_node, max_flow=None):
+        self.pn = pn
+        self.damaged_node = damaged_node
+        self.max_flow = max_flow
+
+        self.irrelevant = []
+        self.forced = []
+        self.bound = 0
+
+        self.initialization()
+
+    def initialization(self):
+        pn = self.pn
+        available = np.ones(pn.item_num, dtype=bool)
+        self.bound, label, cap, demand = self.get_bound(available)
+        live = np.minimum(cap, demand) > 0
+
+        relevant = np.zeros(pn.item_num, dtype=bool)
+        relevant[:pn.bus_num] = live[label]
+        relevant[pn.gen_offset:pn.load_offset] = live[label[pn.gen_bus]] & (pn.gen_pmax > 0)
+        relevant[pn.load_offset:pn.branch_offset] = live[label[pn.load_bus]] & (pn.load_pd > 0)
+        relevant[pn.branch_offset:] = live[label[pn.branch_from]] & (pn.branch_rate > 0)
+
+        damaged = sorted(set(int(i) for i in self.damaged_node))
+        self.irrelevant = [i for i in damaged if not relevant[i]]
+        if self.max_flow is None:
+            return
+        for i in damaged:
+            if not relevant[i]:
+                continue
+            available[i] = False
+            if self.get_bound(available)[0] < self.max_flow - 1e-6:
+                self.forced.append(i)
+            available[i] = True
+
+    def get_bound(self, available):
+        """
+        Upper bound on the served load with the given items available, and the component label, generation
+        and demand of every component.
+        """
+        pn = self.pn
+        bus = available[:pn.bus_num]
+        branch = (available[pn.branch_offset:] & bus[pn.branch_from] & bus[pn.branch_to] & (pn.branch_rate > 0))
+        graph = sp.csr_matrix((np.ones(int(branch.sum())), (pn.branch_from[branch], pn.branch_to[branch])),
+                              shape=(pn.bus_num, pn.bus_num))
+        n, label = connected_components(graph, directed=False)
+
+        gen = available[pn.gen_offset:pn.load_offset] & bus[pn.gen_bus]
+        load = available[pn.load_offset:pn.branch_offset] & bus[pn.load_bus]
+        cap = np.bincount(label[pn.gen_bus[gen]], pn.gen_pmax[gen], minlength=n)
+        demand = np.bincount(label[pn.load_bus[load]], pn.load_pd[load], minlength=n)
+        return np.minimum(cap, demand).sum(), label, cap, demand
+
+    def reduce(self, items):
+        """
+        items without the irrelevant ones, in the same order.
+        """
+        irrelevant = set(self.irrelevant)
+        return [i for i in items if i not in irrelevant]
+
+    def y_bounds(self, item_num):
+        """
+        Bounds of y: 0 or 1 for damaged items, 1 for undamaged and forced items, upper bound 0 for irrelevant ones.
+        """
+        lb = np.ones(item_num)
+        lb[list(self.damaged_node)] = 0
+        lb[self.forced] = 1
+        ub = np.ones(item_num)
+        ub[self.irrelevant] = 0
+        return lb, ub
+
+    def display(self):
+        print("irrelevant:")
+        print(self.irrelevant)
+        print("forced:")
+        print(self.forced)
@@ -0,0 +1,121 @@
+# encoding: utf-8
+"""
+@file: rolling_rop.py
+@time: 2026/10/18 20:30
+"""
+import sys
+import time
+import numpy as np
+from power_network import PN
+from mrsp import MRSP
+from rop import ROP, heuristic_order
+from max_flow_calculation import get_max_flow
+from solution import Solution
+from solver import get_runtime
+
+
+class RollingROP:
+    """
+    ROP by rolling horizon: each window is an ROP over the next window periods of the remaining repairs, built
+    from the same constraint families. The repairs of the first window - overlap periods are fixed, they are
+    passed as repaired to the next window, and the window slides forward. The last window covers every
+    remaining repair and keeps the final flow constraint. order and display_o match ROP.
+    """
+
+    def __init__(self, pn, repair, damaged_node, window=5, overlap=1, fast=False, max_flow=None, env=None,
+                 solver=None, formulation='indicator', recorder=None):
+        if window < 1 or not 0 <= overlap < window:
+            raise ValueError("window must be positive and overlap in [0, window)")
+        self.pn = pn
+        self.damaged_node = damaged_node
+        self.repair = repair
+        self.window = window
+        self.overlap = overlap
+        self.fast = fast
+        # load served once every repair is done, computed by MaxFlow when not given
+        self.max_flow = max_flow
+        self.env = env
+        self.solver = solver
+        self.formulation = formulation
+        # recorder: every window is an ROP stage of it, see instrumentation.py
+        self.recorder = recorder
+        self.order = []
+        self.solution = None
+        self.windows = []
+        self.run_time = 0
+
+        self.item_num = self.pn.item_num
+        self.r_num = len(self.repair)
+
+        self.initialization()
+
+    def initialization(self):
+        start = time.perf_counter()
+        if self.max_flow is None:
+            self.max_flow = get_max_flow(self.pn, self.damaged_node, fast=self.fast, env=self.env,
+                                         solver=self.solver, formulation=self.formulation,
+                                         recorder=self.recorder)
+        self.optimize()
+        self.run_time = time.perf_counter() - start
+
+    def optimize(self):
+        remaining = list(self.repair)
+        start_order = None
+        flow = []
+        while remaining:
+            rop = ROP(self.pn, remaining, self.damaged_node, fast=self.fast, max_flow=self.max_flow, env=self.env,
+                      start_order=start_order, horizon=self.window, repaired=self.order, solver=self.solver,
+                      formulation=self.formulation, recorder=self.recorder)
+            self.windows.append(get_runtime(rop.model))
+
+            # period in which each remaining item is repaired, r_num for items left to later windows
+            period = rop.r_num - rop.solution.o[remaining].sum(axis=1).round().astype(np.int64)
+            window_order = [x for (k, x) in sorted(zip(period.tolist(), remaining)) if k < rop.r_num]
+            step = rop.r_num if rop.complete else rop.r_num - self.overlap
+            self.order.extend(window_order[:step])
+            flow.extend(rop.solution.flow[:step].tolist())
+
+            done = set(window_order[:step])
+            remaining = [i for i in remaining if i not in done]
+            carried = window_order[step:]
+            start_order = carried + [i for i in heuristic_order(self.pn, remaining) if i not in carried]
+        self.solution = self.get_solution(np.array(flow))
+
+    def get_solution(self, flow):
+        solution = Solution(self.r_num * self.max_flow - flow.sum())
+        solution.flow = flow
+        solution.o = np.ones((self.item_num, self.r_num))
+        solution.o[list(self.damaged_node)] = 0
+        for k, index in enumerate(self.order):
+            solution.o[index, k:] = 1
+        return solution
+
+    def loss(self, rop):
+        """
+        Relative objective loss against a solved monolithic ROP.
+        """
+        if abs(rop.solution.obj_val) < 1e-6:
+            return 0.0 if abs(self.solution.obj_val) < 1e-6 else float('inf')
+        return (self.solution.obj_val - rop.solution.obj_val) / rop.solution.obj_val
+
+    def display_o(self):
+        o_value = [self.solution.o[i].tolist() for i in self.repair]
+        print("o value:")
+        print(o_value)
+        print("order:")
+        print(self.order)
+
+
+if __name__ == "__main__":
+    pn = PN()
+    d_node = [int(x) for x in sys.argv[1:]] or [1, 2, 3, 4, 13, 14, 15]
+    stage1 = MRSP(pn, d_node)
+    rolling = RollingROP(pn, stage1.repair, d_node, max_flow=stage1.max_flow)
+    rolling.display_o()
+
+    start = time.perf_counter()
+    stage2 = ROP(pn, stage1.repair, d_node, max_flow=stage1.max_flow, start=stage1.solution)
+    print("rolling: %.3f s, monolithic: %.3f s, loss: %.2f%%" % (rolling.run_time, time.perf_counter() - start,
+                                                                  100 * rolling.loss(stage2)))
+else:
+    print("rolling_rop is implemented into another module.")
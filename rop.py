@@ -6,18 +6,58 @@
 @time: 2019/3/17 17:03
 """
 
-from power_network import PN
+from power_network import PN, DamageOverlay
 from mrsp import MRSP
+from max_flow_calculation import get_max_flow
+import math
+import numpy as np
 from gurobipy import *
+from matrix_model import add_flow_variables, add_flow_constraints, fix_undamaged, energized, add_and, add_off, \
+    add_dc, dc_big_m
+from solution import Solution, get_values, set_values
+from prescreen import Prescreen
+from solver import get_solver, get_obj_val
+from instrumentation import get_recorder
+
+
+def heuristic_order(pn, repair):
+    """
+    A feasible repair order without solving anything: buses first, then generators, branches and loads, so that
+    every item is repaired after the buses it is attached to.
+    """
+    rank = [0 if i < pn.gen_offset else 1 if i < pn.load_offset else 3 if i < pn.branch_offset else 2
+            for i in repair]
+    return [x for (r, x) in sorted(zip(rank, repair))]
 
 
 class ROP:
 
-    def __init__(self, pn, repair, damaged_node):
+    def __init__(self, pn, repair, damaged_node, fast=False, names=False, max_flow=None, env=None, start=None,
+                 start_order=None, horizon=None, repaired=None, screen=False, solver=None, formulation='indicator',
+                 recorder=None):
         self.pn = pn
         self.damaged_node = damaged_node
+        # damage: DamageOverlay of damaged_node, set by set_damaged_node, the PN itself is never written
+        self.damage = None
         self.repair = repair
+        # screen: leave the items Prescreen proves irrelevant out of the repair set
+        self.screen = None
+        if screen:
+            self.screen = Prescreen(self.pn, self.damaged_node)
+            self.repair = self.screen.reduce(self.repair)
+        # fast: build the model from MVars and sparse matrices, names: keep variable and constraint names there
+        self.fast = fast
+        self.names = names
+        # formulation: 'indicator' or 'bigm', how the AND and indicator constraints are written, see matrix_model.py
+        self.formulation = formulation
+        # load served once every repair is done, computed by MaxFlow when not given
+        self.max_flow = max_flow
         self.order = []
+        self.solution = None
+        # warm start: start is the MRSP solution for the last period, start_order seeds o, y and z of every
+        # period and defaults to heuristic_order
+        self.start = start
+        self.start_order = start_order
 
         self.flow = []
         self.o = []
@@ -28,19 +68,103 @@ class ROP:
         self.pv_load = []
         self.theta = []
 
-        self.model = Model("ROP")
-        self.node_num = self.pn.bus_num + self.pn.gen_num + self.pn.load_num
-        self.item_num = self.node_num + self.pn.branch_num
-        self.r_num = len(self.repair)
+        # env carries solver parameters such as Threads
+        self.env = env
+        self.model = Model("ROP", env=env)
+        # solver: 'gurobi' or 'highs', see solver.py
+        self.solver = get_solver(solver)
+        # recorder: build and solve telemetry, see instrumentation.py
+        self.recorder = get_recorder(recorder)
+        self.node_num = self.pn.node_num
+        self.item_num = self.pn.item_num
+        # horizon: number of periods to model, all repairs by default. A shorter horizon drops the requirement
+        # that max_flow is served in the last period, which is how RollingROP solves one window
+        self.r_num = len(self.repair) if horizon is None else min(horizon, len(self.repair))
+        self.complete = self.r_num == len(self.repair)
+        # damaged items repaired before the first period, as in a later window of RollingROP. They keep y <= o
+        # like every damaged item, with o = 1 in every period
+        self.repaired = [] if repaired is None else list(repaired)
 
         self.initialization()
 
     def initialization(self):
-        self.set_damaged_node()
-        self.set_variables()
-        self.set_obj()
-        self.set_constraints()
-        self.optimize()
+        with self.recorder.stage("ROP", self.model):
+            if self.max_flow is None:
+                self.max_flow = get_max_flow(self.pn, self.damaged_node, fast=self.fast, env=self.env,
+                                             solver=self.solver, formulation=self.formulation,
+                                             recorder=self.recorder)
+            self.set_damaged_node()
+            if self.fast:
+                self.build_matrix_model()
+            else:
+                self.recorder.mark(self.model, "variables")
+                self.set_variables()
+                self.recorder.mark(self.model, "objective")
+                self.set_obj()
+                self.set_constraints()
+            if self.start is not None or self.start_order is not None:
+                self.recorder.mark(self.model, "start")
+                self.set_start()
+            self.optimize()
+
+    def build_matrix_model(self):
+        """
+        The model of set_variables, set_obj and set_constraints with every constraint family vectorized over
+        the periods k.
+        """
+        self.recorder.mark(self.model, "variables")
+        self.flow = self.model.addMVar(self.r_num, vtype=GRB.CONTINUOUS, name="flow" if self.names else "")
+        self.o = self.model.addMVar((self.item_num, self.r_num), vtype=GRB.BINARY, name="o" if self.names else "")
+        self.y, self.z, self.pl, self.pv_gen, self.pv_load, self.theta = add_flow_variables(self.model, self.pn,
+                                                                                            self.names, self.r_num)
+
+        self.recorder.mark(self.model, "objective")
+        self.model.setObjective(self.r_num * self.max_flow - self.flow.sum(), GRB.MINIMIZE)
+        if self.complete:
+            self.model.addConstr(self.flow[self.r_num - 1] == self.max_flow)
+
+        repair = np.array(self.repair, dtype=np.int64)
+        damaged = np.array(self.damaged_node, dtype=np.int64)
+        """
+        Constraint (2) in Model 3
+        """
+        self.recorder.mark(self.model, "Constraint (2) in Model 3")
+        self.model.addConstr(self.pv_load.sum(axis=0) == self.flow, name="Constraint 2" if self.names else "")
+
+        """
+        Constraint (3) and (4) in Model 3
+        """
+        self.recorder.mark(self.model, "Constraint (3) and (4) in Model 3")
+        self.model.addConstr(self.o[repair, :].sum(axis=0) == np.arange(1, self.r_num + 1),
+                             name="Constraint 3" if self.names else "")
+        if self.r_num > 1:
+            self.model.addConstr(self.o[repair, :-1] <= self.o[repair, 1:], name="Constraint 4" if self.names else "")
+
+        """
+        Constraint (5) in Model 3
+        """
+        self.recorder.mark(self.model, "Constraint (5) in Model 3")
+        if len(damaged) > 0:
+            self.model.addConstr(self.y[damaged, :] <= self.o[damaged, :], name="Constraint 5" if self.names else "")
+
+        """
+        Constraint (6) and (7) in Model 3 as bounds
+        """
+        self.recorder.mark(self.model, "Constraint (6) and (7) in Model 3 as bounds")
+        fix_undamaged(self.y, self.pn, self.damaged_node)
+        ub = np.ones((self.item_num, self.r_num))
+        ub[np.setdiff1d(damaged, np.concatenate([repair, np.array(self.repaired, dtype=np.int64)]))] = 0
+        self.y.ub = ub
+        if len(self.repaired) > 0:
+            lb = np.zeros((self.item_num, self.r_num))
+            lb[self.repaired] = 1
+            self.o.lb = lb
+
+        """
+        Constraint (8) - (14) in Model 3
+        """
+        add_flow_constraints(self.model, self.pn, self.y, self.z, self.pl, self.pv_gen, self.pv_load, self.theta,
+                             self.names, self.formulation, self.recorder)
 
     def set_variables(self):
         self.flow = self.model.addVars(1, self.r_num, vtype=GRB.CONTINUOUS, name="flow")
@@ -48,64 +172,55 @@ class ROP:
         self.y = self.model.addVars(self.item_num, self.r_num, vtype=GRB.BINARY, name="y")
         self.z = self.model.addVars(self.item_num, self.r_num, vtype=GRB.BINARY, name="z")
 
-        # self.pl = self.model.addVars(self.pn.branch_num, self.r_num, vtype=GRB.CONTINUOUS, name="pl")
-        for i in range(self.pn.branch_num):
-            var_name = "pl[" + str(i) + "]"
-            x = self.model.addVars(1, self.r_num, lb=0, ub=self.pn.branch[i][5], vtype=GRB.CONTINUOUS, name=var_name)
-            self.pl.append(x)
-
-        for i in range(len(self.pn.gen)):
-            var_name = "pv_gen[" + str(i) + "]"
-            # x = self.model.addVars(1, self.r_num, lb=self.pn.gen[i][9], ub=self.pn.gen[i][8],
-            #                        vtype=GRB.CONTINUOUS, name=var_name)
-            x = self.model.addVars(1, self.r_num, lb=0, ub=self.pn.gen[i][8],
-                                   vtype=GRB.CONTINUOUS, name=var_name)
-            self.pv_gen.append(x)
-        for i in range(len(self.pn.load)):
-            var_name = "pv_load[" + str(i) + "]"
-            x = self.model.addVars(1, self.r_num, lb=0, ub=self.pn.load[i][2],
-                                   vtype=GRB.CONTINUOUS, name=var_name)
-            self.pv_load.append(x)
+        self.pl = self.model.addVars(self.pn.branch_num, self.r_num, lb=0,
+                                     ub=np.repeat(self.pn.branch_rate, self.r_num).tolist(),
+                                     vtype=GRB.CONTINUOUS, name="pl")
+        # lb=self.pn.gen[i][9]
+        self.pv_gen = self.model.addVars(self.pn.gen_num, self.r_num, lb=0,
+                                         ub=np.repeat(self.pn.gen_pmax, self.r_num).tolist(),
+                                         vtype=GRB.CONTINUOUS, name="pv_gen")
+        self.pv_load = self.model.addVars(self.pn.load_num, self.r_num, lb=0,
+                                          ub=np.repeat(self.pn.load_pd, self.r_num).tolist(),
+                                          vtype=GRB.CONTINUOUS, name="pv_load")
 
         self.theta = self.model.addVars(self.pn.bus_num, self.r_num, lb=-2 * math.pi, ub=2 * math.pi,
                                         vtype=GRB.CONTINUOUS, name="theta")
 
     def set_obj(self):
-        max_flow = 1965.527380937
         obj = LinExpr()
-        # obj += max_flow - self.flow[0, self.r_num - 1]
+        # obj += self.max_flow - self.flow[0, self.r_num - 1]
         for i in range(self.r_num):
-            obj += (max_flow - self.flow[0, i])
+            obj += (self.max_flow - self.flow[0, i])
         self.model.setObjective(obj, GRB.MINIMIZE)
 
     def set_constraints(self):
-        self.model.addConstr(self.flow[0, self.r_num - 1] == 1965.527380937)
+        if self.complete:
+            self.model.addConstr(self.flow[0, self.r_num - 1] == self.max_flow)
         """
         Constraint (2) in Model 3
         """
+        self.recorder.mark(self.model, "Constraint (2) in Model 3")
         for k in range(self.r_num):
-            constr2 = LinExpr()
             con_name = "Constraint 2 " + str(k)
-            for i in range(self.pn.load_num):
-                constr2 += self.pv_load[i][0, k]
+            constr2 = self.pv_load.sum('*', k)
             self.model.addConstr(constr2 == self.flow[0, k], name=con_name)
 
         """
         Constraint (3) in Model 3
         """
+        self.recorder.mark(self.model, "Constraint (3) in Model 3")
         for k in range(self.r_num):
             constr3 = LinExpr()
             con_name = "Constraint 3 " + str(k)
             for r in self.repair:
                 constr3 += self.o[r, k]
-            print("k")
-            print(k)
             self.model.addConstr(constr3 == k + 1, name=con_name)
 
         """
         Constraint (4) in Model 3
         """
-        for r in range(self.r_num):
+        self.recorder.mark(self.model, "Constraint (4) in Model 3")
+        for r in range(len(self.repair)):
             index = self.repair[r]
             for k in range(self.r_num - 1):
                 con_name = "Constraint 4 " + str(r) + " " + str(k)
@@ -114,6 +229,7 @@ class ROP:
         """
         Constraint (5) in Model 3
         """
+        self.recorder.mark(self.model, "Constraint (5) in Model 3")
         for index in self.damaged_node:
             for k in range(self.r_num):
                 con_name = "Constraint 5 " + str(index) + " " + str(k)
@@ -122,24 +238,33 @@ class ROP:
         """
         Constraint (6) in Model 3
         """
+        self.recorder.mark(self.model, "Constraint (6) in Model 3")
         for k in range(self.r_num):
             for i in range(self.item_num):
-                if i not in self.damaged_node:
+                if not self.damage.mask[i]:
                     con_name = "Constraint 6 " + str(i) + " " + str(k)
                     self.model.addConstr(self.y[i, k] == 1, name=con_name)
 
         """
         Constraint (7) in Model 3
         """
+        self.recorder.mark(self.model, "Constraint (7) in Model 3")
+        repair = set(self.repair) | set(self.repaired)
         for k in range(self.r_num):
             for index in self.damaged_node:
-                if index not in self.repair:
+                if index not in repair:
                     con_name = "Constraint 7 " + str(index) + " " + str(k)
                     self.model.addConstr(self.y[index, k] == 0, name=con_name)
 
+        for k in range(self.r_num):
+            for index in self.repaired:
+                con_name = "Repaired " + str(index) + " " + str(k)
+                self.model.addConstr(self.o[index, k] == 1, name=con_name)
+
         """
         Constraint (8) in Model 3
         """
+        self.recorder.mark(self.model, "Constraint (8) in Model 3")
         for k in range(self.r_num):
             for i in range(self.pn.bus_num):
                 con_name = "Constraint 8 " + str() + " " + str(k)
@@ -148,64 +273,57 @@ class ROP:
         """
         Constraint (9) in Model 3
         """
+        self.recorder.mark(self.model, "Constraint (9) in Model 3")
+        gen_bus = self.pn.gen_bus.tolist()
+        load_bus = self.pn.load_bus.tolist()
         for k in range(self.r_num):
             for i in range(self.pn.gen_num):
-                bus_num = self.pn.gen[i][0] - 1
+                index = self.pn.gen_offset + i
                 con_name = "Constraint 9 gen " + str(i) + " " + str(k)
-                self.model.addGenConstrAnd(self.z[i + self.pn.bus_num, k],
-                                           [self.y[i + self.pn.bus_num, k],
-                                            self.y[bus_num, k]], name=con_name)
+                add_and(self.model, self.z[index, k], [self.y[index, k], self.y[gen_bus[i], k]], self.formulation,
+                        name=con_name)
 
             for i in range(self.pn.load_num):
-                bus_num = self.pn.load[i][1] - 1
+                index = self.pn.load_offset + i
                 con_name = "Constraint 9 load " + str(i) + " " + str(k)
-                self.model.addGenConstrAnd(self.z[i + self.pn.bus_num + self.pn.gen_num, k],
-                                           [self.y[i + self.pn.bus_num + self.pn.gen_num, k],
-                                            self.y[bus_num, k]], name=con_name)
+                add_and(self.model, self.z[index, k], [self.y[index, k], self.y[load_bus[i], k]], self.formulation,
+                        name=con_name)
 
         """
         Constraint (10) in Model 3
         """
+        self.recorder.mark(self.model, "Constraint (10) in Model 3")
+        branch_from = self.pn.branch_from.tolist()
+        branch_to = self.pn.branch_to.tolist()
         for i in range(self.pn.branch_num):
-            bus_from = self.pn.branch[i][0]
-            bus_to = self.pn.branch[i][1]
+            index = self.pn.branch_offset + i
             for k in range(self.r_num):
                 con_name = "Constraint 10 " + str(i) + " " + str(k)
-                self.model.addGenConstrAnd(
-                    self.z[i + self.pn.bus_num + self.pn.gen_num + self.pn.load_num, k],
-                    [self.y[i + self.pn.bus_num + self.pn.gen_num + self.pn.load_num, k],
-                     self.y[bus_from, k], self.y[bus_to, k]], name=con_name)
+                add_and(self.model, self.z[index, k],
+                        [self.y[index, k], self.y[branch_from[i], k], self.y[branch_to[i], k]], self.formulation,
+                        name=con_name)
 
         """
         Constraint (11) in Model 3
         """
+        self.recorder.mark(self.model, "Constraint (11) in Model 3")
+        incidence = self.pn.incidence
         for i in range(self.pn.bus_num):
-            load_set = []
-            for j in range(len(self.pn.load)):
-                if self.pn.load[j][1] - 1 == i:
-                    load_set.append(j)
-            gen_set = []
-            for j in range(len(self.pn.gen)):
-                if self.pn.gen[j][0] - 1 == i:
-                    gen_set.append(j)
-            li_set = []
-            lo_set = []
-            for j in range(len(self.pn.branch)):
-                if self.pn.branch[j][0] == i:
-                    li_set.append(j)
-                if self.pn.branch[j][1] == i:
-                    lo_set.append(j)
+            load_set = incidence.loads(i).tolist()
+            gen_set = incidence.gens(i).tolist()
+            li_set = incidence.branches_from(i).tolist()
+            lo_set = incidence.branches_to(i).tolist()
 
             for k in range(self.r_num):
                 expr = LinExpr()
                 for index in load_set:
-                    expr -= self.pv_load[index][0, k]
+                    expr -= self.pv_load[index, k]
                 for index in gen_set:
-                    expr += self.pv_gen[index][0, k]
+                    expr += self.pv_gen[index, k]
                 for index in li_set:
-                    expr += self.pl[index][0, k]
+                    expr += self.pl[index, k]
                 for index in lo_set:
-                    expr -= self.pl[index][0, k]
+                    expr -= self.pl[index, k]
 
                 con_name = "Constraint 11 " + str(i) + " " + str(k)
                 self.model.addConstr(expr == 0, name=con_name)
@@ -213,128 +331,138 @@ class ROP:
         """
         Constraint (12) in Model 3
         """
+        self.recorder.mark(self.model, "Constraint (12) in Model 3")
 
         for k in range(self.r_num):
             for i in range(self.pn.gen_num):
                 con_name = "Constraint 12 gen " + str(i) + " " + str(k)
-                # self.model.addConstr(self.pv_gen[i][0, k] <= self.pn.gen[i][8] * self.z[i + self.pn.bus_num, k],
+                # self.model.addConstr(self.pv_gen[i, k] <= self.pn.gen[i][8] * self.z[i + self.pn.bus_num, k],
                 #                      name=con_name)
-                self.model.addGenConstrIndicator(self.z[i + self.pn.bus_num, k], False,
-                                                 self.pv_gen[i][0, k] == 0, name=con_name)
+                add_off(self.model, self.z[self.pn.gen_offset + i, k], self.pv_gen[i, k], self.pn.gen_pmax[i],
+                        self.formulation, name=con_name)
 
         for k in range(self.r_num):
             for i in range(self.pn.load_num):
                 con_name = "Constraint 12 load " + str(i) + " " + str(k)
-                # self.model.addConstr(self.pv_load[i][0, k] <= self.pn.load[i][2] *
-                #                      self.z[i + self.pn.bus_num + self.pn.load_num, k], name=con_name)
-                self.model.addGenConstrIndicator(self.z[i + self.pn.bus_num + self.pn.gen_num, k], False,
-                                                 self.pv_load[i][0, k] == 0, name=con_name)
+                add_off(self.model, self.z[self.pn.load_offset + i, k], self.pv_load[i, k], self.pn.load_pd[i],
+                        self.formulation, name=con_name)
 
         for k in range(self.r_num):
             for i in range(self.pn.branch_num):
                 con_name = "Constraint 9 " + str(i)
-                self.model.addGenConstrIndicator(self.z[i + self.pn.bus_num + self.pn.gen_num + self.pn.load_num, k],
-                                                 False, self.pl[i][0, k] == 0, name=con_name)
+                add_off(self.model, self.z[self.pn.branch_offset + i, k], self.pl[i, k], self.pn.branch_rate[i],
+                        self.formulation, name=con_name)
 
         """
         Constraint 13 and 14 in Model (3)
         """
-        for i in range(self.pn.branch_num):
-            if self.pn.branch[i][4] > 0:
-                to_bus = self.pn.branch[i][1]
-                from_bus = self.pn.branch[i][0]
-                for k in range(self.r_num):
-                    con_name = "Constraint 13 " + str(i) + " " + str(k)
-                    self.model.addGenConstrIndicator(
-                        self.z[i + self.pn.bus_num + self.pn.gen_num + self.pn.load_num, k],
-                        True, self.pl[i][0, k] ==
-                        self.pn.branch[i][4] * 100 * (self.theta[to_bus, k] - self.theta[from_bus, k]), name=con_name)
+        self.recorder.mark(self.model, "Constraint (13) and (14) in Model 3")
+        branch_b = self.pn.branch_b.tolist()
+        big_m = dc_big_m(self.pn, np.arange(self.pn.branch_num)).tolist()
+        for i in np.flatnonzero(self.pn.branch_b > 0).tolist():
+            for k in range(self.r_num):
+                con_name = "Constraint 13 " + str(i) + " " + str(k)
+                add_dc(self.model, self.z[self.pn.branch_offset + i, k], self.pl[i, k],
+                       branch_b[i] * 100 * (self.theta[branch_to[i], k] - self.theta[branch_from[i], k]), big_m[i],
+                       self.formulation, name=con_name)
 
         # self.model.addConstr(self.o[0, 0] == 1)
         # self.model.addConstr(self.y[0, 0] == 1)
         # self.model.addConstr(self.z[0, 0] == 1)
 
+    def set_start(self):
+        """
+        MIP start: the items of start_order are repaired one per period, with o, y and z following from that.
+        The flows of the last period come from the MRSP solution, the flows of earlier periods are left for
+        Gurobi to complete.
+        """
+        order = self.start_order if self.start_order is not None else heuristic_order(self.pn, self.repair)
+        o = np.ones((self.item_num, self.r_num))
+        o[list(self.damaged_node)] = 0
+        o[self.repaired] = 1
+        for k, index in enumerate(order):
+            o[index, k:] = 1
+        y = o.copy()
+        z = energized(self.pn, y)
+
+        def last_period(n, value):
+            column = np.full((n, self.r_num), GRB.UNDEFINED)
+            column[:, self.r_num - 1] = value
+            return column
+
+        set_values(self.model, self.o, 'Start', o)
+        set_values(self.model, self.y, 'Start', y)
+        set_values(self.model, self.z, 'Start', z)
+        if self.start is not None and self.complete:
+            set_values(self.model, self.pl, 'Start', last_period(self.pn.branch_num, self.start.pl))
+            set_values(self.model, self.pv_gen, 'Start', last_period(self.pn.gen_num, self.start.pv_gen))
+            set_values(self.model, self.pv_load, 'Start', last_period(self.pn.load_num, self.start.pv_load))
+            set_values(self.model, self.theta, 'Start', last_period(self.pn.bus_num, self.start.theta))
+
     def optimize(self):
-        self.model.optimize()
+        self.solver.optimize(self.model, self.recorder.callback())
+        self.recorder.solved(self.model)
         # print('Obj:', self.model.objVal)
-        flow_value = []
-        for i in range(self.r_num):
-            var_name = "flow[0," + str(i) + "]"
-            var = self.model.getVarByName(var_name)
-            flow_value.append(var.x)
-        print(flow_value)
+        self.solution = self.get_solution()
+        self.set_order()
 
     def set_damaged_node(self):
-        for node in self.damaged_node:
-            self.pn.branch[node][10] = 0
+        self.damage = DamageOverlay(self.pn, self.damaged_node)
+
+    def get_solution(self):
+        solution = Solution(get_obj_val(self.model))
+        solution.flow = get_values(self.model, self.flow, self.r_num)
+        solution.o = get_values(self.model, self.o, (self.item_num, self.r_num))
+        solution.y = get_values(self.model, self.y, (self.item_num, self.r_num))
+        solution.z = get_values(self.model, self.z, (self.item_num, self.r_num))
+        solution.pl = get_values(self.model, self.pl, (self.pn.branch_num, self.r_num))
+        solution.pv_gen = get_values(self.model, self.pv_gen, (self.pn.gen_num, self.r_num))
+        solution.pv_load = get_values(self.model, self.pv_load, (self.pn.load_num, self.r_num))
+        solution.theta = get_values(self.model, self.theta, (self.pn.bus_num, self.r_num))
+        return solution
+
+    def set_order(self):
+        # an item repaired in period r has o = 1 from r on, so r_num - sum(o) sorts the items by repair period
+        order_index = [self.r_num - self.solution.o[i].sum() for i in self.repair]
+        self.order = [x for (y, x) in sorted(zip(order_index, self.repair))]
+
+    def display_flow(self):
+        flow_value = self.solution.flow.tolist()
+        print(flow_value)
 
     def display_o(self):
-        o_value = []
-        order_index = []
-        for i in self.repair:
-            value = []
-            for j in range(self.r_num):
-                var_name = "o[" + str(i) + "," + str(j) + "]"
-                var = self.model.getVarByName(var_name)
-                value.append(var.x)
-            o_value.append(value)
-            order_index.append(self.r_num - sum(value))
-        self.order = [x for (y, x) in sorted(zip(order_index, self.repair))]
+        o_value = [self.solution.o[i].tolist() for i in self.repair]
         print("o value:")
         print(o_value)
         print("order:")
         print(self.order)
 
     def display_z(self):
-        z_value = []
-        for i in range(self.item_num):
-            var_name = "z[" + str(i) + "," + str(self.r_num - 1) + "]"
-            var = self.model.getVarByName(var_name)
-            z_value.append(var.x)
+        z_value = self.solution.z[:, self.r_num - 1].tolist()
         print("z value:")
         print(z_value)
 
     def display_y(self):
-        y_value = []
-        for i in range(self.item_num):
-            var_name = "y[" + str(i) + "," + str(self.r_num - 1) + "]"
-            var = self.model.getVarByName(var_name)
-            y_value.append(var.x)
+        y_value = self.solution.y[:, self.r_num - 1].tolist()
         print("y value:")
         print(y_value)
 
     def get_sum_y(self):
-        sum_y_value = 0
-        for i in range(self.item_num):
-            var_name = "y[" + str(i) + "," + str(self.r_num - 1) + "]"
-            var = self.model.getVarByName(var_name)
-            sum_y_value = sum_y_value + var.x
+        sum_y_value = self.solution.y[:, self.r_num - 1].sum()
         return sum_y_value
 
     def display_pv_load(self):
-        pv_load_value = []
-        for i in range(self.pn.load_num):
-            var_name = "pv_load[" + str(i) + "][0," + str(self.r_num - 1) + "]"
-            var = self.model.getVarByName(var_name)
-            pv_load_value.append(var.x)
+        pv_load_value = self.solution.pv_load[:, self.r_num - 1].tolist()
         print("stage 2 pv load:")
         print(pv_load_value)
 
     def display_pv_gen(self):
-        pv_gen_value = []
-        for i in range(self.pn.gen_num):
-            var_name = "pv_gen[" + str(i) + "][0," + str(self.r_num - 1) + "]"
-            var = self.model.getVarByName(var_name)
-            pv_gen_value.append(var.x)
+        pv_gen_value = self.solution.pv_gen[:, self.r_num - 1].tolist()
         print("stage 2 pv gen:")
         print(pv_gen_value)
 
     def display_pl(self):
-        pl_value = []
-        for i in range(self.pn.branch_num):
-            var_name = "pl[" + str(i) + "][0," + str(self.r_num - 1) + "]"
-            var = self.model.getVarByName(var_name)
-            pl_value.append(var.x)
+        pl_value = self.solution.pl[:, self.r_num - 1].tolist()
         print("stage 2 pl:")
         print(pl_value)
 
@@ -348,8 +476,9 @@ if __name__ == "__main__":
 
     minimum_repair_set = stage1.repair
     # minimum_repair_set = [1, 14, 15]
-    stage2 = ROP(pn, minimum_repair_set, d_node)
+    stage2 = ROP(pn, minimum_repair_set, d_node, max_flow=stage1.max_flow, start=stage1.solution)
     stage1.display_repair()
+    stage2.display_flow()
     stage2.display_o()
     print(stage2.order)
     # y_sum = stage2.get_sum_y()
@@ -0,0 +1,332 @@
+# encoding: utf-8
+"""
+@file: routing_heuristic.py
+@time: 2026/10/19 18:40
+"""
+import math
+import time
+import numpy as np
+from power_network import PN
+from trans_network import TN
+from mrsp import MRSP
+from rop import ROP
+from vehicle import VEHICLE
+from pdrppccdt import PDRPPCCDT, get_node_data
+from solution import Solution
+
+
+class RoutingHeuristic:
+    """
+    Stage 3 without the MILP. Cheapest insertion builds one route per base. Relocate, exchange and 2-opt moves
+    then improve the routes until no move helps, max_rounds is reached or time_limit runs out.
+
+    Routes keep the constraints of PDRPPCCDT:
+    - the part of item i is picked up at W+ i and delivered at W- i on the same route
+    - the load stays within the vehicle capacity
+    - deliveries finish in repair order (13)
+    - every base sends out a route with at least one stop, when there are at least base_num items
+    - node m < VEHICLE.num has vehicle m, so there is at most one such node per route, H+ and H- included
+
+    edt is the earliest completion time of every node, rounded up to whole minutes as edt is integer in the MILP,
+    and the objective is the sum of edt over the W- nodes. routes[k] is the node path from H+ k to H- k. solution
+    has sigma_x, edt, ve and load like PDRPPCCDT and can be passed to it as start.
+    """
+
+    def __init__(self, pn, tn, order, vehicle, time_limit=None, max_rounds=100):
+        self.pn = pn
+        self.tn = tn
+        self.order = order
+        self.vehicle = vehicle
+        # time_limit: seconds for the improvement moves, max_rounds: passes over all moves
+        self.time_limit = time_limit
+        self.max_rounds = max_rounds
+
+        self.w_num = len(self.order)
+        self.h_num = self.tn.base_num
+        self.l_num = 2 * (self.w_num + self.h_num)
+
+        self.travel_time, self.service_time, self.demand = get_node_data(self.pn, self.tn, self.order)
+        # load change at every node: a pickup at W+ adds its demand, a delivery at W- drops it
+        self.delta = np.concatenate([-self.demand[:self.w_num], self.demand[self.w_num:2 * self.w_num],
+                                     np.zeros(2 * self.h_num)])
+        # an idle base is only allowed when there are fewer items than bases, the MILP has no solution then
+        self.all_bases = self.w_num >= self.h_num
+
+        self.routes = []
+        self.solution = None
+        self.rounds = 0
+        self.run_time = 0
+        self.deadline = None
+
+        self.initialization()
+
+    def initialization(self):
+        start = time.perf_counter()
+        if self.time_limit is not None:
+            self.deadline = start + self.time_limit
+        stops = self.construct()
+        if stops is None:
+            raise ValueError("no routes within the vehicle capacity and the repair order")
+        stops = self.improve(stops)
+        self.set_solution(stops)
+        self.run_time = time.perf_counter() - start
+
+    def schedule(self, stops, complete=True):
+        """
+        edt of every node for the stops of every route, or None when the stops break a constraint. Stops hold
+        the W nodes of a route between H+ and H-. With complete=False routes may be empty and only some items
+        routed, as during construction.
+
+        Evaluation is pure Python apart from the load check: a walk over the nodes in repair order with scalar
+        ceilings. Per-route NumPy evaluation was slower at these route lengths, only breaking even around 80
+        items, since every trial move pays the overhead of a dozen small array calls per route.
+        """
+        w_num, h_num = self.w_num, self.h_num
+        t, s = self.travel_time, self.service_time
+        capacity = self.vehicle.capacity
+        position = {}
+        for k, route in enumerate(stops):
+            if not route:
+                if complete and self.all_bases:
+                    return None
+                continue
+            # load on arrival at every stop after the first and at H-, the first stop is reached empty
+            load = np.cumsum(self.delta[route])
+            if load.min() < 0 or load.max() > capacity:
+                return None
+            if len(self.vehicle_nodes(k, route)) > 1:
+                return None
+            for p, i in enumerate(route):
+                position[i] = (k, p)
+
+        deliveries = sorted(i for i in position if i < w_num)
+        for i in deliveries:
+            pickup = position.get(i + w_num)
+            if pickup is None or pickup[0] != position[i][0] or pickup[1] > position[i][1]:
+                return None
+        if len(deliveries) * 2 != len(position):
+            return None
+
+        # walk the routes in repair order: every route advances to the next delivery, which also waits for the
+        # delivery before it
+        edt = np.zeros(self.l_num)
+        step = [0] * h_num
+        last = [2 * w_num + k for k in range(h_num)]
+        previous = 0.0
+        for i in deliveries:
+            k = position[i][0]
+            route = stops[k]
+            while True:
+                j = route[step[k]]
+                arrival = math.ceil(edt[last[k]] + t[last[k], j] + s[j] - 1e-9)
+                if j < w_num:
+                    if j != i:
+                        return None
+                    arrival = max(arrival, previous)
+                    previous = arrival
+                edt[j] = arrival
+                last[k] = j
+                step[k] += 1
+                if j == i:
+                    break
+        for k in range(h_num):
+            h_minus = 2 * w_num + h_num + k
+            edt[h_minus] = math.ceil(edt[last[k]] + t[last[k], h_minus] - 1e-9)
+        return edt
+
+    def vehicle_nodes(self, k, route):
+        """
+        Nodes of the route from base k whose vehicle the MILP fixes, ve[0, m] == m for m < VEHICLE.num.
+        """
+        return [i for i in [2 * self.w_num + k] + route + [2 * self.w_num + self.h_num + k] if i < self.vehicle.num]
+
+    def evaluate(self, stops, complete=True):
+        edt = self.schedule(stops, complete)
+        return None if edt is None else float(edt[:self.w_num].sum())
+
+    def construct(self):
+        """
+        Cheapest insertion in repair order: the delivery of every item goes to the end of a route, its pickup to
+        the position of that route where the total edt grows least. Empty routes then take over the pair that
+        costs least to move.
+        """
+        w_num = self.w_num
+        stops = [[] for k in range(self.h_num)]
+        for i in range(w_num):
+            best = None
+            for k, route in enumerate(stops):
+                for p in range(len(route) + 1):
+                    trial = list(stops)
+                    trial[k] = route[:p] + [i + w_num] + route[p:] + [i]
+                    value = self.evaluate(trial, complete=False)
+                    if value is not None and (best is None or value < best[0]):
+                        best = (value, trial)
+            if best is None:
+                return None
+            stops = best[1]
+
+        while self.all_bases and any(not route for route in stops):
+            empty = next(k for k, route in enumerate(stops) if not route)
+            best = None
+            for k, route in enumerate(stops):
+                for i in [j for j in route if j < w_num]:
+                    if len(route) == 2:
+                        continue
+                    trial = list(stops)
+                    trial[k] = [j for j in route if j != i and j != i + w_num]
+                    trial[empty] = [i + w_num, i]
+                    value = self.evaluate(trial, complete=False)
+                    if value is not None and (best is None or value < best[0]):
+                        best = (value, trial)
+            if best is None:
+                return None
+            stops = best[1]
+        return stops
+
+    def improve(self, stops):
+        value = self.evaluate(stops)
+        if value is None:
+            return stops
+        self.rounds = 0
+        while self.rounds < self.max_rounds and not self.timed_out():
+            self.rounds += 1
+            improved = False
+            for move in [self.relocate, self.exchange, self.two_opt]:
+                for trial in move(stops):
+                    trial_value = self.evaluate(trial)
+                    if trial_value is not None and trial_value < value - 1e-9:
+                        stops, value = trial, trial_value
+                        improved = True
+                        break
+                if self.timed_out():
+                    break
+            if not improved:
+                break
+        return stops
+
+    def timed_out(self):
+        return self.deadline is not None and time.perf_counter() > self.deadline
+
+    def relocate(self, stops):
+        """
+        Every route with pair i moved: the delivery into the slot between the deliveries before and after i,
+        the pickup anywhere before it.
+        """
+        w_num = self.w_num
+        for a, route in enumerate(stops):
+            for i in [j for j in route if j < w_num]:
+                rest = [j for j in route if j != i and j != i + w_num]
+                for b in range(len(stops)):
+                    target = rest if b == a else stops[b]
+                    before = [p for p, j in enumerate(target) if j < i]
+                    after = [p for p, j in enumerate(target) if i < j < w_num]
+                    low = before[-1] + 1 if before else 0
+                    high = after[0] if after else len(target)
+                    for q in range(low, high + 1):
+                        for p in range(q + 1):
+                            moved = target[:q] + [i] + target[q:]
+                            moved = moved[:p] + [i + w_num] + moved[p:]
+                            if b == a and moved == route:
+                                continue
+                            trial = list(stops)
+                            trial[a] = rest
+                            trial[b] = moved
+                            yield trial
+
+    def exchange(self, stops):
+        """
+        Every pair of items on different routes swapped, each taking the positions of the other.
+        """
+        w_num = self.w_num
+        for a in range(len(stops)):
+            for b in range(a + 1, len(stops)):
+                for i in [j for j in stops[a] if j < w_num]:
+                    for j in [m for m in stops[b] if m < w_num]:
+                        swap = {i: j, i + w_num: j + w_num, j: i, j + w_num: i + w_num}
+                        trial = list(stops)
+                        trial[a] = [swap.get(m, m) for m in stops[a]]
+                        trial[b] = [swap.get(m, m) for m in stops[b]]
+                        yield trial
+
+    def two_opt(self, stops):
+        """
+        Every segment of a route reversed.
+        """
+        for k, route in enumerate(stops):
+            for p in range(len(route) - 1):
+                for q in range(p + 2, len(route) + 1):
+                    trial = list(stops)
+                    trial[k] = route[:p] + route[p:q][::-1] + route[q:]
+                    yield trial
+
+    def set_solution(self, stops):
+        self.solution, self.routes = self.get_solution(stops)
+
+    def get_solution(self, stops):
+        """
+        Solution in the form of PDRPPCCDT and the node path of every route for the given stops, so that it is a
+        valid MIP start: edt is integral from schedule, load has to be, and a route without a node of fixed
+        vehicle takes vehicle 0, which the bounds of ve allow.
+        """
+        w_num, h_num = self.w_num, self.h_num
+        edt = self.schedule(stops, complete=False)
+        solution = Solution(float(edt[:w_num].sum()))
+        solution.sigma_x = np.zeros((self.l_num, self.l_num))
+        solution.ve = np.zeros(self.l_num)
+        solution.load = np.zeros(self.l_num)
+        routes = []
+        for k, route in enumerate(stops):
+            path = [2 * w_num + k] + route + [2 * w_num + h_num + k]
+            solution.sigma_x[path[:-1], path[1:]] = 1
+            solution.ve[path] = next(iter(self.vehicle_nodes(k, route)), 0)
+            solution.load[path[2:]] = np.cumsum(self.delta[route])
+            routes.append(path)
+        if not np.array_equal(solution.load, np.round(solution.load)):
+            raise ValueError("PDRPPCCDT needs integral demands, load is an integer variable")
+        solution.edt = edt
+        solution.t = self.travel_time
+        solution.s = self.service_time
+        return solution, routes
+
+    def gap(self, stage3):
+        """
+        Relative gap of the heuristic objective against the objective of a solved PDRPPCCDT.
+        """
+        if stage3.solution.obj_val == 0:
+            return 0.0 if self.solution.obj_val == 0 else math.inf
+        return (self.solution.obj_val - stage3.solution.obj_val) / stage3.solution.obj_val
+
+    def display_routes(self):
+        print("routes:")
+        for route in self.routes:
+            print(route)
+
+    def display_edt(self):
+        edt = self.solution.edt.tolist()
+        print("edt:")
+        print(edt)
+
+    def display_gap(self, stage3):
+        print("heuristic obj: %.4f  milp obj: %.4f  gap: %.2f%%" % (self.solution.obj_val, stage3.solution.obj_val,
+                                                                     100 * self.gap(stage3)))
+
+
+if __name__ == "__main__":
+    pn = PN()
+    tn = TN(20, 2)
+    d_node = [1, 2, 3, 4, 13, 14, 15, 17]
+    stage1 = MRSP(pn, d_node)
+    stage2 = ROP(pn, stage1.repair, d_node, max_flow=stage1.max_flow)
+    stage2.display_o()
+
+    heuristic = RoutingHeuristic(pn, tn, stage2.order, VEHICLE())
+    heuristic.display_routes()
+    heuristic.display_edt()
+    print("heuristic: %.3f s, %d rounds" % (heuristic.run_time, heuristic.rounds))
+
+    start = time.perf_counter()
+    stage3 = PDRPPCCDT(pn, tn, stage2.order, VEHICLE(), start=heuristic.solution)
+    print("milp: %.3f s" % (time.perf_counter() - start))
+    heuristic.display_gap(stage3)
+else:
+    print("routing_heuristic is implemented into another module.")
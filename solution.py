@@ -0,0 +1,68 @@
+# encoding: utf-8
+"""
+@file: solution.py
+@time: 2026/10/18 16:40
+"""
+import numpy as np
+from gurobipy import *
+
+
+def get_values(model, var, shape):
+    """
+    Solution values of one variable block as an array of the given shape, read with a single call.
+    var can be an MVar, a tupledict from addVars or a list of Var. Models solved by HighsSolver keep their
+    values in model._values.
+    """
+    if getattr(model, '_solver', None) == 'highs':
+        if isinstance(var, MVar):
+            var = var.reshape(-1).tolist()
+        elif isinstance(var, dict):
+            var = list(var.values())
+        return model._values[[v.index for v in var]].reshape(shape)
+    if isinstance(var, MVar):
+        return np.asarray(var.X).reshape(shape)
+    if isinstance(var, dict):
+        var = list(var.values())
+    return np.array(model.getAttr('X', var)).reshape(shape)
+
+
+def set_values(model, var, attr, values):
+    """
+    Set an attribute such as Start for one variable block from an array, the counterpart of get_values.
+    """
+    values = np.asarray(values, dtype=float)
+    if isinstance(var, MVar):
+        var.setAttr(attr, values.reshape(var.shape))
+        return
+    if isinstance(var, dict):
+        var = list(var.values())
+    model.setAttr(attr, var, values.ravel().tolist())
+
+
+class Solution:
+    """
+    Solution values of one stage. Blocks a stage does not have stay None.
+    MRSP and MaxFlow: one value per item (y, z), branch (pl), gen, load and bus.
+    ROP: the same blocks with one column per period, plus o (item x period) and flow (period).
+    PDRPPCCDT: sigma_x (l_num x l_num), edt, ve and load (l_num).
+    """
+
+    def __init__(self, obj_val=None):
+        self.obj_val = obj_val
+
+        self.y = None
+        self.z = None
+        self.pl = None
+        self.pv_gen = None
+        self.pv_load = None
+        self.theta = None
+
+        self.o = None
+        self.flow = None
+
+        self.sigma_x = None
+        self.edt = None
+        self.ve = None
+        self.load = None
+        self.t = None
+        self.s = None
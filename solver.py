@@ -0,0 +1,175 @@
+# encoding: utf-8
+"""
+@file: solver.py
+@time: 2026/10/18 23:30
+"""
+import math
+import time
+import numpy as np
+import scipy.sparse as sp
+from scipy.optimize import milp, LinearConstraint, Bounds
+from gurobipy import *
+
+# stages are built with gurobipy, which needs no license to build a model, and solved by one of these
+SOLVERS = ['gurobi', 'highs']
+
+
+def get_solver(solver=None):
+    """
+    Solver object for a name in SOLVERS, or the object itself. Gurobi by default.
+    """
+    if solver is None or solver == 'gurobi':
+        return GurobiSolver()
+    if solver == 'highs':
+        return HighsSolver()
+    if isinstance(solver, str):
+        raise ValueError("unknown solver " + solver + ", expected one of " + ", ".join(SOLVERS))
+    return solver
+
+
+def get_obj_val(model):
+    if getattr(model, '_solver', None) == 'highs':
+        if model._values is None:
+            raise AttributeError("Unable to retrieve attribute 'objVal'")
+        return model._obj_val
+    return model.objVal
+
+
+def get_obj_bound(model):
+    if getattr(model, '_solver', None) == 'highs':
+        return model._bound
+    return model.ObjBound
+
+
+def get_runtime(model):
+    if getattr(model, '_solver', None) == 'highs':
+        return model._runtime
+    return model.Runtime
+
+
+def get_node_count(model):
+    if getattr(model, '_solver', None) == 'highs':
+        return model._node_count
+    return model.NodeCount
+
+
+class GurobiSolver:
+    name = 'gurobi'
+    # lazy constraint callbacks are available
+    lazy = True
+
+    def optimize(self, model, callback=None):
+        if callback is None:
+            model.optimize()
+        else:
+            model.optimize(callback)
+
+
+class HighsSolver:
+    """
+    HiGHS through scipy.optimize.milp. The model is read back from gurobipy as a sparse matrix; AND constraints
+    become z <= x_i and z >= sum(x) - (k - 1), indicator constraints become big-M rows with M taken from the
+    variable bounds, after bounds are tightened by the singleton rows. Callbacks are not supported, so callers
+    check lazy. TimeLimit, MIPGap and OutputFlag of the model are passed on. Solution values, objective value,
+    status, runtime, bound and branch-and-bound nodes are kept on the model as _values, _obj_val, _status,
+    _runtime, _bound and _node_count, with _solver = 'highs'.
+    """
+    name = 'highs'
+    lazy = False
+
+    def optimize(self, model, callback=None):
+        start = time.perf_counter()
+        model.update()
+        variables = model.getVars()
+        c, integrality, lb, ub, constraints, sense = self.linear_problem(model, variables)
+
+        options = {'disp': bool(model.Params.OutputFlag), 'mip_rel_gap': model.Params.MIPGap}
+        if model.Params.TimeLimit < GRB.INFINITY:
+            options['time_limit'] = model.Params.TimeLimit
+        result = milp(c, integrality=integrality, bounds=Bounds(lb, ub), constraints=constraints, options=options)
+
+        model._solver = self.name
+        model._status = {0: GRB.OPTIMAL, 1: GRB.TIME_LIMIT, 2: GRB.INFEASIBLE, 3: GRB.UNBOUNDED}.get(
+            result.status, GRB.NUMERIC)
+        model._values = result.x
+        model._obj_val = None if result.x is None else sense * result.fun + model.ObjCon
+        model._runtime = time.perf_counter() - start
+        model._node_count = getattr(result, 'mip_node_count', 0)
+        bound = getattr(result, 'mip_dual_bound', None)
+        model._bound = None if bound is None else sense * bound + model.ObjCon
+
+    def linear_problem(self, model, variables):
+        n = len(variables)
+        sense = model.ModelSense
+        c = sense * np.array(model.getAttr('Obj', variables))
+        lb = np.array(model.getAttr('LB', variables))
+        ub = np.array(model.getAttr('UB', variables))
+        integrality = (np.array(model.getAttr('VType', variables)) != GRB.CONTINUOUS).astype(np.int64)
+
+        constrs = model.getConstrs()
+        matrix = model.getA().tocsr() if len(constrs) > 0 else sp.csr_matrix((0, n))
+        row_sense = np.array(model.getAttr('Sense', constrs)) if len(constrs) > 0 else np.array([], dtype=str)
+        rhs = np.array(model.getAttr('RHS', constrs)) if len(constrs) > 0 else np.array([])
+        row_lb = np.where(row_sense == GRB.LESS_EQUAL, -np.inf, rhs)
+        row_ub = np.where(row_sense == GRB.GREATER_EQUAL, np.inf, rhs)
+        bound_lb, bound_ub = self.tighten(matrix, row_lb, row_ub, lb, ub)
+
+        rows, cols, values, extra_lb, extra_ub = [], [], [], [], []
+
+        def add_row(index, coeff, low, high):
+            rows.extend([len(extra_lb)] * len(index))
+            cols.extend(index)
+            values.extend(coeff)
+            extra_lb.append(low)
+            extra_ub.append(high)
+
+        for constr in model.getGenConstrs():
+            kind = constr.GenConstrType
+            if kind == GRB.GENCONSTR_AND:
+                res, inputs = model.getGenConstrAnd(constr)
+                inputs = [x.index for x in inputs]
+                for x in inputs:
+                    add_row([res.index, x], [1.0, -1.0], -np.inf, 0.0)
+                add_row(inputs + [res.index], [1.0] * len(inputs) + [-1.0], -np.inf, len(inputs) - 1.0)
+            elif kind == GRB.GENCONSTR_INDICATOR:
+                binvar, binval, expr, con_sense, con_rhs = model.getGenConstrIndicator(constr)
+                index = [expr.getVar(i).index for i in range(expr.size())]
+                coeff = np.array([expr.getCoeff(i) for i in range(expr.size())])
+                con_rhs -= expr.getConstant()
+                low = np.sum(np.minimum(coeff * bound_lb[index], coeff * bound_ub[index]))
+                high = np.sum(np.maximum(coeff * bound_lb[index], coeff * bound_ub[index]))
+                if not (math.isfinite(low) and math.isfinite(high)):
+                    raise ValueError("indicator constraint " + constr.GenConstrName + " has unbounded variables")
+                # binval = 1: a x <= rhs + M (1 - b), binval = 0: a x <= rhs + M b, same for >=
+                sign = -1.0 if binval else 1.0
+                if con_sense in (GRB.LESS_EQUAL, GRB.EQUAL) and high > con_rhs:
+                    m = high - con_rhs
+                    add_row(index + [binvar.index], coeff.tolist() + [-sign * m], -np.inf,
+                            con_rhs + (m if binval else 0.0))
+                if con_sense in (GRB.GREATER_EQUAL, GRB.EQUAL) and low < con_rhs:
+                    m = con_rhs - low
+                    add_row(index + [binvar.index], coeff.tolist() + [sign * m], con_rhs - (m if binval else 0.0),
+                            np.inf)
+            else:
+                raise ValueError("general constraint type " + str(kind) + " is not supported by HiGHS")
+
+        extra = sp.csr_matrix((values, (rows, cols)), shape=(len(extra_lb), n))
+        constraints = LinearConstraint(sp.vstack([matrix, extra]).tocsr(), np.concatenate([row_lb, extra_lb]),
+                                       np.concatenate([row_ub, extra_ub]))
+        return c, integrality, lb, ub, constraints, sense
+
+    @staticmethod
+    def tighten(matrix, row_lb, row_ub, lb, ub):
+        """
+        Variable bounds implied by rows with a single nonzero, such as ve[0, m] == m or edt[0, H+ k] == 0.
+        """
+        lb, ub = lb.copy(), ub.copy()
+        single = np.flatnonzero(np.diff(matrix.indptr) == 1)
+        col = matrix.indices[matrix.indptr[single]]
+        a = matrix.data[matrix.indptr[single]]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            low = np.where(a > 0, row_lb[single] / a, row_ub[single] / a)
+            high = np.where(a > 0, row_ub[single] / a, row_lb[single] / a)
+        np.maximum.at(lb, col, np.nan_to_num(low, nan=-np.inf))
+        np.minimum.at(ub, col, np.nan_to_num(high, nan=np.inf))
+        return lb, ub
@@ -4,53 +4,106 @@
 @file: trans_network.py
 @time: 2019/3/27 18:36
 """
-import xlrd
+import os
+import numpy as np
+from data_cache import load_cache, save_cache, read_sheet, rows_to_array
+
+# sheet order of trans-power.xlsx, travel time is the last sheet
+TN_TABLES = ['coupling', 'bus_cost', 'gen_cost', 'load_cost']
+TN_CACHE = 'tn_cache.npz'
+TRAVEL_TIME_CACHE = 'travel_time.npy'
+
+
+def tn_source_paths(data_dir='data'):
+    return [os.path.join(data_dir, 'trans-power.xlsx')]
+
+
+def compile_tn(data_dir='data'):
+    """
+    Parse trans-power.xlsx once. The travel time matrix is stored as a float32 .npy file that TN maps into
+    memory, the other sheets go to data_dir/tn_cache.npz together with the hash of the workbook.
+    """
+    paths = tn_source_paths(data_dir)
+    travel_time = rows_to_array(read_sheet(paths[0], len(TN_TABLES)), dtype=np.float32)
+    tmp_path = os.path.join(data_dir, TRAVEL_TIME_CACHE + "." + str(os.getpid()) + ".tmp")
+    with open(tmp_path, 'wb') as f:
+        np.save(f, travel_time)
+    os.replace(tmp_path, os.path.join(data_dir, TRAVEL_TIME_CACHE))
+
+    # written last, so a fresh tn_cache.npz always belongs to a complete travel time file
+    arrays = {}
+    for index, name in enumerate(TN_TABLES):
+        arrays[name] = rows_to_array(read_sheet(paths[0], index))
+    save_cache(os.path.join(data_dir, TN_CACHE), paths, arrays)
+    return arrays
 
 
 class TN:
 
-    def __init__(self, w_num, base_num):
-        self.coupling = []
-        self.bus_cost = []
-        self.gen_cost = []
-        self.load_cost = []
-        self.travel_time = []
+    def __init__(self, w_num, base_num, data_dir='data', use_cache=True):
+        self.travel_time = None
+        # coupling, bus_cost, gen_cost and load_cost are read on first access
+        self.__private__tables = {}
 
         self.w_num = w_num
         self.base_num = base_num
 
+        self.data_dir = data_dir
+        self.use_cache = use_cache
+
         self.initialization()
 
+    @classmethod
+    def from_arrays(cls, w_num, base_num, travel_time, coupling, bus_cost, gen_cost, load_cost):
+        """
+        Build a TN from tables that are already in memory instead of reading data_dir. travel_time may be a
+        memory map.
+        """
+        tn = cls.__new__(cls)
+        tn.w_num = w_num
+        tn.base_num = base_num
+        tn.data_dir = None
+        tn.use_cache = False
+        tn.travel_time = travel_time
+        tn.__private__tables = {'coupling': np.asarray(coupling, dtype=np.float64),
+                                'bus_cost': np.asarray(bus_cost, dtype=np.float64),
+                                'gen_cost': np.asarray(gen_cost, dtype=np.float64),
+                                'load_cost': np.asarray(load_cost, dtype=np.float64)}
+        return tn
+
     def initialization(self):
-        path = 'data/trans-power.xlsx'
-        self.__private__get_data_from_excel(path)
-
-    def __private__get_data_from_excel(self, path):
-        workbook = xlrd.open_workbook(path)
-        coupling_table = workbook.sheets()[0]
-        coupling_nrows = coupling_table.nrows
-        for i in range(coupling_nrows):
-            self.coupling.append(coupling_table.row_values(i))
-
-        bus_cost_table = workbook.sheets()[1]
-        bus_cost_nrows = bus_cost_table.nrows
-        for i in range(bus_cost_nrows):
-            self.bus_cost.append(bus_cost_table.row_values(i))
-
-        gen_cost_table = workbook.sheets()[2]
-        gen_cost_nrows = gen_cost_table.nrows
-        for i in range(gen_cost_nrows):
-            self.gen_cost.append(gen_cost_table.row_values(i))
-
-        load_cost_table = workbook.sheets()[3]
-        load_cost_nrows = load_cost_table.nrows
-        for i in range(load_cost_nrows):
-            self.load_cost.append(load_cost_table.row_values(i))
-
-        travel_time_table = workbook.sheets()[4]
-        travel_time_nrows = travel_time_table.nrows
-        for i in range(travel_time_nrows):
-            self.travel_time.append(travel_time_table.row_values(i))
+        data = None
+        travel_time_path = os.path.join(self.data_dir, TRAVEL_TIME_CACHE)
+        # the tables and the travel time matrix are compiled together, so a missing matrix makes both stale
+        if self.use_cache and os.path.exists(travel_time_path):
+            data = load_cache(os.path.join(self.data_dir, TN_CACHE), tn_source_paths(self.data_dir))
+        if data is None:
+            compile_tn(self.data_dir)
+
+        # read-only memory map, the pages are shared by every process that opens the same file
+        self.travel_time = np.load(travel_time_path, mmap_mode='r')
+
+    @property
+    def coupling(self):
+        return self.__private__get_table('coupling')
+
+    @property
+    def bus_cost(self):
+        return self.__private__get_table('bus_cost')
+
+    @property
+    def gen_cost(self):
+        return self.__private__get_table('gen_cost')
+
+    @property
+    def load_cost(self):
+        return self.__private__get_table('load_cost')
+
+    def __private__get_table(self, name):
+        if name not in self.__private__tables:
+            with np.load(os.path.join(self.data_dir, TN_CACHE), allow_pickle=False) as data:
+                self.__private__tables[name] = data[name]
+        return self.__private__tables[name]
 
     def display_coupling(self):
         print("Coupling Relationship between TN and PN:")